@@ -1,13 +1,20 @@
-import tkinter as tk
-from tkinter import filedialog, messagebox, scrolledtext, ttk
 import os
-import json
-from azure.core.credentials import AzureKeyCredential
 from azure.ai.documentintelligence import DocumentIntelligenceClient
-from azure.ai.documentintelligence.models import AnalyzeOutputOption, AnalyzeResult
-
-# Load stop words from file
-STOP_WORDS_FILE_PATH = 'text_files/stop_words.txt'
+from ocr_cache import client_api_version, get_default_cache
+from scan_index import iter_pdf_files
+from stop_words import StopWordFilter
+from ocr_json_stream import iter_line_contents
+from result_format import DEFAULT_RESULT_FORMAT, write_result
+from concurrent_ocr import DEFAULT_MAX_IN_FLIGHT, run_by_size
+from polling_engine import AnalyzePollingEngine
+from client_pool import get_shared_client
+from instrumentation import timed
+from ocr_file import OcrFile, analyze_file, cache_result, run_submitted, start_pdf, submit_uncached
+from ocr_pipeline import run_ocr_pipeline
+from text_layer import TextLayerReport
+
+# Load stop words from file (relative to this script, so it works from any working directory)
+STOP_WORDS_FILE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'text_files', 'stop_words.txt')
 
 
 def load_stop_words(file_path):
@@ -18,55 +25,49 @@ def load_stop_words(file_path):
         with open(file_path, 'r', encoding='utf-8') as f:
             return set(line.strip().lower() for line in f)
     except FileNotFoundError:
-        messagebox.showerror("Error", f"Stop words file not found: {file_path}")
+        print(f"Stop words file not found: {file_path}")
         return set()
 
 
 STOP_WORDS = load_stop_words(STOP_WORDS_FILE_PATH)
+STOP_WORD_FILTER = StopWordFilter(STOP_WORDS)
 
 
-def process_pdf(file_path, output_folder_path, client):
+def process_pdf(file_path, output_folder_path, client, cache=None, result_format=DEFAULT_RESULT_FORMAT,
+                file_hash=None, analysis=None, pages_per_range=None, text_layer=None):
     """
     Processes a single PDF file and saves the results to the output folder.
+    Files already analyzed with the same model and API version are served from the OCR cache.
+    The analysis result is written as result_format (pretty-printed .json by default).
+    analysis is an optional AnalyzePollingEngine future already running for this file.
+    With pages_per_range set, PDFs longer than that are analyzed as concurrent page ranges
+    and the results merged (see page_ranges).
+    With text_layer (a text_layer.TextLayerReport) given, the pages that carry usable text
+    are read locally and only the others are analyzed.
     """
-    input_file_name = os.path.splitext(os.path.basename(file_path))[0]
+    cache = cache or get_default_cache()
 
     try:
-        # Analyze the PDF
-        with open(file_path, "rb") as f:
-            poller = client.begin_analyze_document(
-                "prebuilt-read",
-                analyze_request=f,
-                output=[AnalyzeOutputOption.PDF],
-                content_type="application/octet-stream",
-            )
-            result: AnalyzeResult = poller.result()
+        job = OcrFile(file_path, output_folder_path, result_format)
+        job.file_hash = file_hash
+        api_version = client_api_version(client)
+        analyze_file(job, client, cache, api_version, analysis, pages_per_range=pages_per_range,
+                     text_layer=text_layer)
 
-        # Output file paths
-        pdf_output_file = os.path.join(output_folder_path, f"{input_file_name}.pdf")
-        json_output_file = os.path.join(output_folder_path, f"{input_file_name}.json")
-        txt_output_file = os.path.join(output_folder_path, f"{input_file_name}_filtered.txt")
-
-        # Save the analyzed PDF
-        response = client.get_analyze_result_pdf(
-            model_id=result.model_id, result_id=poller.details["operation_id"]
-        )
-        with open(pdf_output_file, "wb") as writer:
-            writer.writelines(response)
+        # Download of the searchable PDF, left running while the result and filtered text are written
+        pdf_download = start_pdf(job, client, cache, api_version)
 
         # Save the JSON output
-        result_json = result.as_dict()
-        with open(json_output_file, "w", encoding="utf-8") as json_file:
-            json.dump(result_json, json_file, indent=4, ensure_ascii=False)
+        with timed("result_write", file_path) as span:
+            span.bytes = write_result(job.result_json, job.result_file, result_format)
 
         # Extract and filter words, then save to a text file
-        with open(txt_output_file, "w", encoding="utf-8") as text_file:
-            for page in result_json.get("pages", []):
-                for line in page.get("lines", []):
-                    content = line.get("content", "")
-                    words = content.split()
-                    filtered_words = [word for word in words if word.lower() not in STOP_WORDS]
-                    text_file.write(" ".join(filtered_words) + "\n")
+        with timed("stop_word_filter", file_path), open(job.txt_output_file, "w", encoding="utf-8") as text_file:
+            text_file.writelines(line + "\n" for line in STOP_WORD_FILTER.filter_result(job.result_json))
+
+        if pdf_download is not None:
+            _, job.pdf_checksum = pdf_download.result()
+        cache_result(job, cache, api_version)
 
         return f"Processed: {file_path}\n"
     except Exception as e:
@@ -78,57 +79,95 @@ def process_pdf(file_path, output_folder_path, client):
 def filter_text_from_json(json_file_path, stop_words, output_txt_path):
     """
     Parses a JSON file, filters out stop words, and writes the cleaned text to a text file.
+    Line contents are streamed page by page, so large results are never fully loaded.
     """
     try:
-        # Load JSON file
-        with open(json_file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-
-        filtered_text = []
-
-        # Process each page
-        for page in data.get("pages", []):
-            for line in page.get("lines", []):
-                content = line.get("content", "")
-                words = content.split()
-                filtered_words = [word for word in words if word.lower() not in stop_words]
-                filtered_text.append(" ".join(filtered_words))
-
-        # Write the filtered text to a file
         with open(output_txt_path, 'w', encoding='utf-8') as f:
-            f.write("\n".join(filtered_text))
+            StopWordFilter.coerce(stop_words).write_lines(iter_line_contents(json_file_path), f)
     except Exception as e:
         print(f"Error processing JSON file {json_file_path}: {e}")
 
 
-def handle_folder_upload(input_folder_path, output_folder_path):
+def get_client():
     """
-    Processes all PDF files in the selected input folder and saves the results to the output folder.
+    Returns the prebuilt-read client, shared across runs so the keep-alive connections of the last run are reused.
     """
     endpoint = "https://as-lf-ai-01.cognitiveservices.azure.com/"
     key = "18ce006f0ac44579a36bfaf01653254c"
+    return get_shared_client(DocumentIntelligenceClient, endpoint, key)
+
 
-    document_intelligence_client = DocumentIntelligenceClient(
-        endpoint=endpoint, credential=AzureKeyCredential(key)
-    )
-    result_summary = ""
+def handle_folder_upload(input_folder_path, output_folder_path, max_in_flight=DEFAULT_MAX_IN_FLIGHT, client=None,
+                         cache=None, result_format=DEFAULT_RESULT_FORMAT, max_operations=None, pages_per_range=None,
+                         progress=None, pipelined=False, stage_workers=None, queue_size=None, use_text_layer=False):
+    """
+    Processes all PDF files in the selected input folder and saves the results to the output folder.
+    Up to max_in_flight files are analyzed concurrently, large-format files on their own
+    low-concurrency lane (see concurrent_ocr.run_by_size); the summary keeps the input order.
 
-    # Gather all PDF files from the input folder
-    pdf_files = []
-    for root, _, files in os.walk(input_folder_path):
-        for file in files:
-            if file.lower().endswith(".pdf"):
-                pdf_files.append(os.path.join(root, file))
+    With max_operations set, the files are submitted ahead of the workers to an AnalyzePollingEngine,
+    which keeps up to max_operations analyses open on the service from one event loop; the
+    max_in_flight threads then only download the PDFs and write the results as the analyses finish.
+    Submissions run at most max_operations + max_in_flight files ahead, so the results held in
+    memory are bounded by those, not by the size of the folder. A stopped run still finishes
+    the files whose analyses were already open (see ocr_file.run_submitted).
 
-    for file_path in pdf_files:
-        result_summary += process_pdf(file_path, output_folder_path, document_intelligence_client)
+    With pages_per_range set, PDFs with more pages than that are split into page ranges
+    analyzed concurrently (see page_ranges), so one long plan set is not the tail of the batch.
 
-    return result_summary
+    progress(done, total) is called as files finish (see concurrent_ocr.run_in_order).
+
+    With pipelined set, the files go through the stages of ocr_pipeline instead (analyze,
+    download, serialize, filter, export), each with its own workers (stage_workers, e.g.
+    {"download": 16}) and a queue of at most queue_size files in front of it.
+
+    With use_text_layer set, PDF pages that already carry a usable text layer are read locally
+    instead of being analyzed (see text_layer, which needs pypdf), and the summary ends with
+    a line on the pages read locally and the cost and time that saved.
+    """
+    client = client or get_client()
+    text_layer = TextLayerReport() if use_text_layer else None
+
+    # PDF files of the input folder, found through the scan index while the first ones are already processed
+    pdf_files = iter_pdf_files(input_folder_path)
+
+    if pipelined:
+        results = run_ocr_pipeline(
+            pdf_files, output_folder_path, client, STOP_WORDS, cache, result_format, max_in_flight, stage_workers,
+            queue_size, max_operations, pages_per_range, progress, text_layer
+        )
+    elif not max_operations:
+        results = run_by_size(
+            lambda file_path: process_pdf(file_path, output_folder_path, client, cache, result_format,
+                                          pages_per_range=pages_per_range, text_layer=text_layer),
+            pdf_files, max_in_flight, progress=progress
+        )
+    else:
+        cache = cache or get_default_cache()
+        with AnalyzePollingEngine(client, "prebuilt-read", max_operations) as engine:
+            # Enough files ahead to keep the engine's operations open; each analysis is dropped once its file is written
+            results = run_submitted(
+                engine, pdf_files,
+                lambda file_path: submit_uncached(file_path, client, cache, engine, pages_per_range, text_layer),
+                lambda file_path, file_hash, analysis: process_pdf(
+                    file_path, output_folder_path, client, cache, result_format, file_hash, analysis,
+                    pages_per_range=pages_per_range, text_layer=text_layer
+                ),
+                max_operations + max_in_flight, max_in_flight, progress=progress
+            )
+    return "".join(results) + (text_layer.summary() if text_layer else "")
 
 
 def start_gui():
+    # Imported here so the processing functions can be used on machines without a display
+    import tkinter as tk
+    from tkinter import filedialog, messagebox, scrolledtext, ttk
+    from gui_runner import BackgroundRun, RunCancelled, progress_text
+    from job_panel import add_job_panel
+
     selected_input_folder = None
     selected_output_folder = None
+    run = None
 
     def upload_folder():
         nonlocal selected_input_folder
@@ -148,26 +187,54 @@ def start_gui():
             text=f"Output folder: {os.path.basename(selected_output_folder)}" if selected_output_folder else "No output folder selected."
         )
 
+    # The run happens on a worker thread (see gui_runner); these callbacks run on the Tk thread
     def run_process():
+        nonlocal run
         if not selected_input_folder or not selected_output_folder:
             messagebox.showwarning("Folders missing", "Please select both input and output folders before running.")
             return
+        input_folder, output_folder = selected_input_folder, selected_output_folder
         status_label.config(text="Processing...")
-        progress_bar.start()
-        root.update_idletasks()
-
-        result = handle_folder_upload(selected_input_folder, selected_output_folder)
-        progress_bar.stop()
-        output_text.delete(1.0, tk.END)
-        output_text.insert(tk.END, result)
-        status_label.config(text="Processing complete.")
-        messagebox.showinfo("Success", f"Files saved to {selected_output_folder}")
+        progress_bar.config(value=0, maximum=1)
+        run_button.config(state=tk.DISABLED)
+        cancel_button.config(state=tk.NORMAL)
+        run = BackgroundRun(
+            root, lambda progress: handle_folder_upload(input_folder, output_folder, progress=progress),
+            show_progress, lambda result, error: finish_run(result, error, output_folder)
+        ).start()
+
+    def show_progress(done, total, elapsed):
+        progress_bar.config(value=done, maximum=max(total, 1))
+        if not run.cancelled:
+            status_label.config(text=f"Processing... {progress_text(done, total, elapsed)}")
+
+    def cancel_run():
+        run.cancel()
+        cancel_button.config(state=tk.DISABLED)
+        status_label.config(text="Cancelling... waiting for the files in flight to finish.")
+
+    def finish_run(result, error, output_folder):
+        run_button.config(state=tk.NORMAL)
+        cancel_button.config(state=tk.DISABLED)
+        if isinstance(error, RunCancelled):
+            status_label.config(text="Processing cancelled. Files already finished were kept.")
+        elif error is not None:
+            status_label.config(text="Processing failed.")
+            messagebox.showerror("Error", f"{type(error).__name__}: {error}")
+        else:
+            output_text.delete(1.0, tk.END)
+            output_text.insert(tk.END, result)
+            status_label.config(text="Processing complete.")
+            messagebox.showinfo("Success", f"Files saved to {output_folder}")
 
     root = tk.Tk()
     root.title("OCR and Text Filtering Tool")
     root.geometry("900x700")
     root.configure(bg='#f0f0f0')
 
+    if not STOP_WORDS:
+        messagebox.showerror("Error", f"Stop words file not found: {STOP_WORDS_FILE_PATH}")
+
     # Header Frame
     header_frame = tk.Frame(root, bg='#4a90e2', height=60)
     header_frame.grid(row=0, column=0, columnspan=2, sticky="ew")
@@ -205,8 +272,25 @@ def start_gui():
                            fg="white", padx=10, pady=5)
     run_button.grid(row=0, column=2, pady=10)
 
+    cancel_button = tk.Button(button_frame, text="Cancel", command=cancel_run, font=("Helvetica", 12), bg="#4a90e2",
+                              fg="white", padx=10, pady=5, state=tk.DISABLED)
+    cancel_button.grid(row=0, column=3, padx=10, pady=10)
+
+    # Job Queue Panel: queued folders run on the background workers; the list shows their progress
+    def selected_folders():
+        if selected_input_folder and selected_output_folder:
+            return selected_input_folder, selected_output_folder
+        return None
+
+    def show_job_text(text):
+        output_text.delete(1.0, tk.END)
+        output_text.insert(tk.END, text)
+
+    job_panel = add_job_panel(main_frame, "ocr", selected_folders, show_text=show_job_text)
+    job_panel.grid(row=2, column=0, pady=5, sticky="ew")
+
     # Output Text Area
-    output_text = scrolledtext.ScrolledText(main_frame, wrap=tk.WORD, width=100, height=25, font=("Courier", 10))
+    output_text = scrolledtext.ScrolledText(main_frame, wrap=tk.WORD, width=100, height=18, font=("Courier", 10))
     output_text.grid(row=4, column=0, pady=10)
 
     # Status Label
@@ -215,14 +299,15 @@ def start_gui():
 
     # Footer with Progress Bar
     footer_frame = tk.Frame(main_frame, bg='#f0f0f0', height=40)
-    footer_frame.grid(row=5, column=0, columnspan=2, pady=10, sticky="ew")
+    footer_frame.grid(row=6, column=0, columnspan=2, pady=10, sticky="ew")
     footer_frame.grid_columnconfigure(0, weight=1)
 
-    progress_bar = ttk.Progressbar(footer_frame, orient="horizontal", mode="indeterminate", length=400)
+    progress_bar = ttk.Progressbar(footer_frame, orient="horizontal", mode="determinate", length=400)
     progress_bar.grid(row=0, column=0, pady=10)
 
     root.mainloop()
 
 
 # Start the GUI
-start_gui()
\ No newline at end of file
+if __name__ == "__main__":
+    start_gui()
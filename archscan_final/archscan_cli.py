@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Headless command-line entry point for the ArchScan pipeline.
+
+    python archscan_cli.py ocr     --input PDFS --output OUT [--max-in-flight 8] [--max-operations 200] [--format json]
+                                   [--split-pages 50] [--pipeline [--stage-workers download=16,serialize=4] [--queue-size N]]
+                                   [--use-text-layer]
+    python archscan_cli.py filter  --input JSONS --output OUT [--workers N] [--no-normalize-punctuation]
+    python archscan_cli.py extract --input PDFS --output OUT [--model Large_Format_2024_11_07] [--export-format xlsx]
+    python archscan_cli.py export  --output OUT --to results.csv
+    python archscan_cli.py watch   {ocr,extract} --input SCANS --output OUT [--settle 2] [--poll [--poll-interval 5]]
+                                   [--model NAME] [--max-in-flight N]
+
+Queued runs (see job_queue): submit adds a folder job, workers drain the queue most urgent first.
+    python archscan_cli.py submit  {ocr,extract} --input PDFS --output OUT [--priority urgent|normal|backfill]
+                                   [--model NAME] [--max-in-flight N] [ocr / extract options]
+    python archscan_cli.py jobs    [--all]
+    python archscan_cli.py cancel  JOB_ID
+    python archscan_cli.py worker  [--processes 2] [--urgent-workers 1] [--exit-when-idle]
+
+ocr and extract take --metrics FILE to record per-file, per-stage timings; a p50/p95/p99
+summary is printed to stderr and the metrics are written as JSON, or as a Prometheus
+textfile if FILE ends in .prom.
+
+Nothing here imports tkinter, and each command only imports the modules it needs,
+so the same engine runs under cron or in a container.
+
+Exit codes:
+    0  every file was processed
+    1  the run finished but some files failed (or were throttled and will be retried)
+    2  bad arguments, or a missing input folder / configuration file / package, found before
+       the run starts
+    3  the run failed or was aborted: anything raised once it has started
+"""
+import argparse
+import os
+import sys
+
+EXIT_OK = 0
+EXIT_PARTIAL = 1
+EXIT_USAGE = 2
+EXIT_ERROR = 3
+
+RESULT_FORMAT_CHOICES = ["json", "json.gz", "msgpack", "msgpack.zst"]
+EXPORT_FORMAT_CHOICES = ["xlsx", "csv", "parquet"]
+
+
+def run_ocr(args):
+    import OCR_main
+    from ocr_cache import OcrCache
+
+    cache = OcrCache(args.cache_dir) if args.cache_dir else None
+    os.makedirs(args.output, exist_ok=True)
+    summary = OCR_main.handle_folder_upload(
+        args.input, args.output, args.max_in_flight, cache=cache, result_format=args.format,
+        max_operations=args.max_operations, pages_per_range=args.split_pages, pipelined=args.pipeline,
+        stage_workers=parse_stage_workers(args.stage_workers), queue_size=args.queue_size,
+        use_text_layer=args.use_text_layer
+    )
+    print(summary, end="")
+    failed = sum(1 for line in summary.splitlines() if line.startswith("Failed"))
+    return EXIT_PARTIAL if failed else EXIT_OK
+
+
+def parse_stage_workers(text):
+    from ocr_pipeline import parse_stage_workers as parse
+
+    return parse(text) if text else None
+
+
+def run_filter(args):
+    import stop_word_parse
+
+    failed = 0
+    for input_path, error in stop_word_parse.iter_process_folder(
+            args.input, args.output, args.stop_words, args.workers, args.normalize_punctuation
+    ):
+        if error:
+            failed += 1
+            print(f"FAILED\t{input_path}\t{error}", flush=True)
+        else:
+            print(f"OK\t{input_path}", flush=True)
+    return EXIT_PARTIAL if failed else EXIT_OK
+
+
+def run_extract(args):
+    import large_format_custom
+    from rate_limiter import AdaptiveRateLimiter
+
+    model_id = large_format_custom.resolve_model_id(args.model)
+    limiter = AdaptiveRateLimiter(requests_per_second=args.requests_per_second, max_concurrency=args.max_in_flight)
+    os.makedirs(args.output, exist_ok=True)
+    summary, unsupported_files, throttled_files = large_format_custom.run_folder(
+        args.input, args.output, model_id, f"document_analysis_results.{args.export_format}", limiter
+    )
+    print(summary)
+    return EXIT_PARTIAL if unsupported_files or throttled_files else EXIT_OK
+
+
+def run_export(args):
+    from results_export import export_results
+    from results_store import open_results_store
+
+    with open_results_store(args.output, os.path.join(args.output, "document_results.json")) as store:
+        export_results(store, args.to)
+    return EXIT_OK
+
+
+def run_watch(args):
+    import watch_folder
+
+    os.makedirs(args.output, exist_ok=True)
+    if args.kind == "ocr":
+        from ocr_cache import OcrCache
+        handle = watch_folder.ocr_batch_handler(
+            args.output, args.max_in_flight or 8, OcrCache(args.cache_dir) if args.cache_dir else None,
+            args.format, args.split_pages
+        )
+    else:
+        import large_format_custom
+        from rate_limiter import AdaptiveRateLimiter
+        limiter = AdaptiveRateLimiter(requests_per_second=args.requests_per_second,
+                                      max_concurrency=args.max_in_flight or 16)
+        handle = watch_folder.extract_batch_handler(
+            args.output, large_format_custom.resolve_model_id(args.model), limiter,
+            f"document_analysis_results.{args.export_format}"
+        )
+    watch_folder.watch_folder(args.input, args.output, handle, args.settle, args.poll, args.poll_interval)
+    return EXIT_OK
+
+
+def run_submit(args):
+    from job_queue import JobQueue
+
+    options = {"max_in_flight": args.max_in_flight or (8 if args.kind == "ocr" else 16)}
+    model_id = None
+    if args.kind == "ocr":
+        options.update(format=args.format, max_operations=args.max_operations, split_pages=args.split_pages,
+                       cache_dir=os.path.abspath(args.cache_dir) if args.cache_dir else None,
+                       pipeline=args.pipeline, stage_workers=parse_stage_workers(args.stage_workers),
+                       queue_size=args.queue_size, use_text_layer=args.use_text_layer)
+    else:
+        import large_format_custom
+        model_id = large_format_custom.resolve_model_id(args.model)
+        options.update(export_format=args.export_format, requests_per_second=args.requests_per_second)
+    with JobQueue(args.queue) as queue:
+        job_id = queue.submit(args.kind, args.input, args.output, model_id, args.priority, options)
+    print(job_id)
+    return EXIT_OK
+
+
+def run_jobs(args):
+    from job_queue import JobQueue
+
+    with JobQueue(args.queue) as queue:
+        jobs = queue.list_jobs(None if args.all else ["running", "queued"])
+        workers = queue.live_workers()
+    print(f"{'id':>6s}  {'status':9s}  {'prio':>4s}  {'kind':7s}  {'files':>13s}  input")
+    for job in jobs:
+        files = f"{job['files_done']}/{job['files_total']}" if job["files_total"] else "-"
+        print(f"{job['id']:6d}  {job['status']:9s}  {job['priority']:4d}  {job['kind']:7s}  {files:>13s}  "
+              f"{job['input_folder']}")
+    print(f"{len(workers)} live worker(s)")
+    return EXIT_OK
+
+
+def run_cancel(args):
+    from job_queue import JobQueue
+
+    with JobQueue(args.queue) as queue:
+        if not queue.cancel(args.job_id):
+            print(f"Job {args.job_id} is not queued or running", file=sys.stderr)
+            return EXIT_PARTIAL
+    return EXIT_OK
+
+
+def run_worker(args):
+    import job_queue
+
+    if args.processes == 1 and not args.urgent_workers:
+        job_queue.run_worker(args.queue, exit_when_idle=args.exit_when_idle)
+    else:
+        job_queue.run_workers(args.processes, args.queue, args.exit_when_idle, args.urgent_workers)
+    return EXIT_OK
+
+
+def run_with_metrics(args):
+    from instrumentation import MetricsRecorder, recording
+
+    recorder = MetricsRecorder()
+    try:
+        with recording(recorder):
+            return args.func(args)
+    finally:
+        print(recorder.format_summary(), file=sys.stderr)
+        recorder.export(args.metrics)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="archscan", description="ArchScan OCR and extraction pipeline")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ocr = commands.add_parser("ocr", help="OCR every PDF with prebuilt-read and filter stop words")
+    ocr.add_argument("--input", required=True, help="folder containing PDF files")
+    ocr.add_argument("--output", required=True, help="folder for the PDF, result and _filtered.txt files")
+    ocr.add_argument("--max-in-flight", type=int, default=8, help="analyses running at once")
+    ocr.add_argument("--max-operations", type=int, default=None,
+                     help="submit every file first and poll up to this many analyses from one event loop")
+    ocr.add_argument("--split-pages", type=int, default=None,
+                     help="analyze PDFs longer than this many pages as concurrent page ranges")
+    ocr.add_argument("--format", choices=RESULT_FORMAT_CHOICES, default="json", help="on-disk result format")
+    ocr.add_argument("--cache-dir", default=None, help="OCR result cache folder")
+    ocr.add_argument("--pipeline", action="store_true",
+                     help="run analyze, download, serialize, filter and export as overlapping stages")
+    ocr.add_argument("--stage-workers", default=None,
+                     help="pipeline workers per stage, e.g. analyze=16,download=8,serialize=4")
+    ocr.add_argument("--queue-size", type=int, default=None, help="pipeline: files waiting in front of each stage")
+    ocr.add_argument("--use-text-layer", action="store_true",
+                     help="read PDF pages that already have a text layer locally instead of analyzing them (needs pypdf)")
+    ocr.add_argument("--metrics", default=None, help="write stage timings to this .json or .prom file")
+    ocr.set_defaults(func=run_ocr)
+
+    filter_cmd = commands.add_parser("filter", help="filter stop words out of existing OCR result files")
+    filter_cmd.add_argument("--input", required=True, help="folder containing OCR result files")
+    filter_cmd.add_argument("--output", required=True, help="folder for the _filtered.txt files")
+    filter_cmd.add_argument("--stop-words", default=None, help="stop words file")
+    filter_cmd.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    filter_cmd.add_argument("--normalize-punctuation", action=argparse.BooleanOptionalAction, default=True,
+                            help='also drop stop words with attached punctuation, e.g. "the," (default: on)')
+    filter_cmd.set_defaults(func=run_filter)
+
+    extract = commands.add_parser("extract", help="extract title-block fields with a custom model")
+    extract.add_argument("--input", required=True, help="folder containing PDF files")
+    extract.add_argument("--output", required=True, help="folder for the results store and export")
+    extract.add_argument("--model", default="Large_Format_2024_11_07", help="model name or id")
+    extract.add_argument("--max-in-flight", type=int, default=16, help="upper bound on analyses running at once")
+    extract.add_argument("--requests-per-second", type=float, default=15, help="request rate limit")
+    extract.add_argument("--export-format", choices=EXPORT_FORMAT_CHOICES, default="xlsx")
+    extract.add_argument("--metrics", default=None, help="write stage timings to this .json or .prom file")
+    extract.set_defaults(func=run_extract)
+
+    export = commands.add_parser("export", help="export stored extraction results")
+    export.add_argument("--output", required=True, help="output folder holding document_results.sqlite3")
+    export.add_argument("--to", required=True, help="destination file (.xlsx, .csv or .parquet)")
+    export.set_defaults(func=run_export)
+
+    # Imported for its defaults only; job_queue itself imports nothing heavy
+    from job_queue import DEFAULT_QUEUE_PATH, PRIORITIES
+    from watch_folder import DEFAULT_POLL_INTERVAL, DEFAULT_SETTLE_SECONDS
+
+    watch = commands.add_parser("watch", help="process PDFs as they arrive in a folder until interrupted")
+    watch.add_argument("kind", choices=["ocr", "extract"])
+    watch.add_argument("--input", required=True, help="folder the scans are dropped into")
+    watch.add_argument("--output", required=True, help="output folder")
+    watch.add_argument("--settle", type=float, default=DEFAULT_SETTLE_SECONDS,
+                       help="seconds a file must stay unchanged before it is taken")
+    watch.add_argument("--poll", action="store_true", help="rescan the folder instead of using inotify")
+    watch.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL)
+    watch.add_argument("--max-in-flight", type=int, default=None, help="analyses running at once")
+    watch.add_argument("--model", default="Large_Format_2024_11_07", help="extract: model name or id")
+    watch.add_argument("--requests-per-second", type=float, default=15, help="extract: request rate limit")
+    watch.add_argument("--export-format", choices=EXPORT_FORMAT_CHOICES, default="xlsx")
+    watch.add_argument("--split-pages", type=int, default=None, help="ocr: page-range size for long PDFs")
+    watch.add_argument("--format", choices=RESULT_FORMAT_CHOICES, default="json", help="ocr: result format")
+    watch.add_argument("--cache-dir", default=None, help="ocr: OCR result cache folder")
+    watch.add_argument("--metrics", default=None, help="write stage timings to this .json or .prom file")
+    watch.set_defaults(func=run_watch)
+
+    submit = commands.add_parser("submit", help="queue an ocr or extract folder job for the workers")
+    submit.add_argument("kind", choices=["ocr", "extract"])
+    submit.add_argument("--input", required=True, help="folder containing PDF files")
+    submit.add_argument("--output", required=True, help="output folder")
+    submit.add_argument("--priority", choices=list(PRIORITIES), default="normal")
+    submit.add_argument("--max-in-flight", type=int, default=None, help="analyses running at once")
+    submit.add_argument("--model", default="Large_Format_2024_11_07", help="extract: model name or id")
+    submit.add_argument("--requests-per-second", type=float, default=15, help="extract: request rate limit")
+    submit.add_argument("--export-format", choices=EXPORT_FORMAT_CHOICES, default="xlsx")
+    submit.add_argument("--max-operations", type=int, default=None, help="ocr: analyses polled from one event loop")
+    submit.add_argument("--split-pages", type=int, default=None, help="ocr: page-range size for long PDFs")
+    submit.add_argument("--format", choices=RESULT_FORMAT_CHOICES, default="json", help="ocr: result format")
+    submit.add_argument("--cache-dir", default=None, help="ocr: OCR result cache folder")
+    submit.add_argument("--pipeline", action="store_true", help="ocr: run the stages as a pipeline")
+    submit.add_argument("--stage-workers", default=None, help="ocr: pipeline workers per stage")
+    submit.add_argument("--queue-size", type=int, default=None, help="ocr: pipeline queue size per stage")
+    submit.add_argument("--use-text-layer", action="store_true", help="ocr: read PDF pages with a text layer locally")
+    submit.add_argument("--queue", default=DEFAULT_QUEUE_PATH, help="job queue database")
+    submit.set_defaults(func=run_submit)
+
+    jobs = commands.add_parser("jobs", help="list queued and running jobs")
+    jobs.add_argument("--all", action="store_true", help="include finished jobs")
+    jobs.add_argument("--queue", default=DEFAULT_QUEUE_PATH, help="job queue database")
+    jobs.set_defaults(func=run_jobs)
+
+    cancel = commands.add_parser("cancel", help="cancel a queued job or stop a running one")
+    cancel.add_argument("job_id", type=int)
+    cancel.add_argument("--queue", default=DEFAULT_QUEUE_PATH, help="job queue database")
+    cancel.set_defaults(func=run_cancel)
+
+    worker = commands.add_parser("worker", help="run worker processes that drain the job queue")
+    worker.add_argument("--processes", type=int, default=1)
+    worker.add_argument("--urgent-workers", type=int, default=0,
+                        help="of the processes, how many only take urgent jobs")
+    worker.add_argument("--exit-when-idle", action="store_true", help="stop once the queue is empty")
+    worker.add_argument("--queue", default=DEFAULT_QUEUE_PATH, help="job queue database")
+    worker.set_defaults(func=run_worker)
+
+    return parser
+
+
+def validate(args):
+    """
+    Checks what a run depends on before it starts. Returns an error message, or None.
+    """
+    input_folder = getattr(args, "input", None)
+    if input_folder is not None and not os.path.isdir(input_folder):
+        return f"Input folder not found: {input_folder}"
+    if args.command == "filter" and not os.path.isfile(args.stop_words):
+        return f"Stop words file not found: {args.stop_words}"
+    if getattr(args, "stage_workers", None):
+        try:
+            parse_stage_workers(args.stage_workers)
+        except ValueError as e:
+            return str(e)
+    if getattr(args, "use_text_layer", False):
+        import text_layer
+        if text_layer.pypdf is None:
+            return "--use-text-layer needs the 'pypdf' package (pip install pypdf)"
+    if args.command == "export":
+        from results_export import EXPORTERS
+        extension = os.path.splitext(args.to)[1].lower()
+        if extension not in EXPORTERS:
+            return f"Unsupported export format '{extension}', expected one of {sorted(EXPORTERS)}"
+    if args.command == "extract" or (args.command in ("watch", "submit") and args.kind == "extract"):
+        import large_format_custom
+        if args.command != "submit" and not os.path.isfile(large_format_custom.credentials_file_path):
+            return f"Credentials file not found: {large_format_custom.credentials_file_path}"
+    return None
+
+
+def main(argv=None):
+    try:
+        args = build_parser().parse_args(argv)
+    except SystemExit as e:
+        return EXIT_OK if e.code == 0 else EXIT_USAGE
+
+    if args.command == "filter" and args.stop_words is None:
+        import stop_word_parse
+        args.stop_words = stop_word_parse.DEFAULT_STOP_WORDS_PATH
+    error = validate(args)
+    if error:
+        print(error, file=sys.stderr)
+        return EXIT_USAGE
+
+    # From here on, whatever goes wrong (service errors, a stopped run) is a failed run, not a usage error
+    try:
+        if getattr(args, "metrics", None):
+            return run_with_metrics(args)
+        return args.func(args)
+    except (FileNotFoundError, ValueError, RuntimeError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return EXIT_ERROR
+    except KeyboardInterrupt:
+        return EXIT_ERROR
+    except Exception as e:
+        print(f"Unexpected error: {e}", file=sys.stderr)
+        return EXIT_ERROR
+
+
+if __name__ == "__main__":
+    sys.exit(main())
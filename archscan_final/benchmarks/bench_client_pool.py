@@ -0,0 +1,153 @@
+"""
+Measures what sharing one pooled client saves over building clients per run or per file,
+against a local HTTPS stand-in (plain HTTP if openssl is not available to make a cert).
+
+Each "run" sends --requests-per-run requests from --threads threads, like one folder run.
+    per-file client    a new client for every request (test/read_test.py)
+    per-run client     a new client for every run (the old handle_folder_upload)
+    shared pooled      client_pool.get_shared_client for all runs
+
+--connect-latency adds a delay to every new connection on the server, to stand in for
+the extra network round trips of a TCP + TLS handshake to a remote endpoint.
+
+Run from archscan_final:  python -m benchmarks.bench_client_pool --runs 5
+"""
+import argparse
+import os
+import shutil
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from azure.ai.documentintelligence import DocumentIntelligenceClient
+from azure.core.credentials import AzureKeyCredential
+from azure.core.rest import HttpRequest
+
+import client_pool
+
+FAKE_KEY = "0" * 32
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b'{"status": "succeeded"}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, ssl_context=None, connect_latency=0.0):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.ssl_context = ssl_context
+        self.connect_latency = connect_latency
+        self.connections = 0
+        self._count_lock = threading.Lock()
+
+    def finish_request(self, request, client_address):
+        # Runs on the connection's own thread, so handshakes do not serialize on accept
+        with self._count_lock:
+            self.connections += 1
+        if self.connect_latency:
+            time.sleep(self.connect_latency)
+        if self.ssl_context is not None:
+            try:
+                request = self.ssl_context.wrap_socket(request, server_side=True)
+            except (ssl.SSLError, OSError):
+                return
+        super().finish_request(request, client_address)
+
+
+def make_ssl_context(folder):
+    if shutil.which("openssl") is None:
+        return None
+    cert_path = os.path.join(folder, "cert.pem")
+    key_path = os.path.join(folder, "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=127.0.0.1",
+         "-keyout", key_path, "-out", cert_path],
+        check=True, capture_output=True,
+    )
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert_path, key_path)
+    return context
+
+
+def send(client):
+    response = client.send_request(HttpRequest("GET", "/info"), connection_verify=False)
+    response.raise_for_status()
+
+
+def per_file_client(endpoint):
+    def call():
+        with DocumentIntelligenceClient(endpoint=endpoint, credential=AzureKeyCredential(FAKE_KEY)) as client:
+            send(client)
+    return call
+
+
+def run_mode(mode, endpoint, runs, requests_per_run, threads):
+    for _ in range(runs):
+        if mode == "per-file client":
+            call = per_file_client(endpoint)
+        elif mode == "per-run client":
+            client = DocumentIntelligenceClient(endpoint=endpoint, credential=AzureKeyCredential(FAKE_KEY))
+            call = lambda: send(client)
+        else:
+            client = client_pool.get_shared_client(DocumentIntelligenceClient, endpoint, FAKE_KEY, pool_size=threads)
+            call = lambda: send(client)
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            for future in [executor.submit(call) for _ in range(requests_per_run)]:
+                future.result()
+        if mode == "per-run client":
+            client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--requests-per-run", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--connect-latency", type=float, default=0.0)
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore", message="Unverified HTTPS request")
+
+    with tempfile.TemporaryDirectory() as cert_folder:
+        context = make_ssl_context(cert_folder)
+        server = StandInServer(context, args.connect_latency)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        scheme = "https" if context else "http"
+        endpoint = f"{scheme}://127.0.0.1:{server.server_address[1]}/"
+        total = args.runs * args.requests_per_run
+        print(f"{scheme.upper()} stand-in, {args.runs} runs x {args.requests_per_run} requests, {args.threads} threads")
+
+        baseline = None
+        for mode in ("per-file client", "per-run client", "shared pooled"):
+            server.connections = 0
+            start = time.perf_counter()
+            run_mode(mode, endpoint, args.runs, args.requests_per_run, args.threads)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(f"{mode:16s} {elapsed:7.2f}s  {total / elapsed:8.1f} req/s  speedup x{baseline / elapsed:5.1f}  "
+                  f"connections opened={server.connections}")
+
+        print(f"pool_stats: {client_pool.pool_stats(endpoint)}")
+        server.shutdown()
+        client_pool.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Compares sequential and concurrent OCR_main.handle_folder_upload against the fake client.
+
+Run from archscan_final:  python -m benchmarks.bench_concurrent_ocr --files 40
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import OCR_main
+from ocr_cache import OcrCache
+from benchmarks.fake_client import FakeDocumentIntelligenceClient
+
+
+def make_input_folder(folder, count):
+    for index in range(count):
+        with open(os.path.join(folder, f"sheet_{index:05d}.pdf"), "wb") as f:
+            f.write(b"%%PDF-1.7\n%%sheet %d\n" % index)
+
+
+def timed_run(input_folder, max_in_flight, analyze_latency, download_latency):
+    client = FakeDocumentIntelligenceClient(analyze_latency, download_latency)
+    with tempfile.TemporaryDirectory() as output_folder, tempfile.TemporaryDirectory() as cache_dir:
+        # A fresh cache per run so every file really goes through the client
+        cache = OcrCache(cache_dir)
+        start = time.perf_counter()
+        summary = OCR_main.handle_folder_upload(input_folder, output_folder, max_in_flight, client=client, cache=cache)
+        elapsed = time.perf_counter() - start
+        outputs = sorted(os.listdir(output_folder))
+    return elapsed, summary, outputs, client.max_in_flight
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=40)
+    parser.add_argument("--analyze-latency", type=float, default=0.3)
+    parser.add_argument("--download-latency", type=float, default=0.05)
+    parser.add_argument("--max-in-flight", type=int, nargs="+", default=[1, 4, 8, 16])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as input_folder:
+        make_input_folder(input_folder, args.files)
+        baseline = None
+        for max_in_flight in args.max_in_flight:
+            elapsed, summary, outputs, observed = timed_run(
+                input_folder, max_in_flight, args.analyze_latency, args.download_latency
+            )
+            if baseline is None:
+                baseline = (elapsed, summary, outputs)
+            same = summary == baseline[1] and outputs == baseline[2]
+            print(f"max_in_flight={max_in_flight:3d}  {elapsed:7.2f}s  {args.files / elapsed:7.1f} files/s  "
+                  f"speedup x{baseline[0] / elapsed:5.1f}  peak in flight={observed}  same output={same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+CPU time and stored size of the per-page document_fields layout against fields stored once per document.
+
+Run from archscan_final:  python -m benchmarks.bench_document_fields --pages 40 --fields 30
+"""
+import argparse
+import json
+import time
+
+from azure.ai.formrecognizer import AnalyzeResult
+
+from large_format_custom import build_document_result
+from results_export import document_rows, normalize_document
+
+
+def make_result(pages, fields):
+    document_fields = {
+        f"Field_{index}": {
+            "value_type": "string",
+            "value": f"value {index}",
+            "content": f"value {index}",
+            "confidence": 0.9,
+            "bounding_regions": [{"page_number": 1 + index % pages, "polygon": [{"x": 1.0, "y": 2.0}] * 4}],
+            "spans": [],
+        }
+        for index in range(fields)
+    }
+    return AnalyzeResult.from_dict({
+        "model_id": "Large_Format_2024_11_07",
+        "pages": [{"page_number": number, "width": 36, "height": 24, "unit": "inch"} for number in range(1, pages + 1)],
+        "documents": [{"doc_type": "Large_Format_2024_11_07", "fields": document_fields, "confidence": 0.9}],
+    })
+
+
+def legacy_document_result(file_name, result):
+    """
+    The previous analyze_document body: all fields rebuilt and copied onto every page.
+    """
+    document_result = {"file_name": file_name, "pages": []}
+    for page in result.pages:
+        page_info = {"page_number": page.page_number, "tables": "No tables found on this page."}
+        document_fields = {
+            name: {"value": field.value, "confidence": field.confidence}
+            for document in result.documents
+            for name, field in document.fields.items()
+        }
+        page_info["document_fields"] = document_fields
+        document_result["pages"].append(page_info)
+    return document_result
+
+
+def timed(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        value = func()
+    return (time.perf_counter() - start) / repeat, value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--fields", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    result = make_result(args.pages, args.fields)
+    old_time, old_doc = timed(lambda: legacy_document_result("set.pdf", result), args.repeat)
+    new_time, new_doc = timed(lambda: build_document_result("set.pdf", None, result), args.repeat)
+    old_size = len(json.dumps(old_doc, indent=4))
+    new_size = len(json.dumps(new_doc, indent=4))
+
+    # Old-layout documents migrate to the same field values as the new extractor produces
+    def values(doc):
+        return {name: (field["value"], field["confidence"]) for name, field in doc["document_fields"].items()}
+    assert values(normalize_document(old_doc)) == values(new_doc)
+    assert len(list(document_rows(old_doc))) == len(list(document_rows(new_doc))) == args.pages
+
+    print(f"{args.pages} pages x {args.fields} fields")
+    print(f"per-page copies   {old_time * 1000:7.3f} ms   {old_size / 1024:8.1f} KiB")
+    print(f"once per document {new_time * 1000:7.3f} ms   {new_size / 1024:8.1f} KiB   "
+          f"(x{old_time / new_time:.1f} faster, {old_size / new_size:.1f}x smaller)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Compares the old pandas read/concat/rewrite Excel export with the streaming exporters.
+
+Run from archscan_final:  python -m benchmarks.bench_excel_export --documents 5000
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+from results_export import EXPORT_COLUMNS, document_rows, export_results
+from results_store import ResultsStore
+
+
+def make_document(index):
+    fields = {
+        "Title": {"value": f"FLOOR PLAN LEVEL {index % 12}", "confidence": 0.91, "page_numbers": [1]},
+        "Date": {"value": "2024-11-07", "confidence": 0.88, "page_numbers": [1]},
+        "Drawing_Number": {"value": f"A-{index:05d}", "confidence": 0.97, "page_numbers": [1]},
+        "Originator": {"value": "ARCHSCAN", "confidence": 0.8, "page_numbers": [1]},
+        "Discipline": {"value": "Architectural", "confidence": 0.75, "page_numbers": [1]},
+        "Floor Number": {"value": str(index % 12), "confidence": 0.7, "page_numbers": [1]},
+    }
+    return {
+        "file_name": f"sheet_{index:06d}.pdf",
+        "layout_version": 2,
+        "pages": [{"page_number": 1, "tables": "No tables found on this page."}],
+        "document_fields": fields,
+    }
+
+
+def legacy_export(new_docs, excel_file_path):
+    """
+    The previous json_to_excel: build every row, read the old workbook, concat, rewrite it all.
+    """
+    df_new = pd.DataFrame([dict(zip(EXPORT_COLUMNS, row)) for doc in new_docs for row in document_rows(doc)])
+    if os.path.exists(excel_file_path):
+        df_existing = pd.read_excel(excel_file_path)
+        df_new = df_new[~df_new["File Name"].isin(df_existing["File Name"].unique())]
+        df_new = pd.concat([df_existing, df_new], ignore_index=True)
+    df_new.to_excel(excel_file_path, index=False)
+
+
+def measure(label, func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:38s} {elapsed:8.2f}s  peak {peak / 1024 ** 2:8.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--documents", type=int, default=5000, help="documents already in the project")
+    parser.add_argument("--batch", type=int, default=100, help="documents added by the new run")
+    args = parser.parse_args()
+
+    existing = [make_document(i) for i in range(args.documents)]
+    batch = [make_document(args.documents + i) for i in range(args.batch)]
+
+    with tempfile.TemporaryDirectory() as folder:
+        legacy_path = os.path.join(folder, "legacy.xlsx")
+        legacy_export(existing, legacy_path)
+        measure("legacy pandas re-read + rewrite", lambda: legacy_export(batch, legacy_path))
+
+        store = ResultsStore(os.path.join(folder, "document_results.sqlite3"))
+        store.append(existing)
+        csv_path = os.path.join(folder, "export.csv")
+        export_results(store, csv_path)
+        store.append(batch)
+
+        measure("streaming write-only .xlsx", lambda: export_results(store, os.path.join(folder, "export.xlsx")))
+        measure("incremental .csv append (new batch)", lambda: export_results(store, csv_path))
+        try:
+            import pyarrow  # noqa: F401
+            measure("streaming .parquet", lambda: export_results(store, os.path.join(folder, "export.parquet")))
+        except ImportError:
+            print("streaming .parquet                     skipped (pyarrow not installed)")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Memory and time of json.load against the streaming line extractor on a generated
+AnalyzeResult file (words, polygons and spans included, like real prebuilt-read output).
+
+Run from archscan_final:  python -m benchmarks.bench_json_stream --pages 60
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+import ocr_json_stream
+from ocr_json_stream import iter_line_contents
+
+
+def write_result_file(path, pages, lines_per_page, words_per_line=6, seed=11):
+    rng = random.Random(seed)
+    vocabulary = [f"word{i}" for i in range(5000)] + ["THE", "of", "PLAN", "A-101", "DOOR", "WALL"]
+    offset = 0
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"apiVersion": "2024-11-30", "modelId": "prebuilt-read", "stringIndexType": "textElements", ')
+        f.write('"content": "' + "x " * 200000 + '", "pages": [')
+        for number in range(1, pages + 1):
+            words, lines = [], []
+            for _ in range(lines_per_page):
+                tokens = [rng.choice(vocabulary) for _ in range(words_per_line)]
+                content = " ".join(tokens)
+                polygon = [round(rng.uniform(0, 36), 4) for _ in range(8)]
+                lines.append({"content": content, "polygon": polygon, "spans": [{"offset": offset, "length": len(content)}]})
+                for token in tokens:
+                    words.append({"content": token, "polygon": polygon, "confidence": 0.99,
+                                  "span": {"offset": offset, "length": len(token)}})
+                    offset += len(token) + 1
+            page = {"pageNumber": number, "angle": 0, "width": 36, "height": 24, "unit": "inch",
+                    "words": words, "lines": lines, "spans": [{"offset": 0, "length": offset}]}
+            f.write(("," if number > 1 else "") + json.dumps(page, indent=4))
+        f.write('], "paragraphs": [], "styles": []}')
+
+
+def load_all(path):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return [line.get("content", "") for page in data.get("pages", []) for line in page.get("lines", [])]
+
+
+def run(label, func):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:28s} {elapsed:7.2f}s   peak {peak / 1024 ** 2:8.1f} MiB")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=60)
+    parser.add_argument("--lines-per-page", type=int, default=1500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "large_result.json")
+        write_result_file(path, args.pages, args.lines_per_page)
+        print(f"{args.pages} pages, {os.path.getsize(path) / 1024 ** 2:.0f} MiB of JSON")
+
+        expected = run("json.load (current)", lambda: load_all(path))
+        streamed = run("streaming (built-in)", lambda: list(iter_line_contents(path, use_ijson=False)))
+        assert streamed == expected
+        if ocr_json_stream.ijson is not None:
+            streamed = run("streaming (ijson)", lambda: list(iter_line_contents(path, use_ijson=True)))
+            assert streamed == expected
+        else:
+            print("streaming (ijson)            skipped (ijson not installed)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Measures peak RSS and small-file turnaround for a folder mixing large-format scans with
+ordinary sheets, uploaded through the real SDK client to the fake Azure server.
+
+    whole-file reads   every upload read into a bytes object first, one lane (the old polling engine)
+    streamed, 1 lane   open_upload() bodies, all files on one run_in_order pool
+    streamed, 2 lanes  open_upload() bodies, concurrent_ocr.run_by_size
+
+"small done" is when the last small file finished: with one lane it waits behind the
+big uploads, with the size lanes it does not.
+
+Run from archscan_final:  python -m benchmarks.bench_large_uploads --large 6 --large-mb 200
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+FAKE_KEY = "0" * 32
+
+_CHILD = r"""
+import os, resource, sys, time
+from azure.ai.documentintelligence import DocumentIntelligenceClient
+from client_pool import get_shared_client
+from concurrent_ocr import run_by_size, run_in_order
+from upload_io import LARGE_FILE_BYTES, open_upload
+
+mode, endpoint, folder, max_in_flight = sys.argv[1], sys.argv[2], sys.argv[3], int(sys.argv[4])
+client = get_shared_client(DocumentIntelligenceClient, endpoint, "0" * 32, polling_interval=0.05)
+files = sorted(os.path.join(folder, name) for name in os.listdir(folder))
+start = time.perf_counter()
+small_done = [0.0]
+
+def analyze(file_path):
+    if mode == "whole":
+        with open(file_path, "rb") as f:
+            body = f.read()
+        client.begin_analyze_document("prebuilt-read", body, content_type="application/octet-stream").result()
+    else:
+        with open_upload(file_path) as f:
+            client.begin_analyze_document("prebuilt-read", f, content_type="application/octet-stream").result()
+    if os.path.getsize(file_path) < LARGE_FILE_BYTES:
+        small_done[0] = max(small_done[0], time.perf_counter() - start)
+
+if mode == "lanes":
+    run_by_size(analyze, files, max_in_flight)
+else:
+    run_in_order(analyze, files, max_in_flight)
+print(time.perf_counter() - start, small_done[0], resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+"""
+
+
+def make_folder(folder, large, large_mb, small, small_kb):
+    # Large files are sparse, so making them is quick and the page cache does the rest
+    for index in range(large):
+        with open(os.path.join(folder, f"e_size_{index:03d}.pdf"), "wb") as f:
+            f.write(b"%%PDF-1.7\n%%e-size %d\n" % index)
+            f.truncate(large_mb * 1024 * 1024)
+    for index in range(small):
+        with open(os.path.join(folder, f"sheet_{index:04d}.pdf"), "wb") as f:
+            f.write(b"%%PDF-1.7\n%%sheet %d\n" % index + os.urandom(small_kb * 1024))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--large", type=int, default=6)
+    parser.add_argument("--large-mb", type=int, default=200)
+    parser.add_argument("--small", type=int, default=200)
+    parser.add_argument("--small-kb", type=int, default=256)
+    parser.add_argument("--max-in-flight", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--upload-mb-per-s", type=float, default=200.0, help="uplink shared by all uploads")
+    args = parser.parse_args()
+
+    from benchmarks.fake_azure_server import start_server_process
+
+    # The fake server keeps no uploads (no output=pdf), so its memory stays flat
+    server, endpoint = start_server_process(latency=args.latency, upload_mb_per_s=args.upload_mb_per_s)
+    try:
+        with tempfile.TemporaryDirectory() as folder:
+            make_folder(folder, args.large, args.large_mb, args.small, args.small_kb)
+            print(f"{args.large} x {args.large_mb} MB + {args.small} x {args.small_kb} KB, "
+                  f"{args.max_in_flight} in flight, {args.upload_mb_per_s} MB/s uplink")
+            for mode, label in (("whole", "whole-file reads"), ("stream", "streamed, 1 lane"),
+                                ("lanes", "streamed, 2 lanes")):
+                # A fresh interpreter per mode, so each peak RSS is its own
+                output = subprocess.run(
+                    [sys.executable, "-c", _CHILD, mode, endpoint, folder, str(args.max_in_flight)],
+                    check=True, capture_output=True, text=True, cwd=os.getcwd(),
+                ).stdout.split()
+                elapsed, small_done, peak = float(output[0]), float(output[1]), int(output[2])
+                print(f"{label:18s} total {elapsed:7.2f}s  small done {small_done:7.2f}s  "
+                      f"peak RSS {peak / 1e6:8.1f} MB")
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
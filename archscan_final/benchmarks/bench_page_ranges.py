@@ -0,0 +1,81 @@
+"""
+Measures split mode on one long plan set against the fake Azure server, whose analysis
+time grows with the page count, and checks that the merged result is the same as the
+single-shot one.
+
+    single-shot   OCR_main.process_pdf, one operation for the whole PDF
+    split         OCR_main.process_pdf with pages_per_range, ranges analyzed concurrently
+
+Run from archscan_final:  python -m benchmarks.bench_page_ranges --pages 600 --pages-per-range 50
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from azure.ai.documentintelligence import DocumentIntelligenceClient
+
+import OCR_main
+import page_ranges
+from client_pool import get_shared_client
+from ocr_cache import OcrCache
+from benchmarks.fake_azure_server import start_server_process
+
+FAKE_KEY = "0" * 32
+
+
+def make_plan_set(file_path, pages):
+    # Just enough PDF structure for the page count to be read from the page tree
+    with open(file_path, "wb") as f:
+        f.write(b"%PDF-1.7\n1 0 obj << /Type /Catalog /Pages 2 0 R >> endobj\n")
+        f.write(b"2 0 obj << /Type /Pages /Count %d >> endobj\n" % pages)
+        for index in range(pages):
+            f.write(b"%d 0 obj << /Type /Page /Parent 2 0 R >> endobj\n" % (index + 3))
+        f.write(b"%%EOF\n")
+
+
+def run(client, file_path, output_folder, cache_folder, pages_per_range):
+    os.makedirs(output_folder)
+    start = time.perf_counter()
+    summary = OCR_main.process_pdf(file_path, output_folder, client, OcrCache(cache_folder),
+                                   pages_per_range=pages_per_range)
+    elapsed = time.perf_counter() - start
+    if not summary.startswith("Processed"):
+        raise RuntimeError(summary)
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    with open(os.path.join(output_folder, f"{name}.json"), "r", encoding="utf-8") as f:
+        return elapsed, json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=600)
+    parser.add_argument("--pages-per-range", type=int, default=50)
+    parser.add_argument("--latency-per-page", type=float, default=0.02, help="fake analysis time per page")
+    args = parser.parse_args()
+
+    server, endpoint = start_server_process(latency=0.2, latency_per_page=args.latency_per_page, lines_per_page=20)
+    try:
+        client = get_shared_client(DocumentIntelligenceClient, endpoint, FAKE_KEY, polling_interval=0.05)
+        with tempfile.TemporaryDirectory() as folder:
+            file_path = os.path.join(folder, "plan_set.pdf")
+            make_plan_set(file_path, args.pages)
+            ranges = page_ranges.plan_page_ranges(file_path, args.pages_per_range)
+            print(f"{args.pages} pages, {len(ranges)} ranges of {args.pages_per_range}, "
+                  f"{page_ranges.DEFAULT_RANGES_IN_FLIGHT} in flight, "
+                  f"local splitting: {'yes' if page_ranges.pypdf else 'no (pages parameter)'}")
+
+            single_time, single = run(client, file_path, os.path.join(folder, "single"),
+                                      os.path.join(folder, "cache_single"), None)
+            split_time, split = run(client, file_path, os.path.join(folder, "split"),
+                                    os.path.join(folder, "cache_split"), args.pages_per_range)
+            print(f"single-shot {single_time:7.2f}s")
+            print(f"split       {split_time:7.2f}s  x{single_time / split_time:.1f}")
+            print(f"merged result identical to single-shot: {split == single}")
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
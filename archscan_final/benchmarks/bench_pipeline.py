@@ -0,0 +1,65 @@
+"""
+Compares OCR_main.handle_folder_upload run file by file on max_in_flight threads with
+the staged pipeline (pipelined=True, see ocr_pipeline) against the fake client.
+
+Each file waits analyze_latency on the "service" and download_latency for its PDF, and
+--pages sets the size of each result, i.e. the CPU spent encoding it as indented JSON and
+filtering it. With several cores the serialize and filter stages run on other cores than
+the network threads; on one core the pipeline can only overlap the waits.
+
+Run from archscan_final:  python -m benchmarks.bench_pipeline --files 200 --pages 20
+"""
+import argparse
+import os
+import resource
+import tempfile
+import time
+
+import OCR_main
+from ocr_cache import OcrCache
+from benchmarks.bench_concurrent_ocr import make_input_folder
+from benchmarks.fake_client import FakeDocumentIntelligenceClient
+
+
+def timed_run(input_folder, args, **options):
+    client = FakeDocumentIntelligenceClient(args.analyze_latency, args.download_latency, pages=args.pages)
+    with tempfile.TemporaryDirectory() as output_folder, tempfile.TemporaryDirectory() as cache_dir:
+        start = time.perf_counter()
+        summary = OCR_main.handle_folder_upload(
+            input_folder, output_folder, args.max_in_flight, client=client, cache=OcrCache(cache_dir), **options
+        )
+        elapsed = time.perf_counter() - start
+        # Operation ids differ between runs, and with them the text of the results: only the names are compared
+        outputs = sorted(os.listdir(output_folder))
+    return elapsed, sorted(summary.splitlines()), outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--pages", type=int, default=20, help="pages per result")
+    parser.add_argument("--analyze-latency", type=float, default=1.0)
+    parser.add_argument("--download-latency", type=float, default=0.2)
+    parser.add_argument("--max-in-flight", type=int, default=8)
+    parser.add_argument("--stage-workers", default="analyze=8,download=8", help="pipeline workers per stage")
+    args = parser.parse_args()
+
+    from ocr_pipeline import parse_stage_workers
+    stage_workers = parse_stage_workers(args.stage_workers)
+
+    print(f"{args.files} files, {args.pages} pages each, {os.cpu_count()} CPU(s)")
+    with tempfile.TemporaryDirectory() as input_folder:
+        make_input_folder(input_folder, args.files)
+        baseline = None
+        for label, options in (("threads", {}), ("pipeline", {"pipelined": True, "stage_workers": stage_workers})):
+            elapsed, summary, outputs = timed_run(input_folder, args, **options)
+            if baseline is None:
+                baseline = (elapsed, summary, outputs)
+            same = (summary, outputs) == baseline[1:]
+            peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            print(f"{label:10s} {elapsed:7.2f}s  {args.files / elapsed:7.1f} files/s  "
+                  f"speedup x{baseline[0] / elapsed:5.2f}  peak RSS so far {peak_mb:7.1f} MB  same output files={same}")
+
+
+if __name__ == "__main__":
+    main()
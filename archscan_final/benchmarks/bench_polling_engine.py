@@ -0,0 +1,67 @@
+"""
+Compares thread-per-analysis OCR_main.handle_folder_upload with the submit-then-poll
+engine (max_operations) against the fake client.
+
+Run from archscan_final:  python -m benchmarks.bench_polling_engine --files 100
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+import OCR_main
+from ocr_cache import OcrCache
+from benchmarks.bench_concurrent_ocr import make_input_folder
+from benchmarks.fake_client import FakeDocumentIntelligenceClient
+
+
+def timed_run(input_folder, max_in_flight, max_operations, analyze_latency):
+    client = FakeDocumentIntelligenceClient(analyze_latency, download_latency=0.02)
+    peak_threads = [threading.active_count()]
+    done = threading.Event()
+
+    def watch_threads():
+        while not done.wait(0.05):
+            peak_threads[0] = max(peak_threads[0], threading.active_count())
+
+    watcher = threading.Thread(target=watch_threads, daemon=True)
+    watcher.start()
+    with tempfile.TemporaryDirectory() as output_folder, tempfile.TemporaryDirectory() as cache_dir:
+        start = time.perf_counter()
+        summary = OCR_main.handle_folder_upload(
+            input_folder, output_folder, max_in_flight, client=client, cache=OcrCache(cache_dir),
+            max_operations=max_operations
+        )
+        elapsed = time.perf_counter() - start
+        outputs = sorted(os.listdir(output_folder))
+    done.set()
+    watcher.join()
+    # The watcher itself is not part of the run
+    return elapsed, summary, outputs, client.max_in_flight, peak_threads[0] - 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=100)
+    parser.add_argument("--analyze-latency", type=float, default=2.0)
+    parser.add_argument("--max-in-flight", type=int, default=8)
+    parser.add_argument("--max-operations", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as input_folder:
+        make_input_folder(input_folder, args.files)
+        baseline = None
+        for label, max_operations in (("threads", None), ("polling engine", args.max_operations)):
+            elapsed, summary, outputs, open_ops, threads = timed_run(
+                input_folder, args.max_in_flight, max_operations, args.analyze_latency
+            )
+            if baseline is None:
+                baseline = (elapsed, summary, outputs)
+            same = summary == baseline[1] and outputs == baseline[2]
+            print(f"{label:15s} {elapsed:7.2f}s  {args.files / elapsed:7.1f} files/s  speedup x{baseline[0] / elapsed:5.1f}  "
+                  f"peak open analyses={open_ops:4d}  peak threads={threads:3d}  same output={same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Size, write time and load time of each result_format against the pretty-printed JSON.
+
+Run from archscan_final:  python -m benchmarks.bench_result_format --pages 20
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from ocr_json_stream import iter_line_contents
+from result_format import RESULT_FORMATS, load_result, result_path, write_result
+
+
+def make_result(pages, lines_per_page, words_per_line=6, seed=5):
+    rng = random.Random(seed)
+    vocabulary = [f"word{i}" for i in range(5000)] + ["THE", "of", "PLAN", "A-101", "DOOR", "WALL"]
+    offset = 0
+    result_pages = []
+    for number in range(1, pages + 1):
+        words, lines = [], []
+        for _ in range(lines_per_page):
+            tokens = [rng.choice(vocabulary) for _ in range(words_per_line)]
+            content = " ".join(tokens)
+            lines.append({"content": content, "polygon": [round(rng.uniform(0, 36), 4) for _ in range(8)],
+                          "spans": [{"offset": offset, "length": len(content)}]})
+            for token in tokens:
+                words.append({"content": token, "polygon": [round(rng.uniform(0, 36), 4) for _ in range(8)],
+                              "confidence": round(rng.uniform(0.5, 1), 3),
+                              "span": {"offset": offset, "length": len(token)}})
+                offset += len(token) + 1
+        result_pages.append({"pageNumber": number, "angle": 0, "width": 36, "height": 24, "unit": "inch",
+                             "words": words, "lines": lines, "spans": [{"offset": 0, "length": offset}]})
+    return {"apiVersion": "2024-11-30", "modelId": "prebuilt-read", "content": "", "pages": result_pages}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--lines-per-page", type=int, default=1000)
+    args = parser.parse_args()
+
+    result = make_result(args.pages, args.lines_per_page)
+    expected_lines = [line["content"] for page in result["pages"] for line in page["lines"]]
+
+    with tempfile.TemporaryDirectory() as folder:
+        baseline = None
+        for result_format in RESULT_FORMATS:
+            path = result_path(os.path.join(folder, "result"), result_format)
+            try:
+                start = time.perf_counter()
+                size = write_result(result, path, result_format)
+                write_time = time.perf_counter() - start
+            except RuntimeError as e:
+                print(f"{result_format:12s} skipped: {e}")
+                continue
+            start = time.perf_counter()
+            loaded = load_result(path)
+            load_time = time.perf_counter() - start
+            assert list(iter_line_contents(path)) == expected_lines
+            assert loaded["pages"][0]["lines"][0]["content"] == expected_lines[0]
+            if baseline is None:
+                baseline = size
+            print(f"{result_format:12s} {size / 1024 ** 2:8.2f} MiB ({100.0 * size / baseline:5.1f}%)   "
+                  f"write {write_time:6.2f}s   load {load_time:6.2f}s")
+
+
+if __name__ == "__main__":
+    main()
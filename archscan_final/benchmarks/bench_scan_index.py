@@ -0,0 +1,101 @@
+"""
+Measures finding the PDFs of a large tree with os.walk and with the scan index.
+
+    os.walk        one thread listing every folder, as the processors did before
+    index, first   scan_index.iter_pdf_files on an empty index (parallel walk, every folder listed)
+    index, again   the same tree unchanged: folders are stat'ed, none is listed
+    index, 1% new  new files in 1% of the folders: only those are listed again
+
+--latency-ms adds a delay to every stat and folder listing, standing in for the round
+trip to a NAS (a local disk answers from its cache in microseconds, which hides what the
+threads and the index save).
+
+Run from archscan_final:  python -m benchmarks.bench_scan_index --folders 2000 --files 50 --latency-ms 2
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import scan_index
+
+
+def make_tree(root, folders, files_per_folder):
+    folder_paths = []
+    for index in range(folders):
+        folder = os.path.join(root, f"project_{index // 100:03d}", f"sheet_set_{index:05d}")
+        os.makedirs(folder)
+        for number in range(files_per_folder):
+            with open(os.path.join(folder, f"drawing_{number:04d}.pdf"), "wb") as f:
+                f.write(b"%PDF-1.4\n")
+        folder_paths.append(folder)
+    # Old enough for the index to trust the folder mtimes
+    old = time.time() - 3600
+    for dirpath, _, _ in os.walk(root):
+        os.utime(dirpath, (old, old))
+    return folder_paths
+
+
+def add_latency(seconds):
+    real_stat, real_scandir = os.stat, os.scandir
+
+    def slow_stat(*args, **kwargs):
+        time.sleep(seconds)
+        return real_stat(*args, **kwargs)
+
+    def slow_scandir(*args, **kwargs):
+        time.sleep(seconds)
+        return real_scandir(*args, **kwargs)
+
+    os.stat, os.scandir = slow_stat, slow_scandir
+
+
+def walk_pdfs(root):
+    return [os.path.join(dirpath, name) for dirpath, _, names in os.walk(root)
+            for name in names if name.lower().endswith(".pdf")]
+
+
+def timed_run(label, find):
+    start = time.perf_counter()
+    first = None
+    count = 0
+    for _ in find():
+        if first is None:
+            first = time.perf_counter() - start
+        count += 1
+    elapsed = time.perf_counter() - start
+    print(f"{label:15s} {elapsed:8.2f}s  first file after {first or 0:6.3f}s  {count} files")
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--folders", type=int, default=2000)
+    parser.add_argument("--files", type=int, default=50, help="PDFs per folder")
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="added to every stat and folder listing")
+    parser.add_argument("--threads", type=int, default=scan_index.DEFAULT_WALK_THREADS)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_folder:
+        root = os.path.join(work_folder, "archive")
+        folder_paths = make_tree(root, args.folders, args.files)
+        index = scan_index.ScanIndex(os.path.join(work_folder, "scan_index.sqlite3"))
+        print(f"{args.folders} folders, {args.folders * args.files} PDFs, "
+              f"{args.latency_ms:g} ms per stat/listing, {args.threads} walk threads")
+        add_latency(args.latency_ms / 1000)
+
+        timed_run("os.walk", lambda: walk_pdfs(root))
+        timed_run("index, first", lambda: scan_index.iter_files(root, None, index, args.threads))
+        timed_run("index, again", lambda: scan_index.iter_files(root, None, index, args.threads))
+
+        changed = random.Random(0).sample(folder_paths, max(1, len(folder_paths) // 100))
+        for folder in changed:
+            with open(os.path.join(folder, "drawing_new.pdf"), "wb") as f:
+                f.write(b"%PDF-1.4\n")
+        timed_run("index, 1% new", lambda: scan_index.iter_files(root, None, index, args.threads))
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Per-page stop-word filtering: the old nested loop against stop_words.StopWordFilter.
+
+Run from archscan_final:  python -m benchmarks.bench_stop_words --pages 300
+"""
+import argparse
+import random
+import time
+
+from stop_words import PUNCTUATION, StopWordFilter, read_stop_words
+
+STOP_WORDS_FILE_PATH = "text_files/stop_words.txt"
+
+
+def make_pages(stop_words, pages, lines_per_page, seed=7):
+    """
+    Synthetic prebuilt-read pages: title-block style labels mixed with note text,
+    about a third of the tokens being stop words in varying case/punctuation.
+    """
+    rng = random.Random(seed)
+    stop_list = sorted(stop_words)
+    labels = [f"A-{i:03d}" for i in range(400)] + ["WALL", "DOOR", "TYP.", "(E)", "3'-0\"", "PLAN", "SECTION",
+                                                    "DETAIL", "CONC.", "SLAB", "GRID", "ELEV."]
+    notes = [f"word{i}" for i in range(2000)]
+
+    def token():
+        roll = rng.random()
+        if roll < 0.33:
+            word = rng.choice(stop_list)
+            style = rng.random()
+            word = word.upper() if style < 0.5 else word.title() if style < 0.7 else word
+            return word + "," if rng.random() < 0.1 else word
+        return rng.choice(labels) if roll < 0.7 else rng.choice(notes)
+
+    return [
+        {
+            "pageNumber": number,
+            "lines": [
+                {"content": " ".join(token() for _ in range(rng.randint(1, 9))), "polygon": [0.0] * 8}
+                for _ in range(lines_per_page)
+            ],
+        }
+        for number in range(1, pages + 1)
+    ]
+
+
+def legacy_filter(pages, stop_words):
+    filtered_text = []
+    for page in pages:
+        for line in page.get("lines", []):
+            content = line.get("content", "")
+            words = content.split()
+            filtered_words = [word for word in words if word.lower() not in stop_words]
+            filtered_text.append(" ".join(filtered_words))
+    return filtered_text
+
+
+def legacy_filter_normalized(pages, stop_words):
+    filtered_text = []
+    for page in pages:
+        for line in page.get("lines", []):
+            words = line.get("content", "").split()
+            filtered_words = [word for word in words if word.lower().strip(PUNCTUATION) not in stop_words]
+            filtered_text.append(" ".join(filtered_words))
+    return filtered_text
+
+
+def timed(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--lines-per-page", type=int, default=1500)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    stop_words = read_stop_words(STOP_WORDS_FILE_PATH)
+    pages = make_pages(stop_words, args.pages, args.lines_per_page)
+    print(f"{args.pages} pages x {args.lines_per_page} lines")
+
+    for label, legacy, normalize in (
+        ("plain", legacy_filter, False),
+        ("punctuation-normalized", legacy_filter_normalized, True),
+    ):
+        legacy_time, expected = timed(lambda: legacy(pages, stop_words), args.repeat)
+        # A fresh filter per repeat so the token table is rebuilt each time
+        new_time, actual = timed(lambda: StopWordFilter(stop_words, normalize).filter_pages(pages), args.repeat)
+        per_page = 1000.0 / args.pages
+        print(f"{label:24s} loop {legacy_time * per_page:7.3f} ms/page   filter {new_time * per_page:7.3f} ms/page   "
+              f"speedup x{legacy_time / new_time:4.2f}   identical={actual == expected}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+End-to-end offline benchmark suite against the fake Azure server.
+
+For every scale (number of input PDFs) it times, with the real SDK clients:
+    process_pdf             OCR_main.handle_folder_upload (prebuilt-read, PDF + result + _filtered.txt)
+    process_folder          large_format_custom.process_folder (custom model into the results store)
+    json_to_excel           large_format_custom.json_to_excel over that store
+    filter_text_from_json   OCR_main.filter_text_from_json over the OCR result files
+
+and reports documents/s and memory per stage: the process's peak RSS so far, or with
+--trace-memory the peak traced Python allocations of the stage itself (tracemalloc
+slows the SDK down about 3x, so keep the two kinds of run apart). The fake server runs
+in its own process, so neither its threads nor its memory are in the numbers.
+
+    python -m benchmarks.bench_suite --documents 10 1000 --save baseline.json
+    python -m benchmarks.bench_suite --documents 10 1000 --compare baseline.json
+
+With --compare, the run exits with status 1 if any stage is more than --tolerance slower
+(documents/s) or uses more than --tolerance more peak memory than the baseline.
+Use --documents 50000 for the large-format scale.
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from azure.ai.documentintelligence import DocumentIntelligenceClient
+from azure.ai.formrecognizer import DocumentAnalysisClient
+
+import OCR_main
+import large_format_custom
+from client_pool import get_shared_client
+from ocr_cache import OcrCache
+from rate_limiter import AdaptiveRateLimiter
+from results_store import open_results_store
+from benchmarks.fake_azure_server import start_server_process
+
+STAGES = ["process_pdf", "process_folder", "json_to_excel", "filter_text_from_json"]
+FAKE_KEY = "0" * 32
+
+
+def make_input_folder(folder, count):
+    # Every file has different bytes, so nothing is served from the OCR cache
+    for index in range(count):
+        with open(os.path.join(folder, f"sheet_{index:06d}.pdf"), "wb") as f:
+            f.write(b"%%PDF-1.7\n%%scale %d sheet %d\n" % (count, index))
+
+
+def measure(func, trace_memory):
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    failed = func()
+    elapsed = time.perf_counter() - start
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    else:
+        # ru_maxrss is in KiB on Linux
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return elapsed, peak, failed or 0
+
+
+def run_scale(count, endpoint, max_in_flight, work_folder, trace_memory=False):
+    input_folder = os.path.join(work_folder, "input")
+    ocr_folder = os.path.join(work_folder, "ocr")
+    extract_folder = os.path.join(work_folder, "extract")
+    for folder in (input_folder, ocr_folder, extract_folder):
+        os.makedirs(folder)
+    make_input_folder(input_folder, count)
+
+    read_client = get_shared_client(DocumentIntelligenceClient, endpoint, FAKE_KEY, polling_interval=0.05)
+    custom_client = get_shared_client(DocumentAnalysisClient, endpoint, FAKE_KEY, polling_interval=0.05)
+    store = open_results_store(extract_folder)
+
+    def process_pdf():
+        summary = OCR_main.handle_folder_upload(
+            input_folder, ocr_folder, max_in_flight, client=read_client,
+            cache=OcrCache(os.path.join(work_folder, "cache_read"))
+        )
+        return sum(1 for line in summary.splitlines() if line.startswith("Failed"))
+
+    def process_folder():
+        _, unsupported, throttled = large_format_custom.process_folder(
+            custom_client, large_format_custom.DEFAULT_MODEL_ID, input_folder, store,
+            os.path.join(extract_folder, "unsupported_files.txt"), os.path.join(extract_folder, "throttled_files.txt"),
+            AdaptiveRateLimiter(requests_per_second=10000, max_concurrency=max_in_flight),
+            OcrCache(os.path.join(work_folder, "cache_custom")),
+        )
+        return len(unsupported) + len(throttled)
+
+    def json_to_excel():
+        large_format_custom.json_to_excel(store, os.path.join(extract_folder, "document_analysis_results.xlsx"))
+
+    def filter_text_from_json():
+        failed = 0
+        for name in sorted(os.listdir(ocr_folder)):
+            if name.endswith(".json"):
+                output_path = os.path.join(ocr_folder, name[:-5] + "_refiltered.txt")
+                OCR_main.filter_text_from_json(os.path.join(ocr_folder, name), OCR_main.STOP_WORD_FILTER, output_path)
+                failed += not os.path.exists(output_path)
+        return failed
+
+    results = {}
+    try:
+        for stage, func in zip(STAGES, (process_pdf, process_folder, json_to_excel, filter_text_from_json)):
+            elapsed, peak, failed = measure(func, trace_memory)
+            results[stage] = {
+                "seconds": round(elapsed, 4),
+                "documents_per_second": round(count / elapsed, 2),
+                "peak_mb": round(peak / 1e6, 2),
+                "memory": "traced" if trace_memory else "rss",
+                "failed": failed,
+            }
+            print(f"{count:7d} docs  {stage:22s} {elapsed:8.2f}s  {count / elapsed:9.1f} docs/s  "
+                  f"peak {peak / 1e6:8.2f} MB  failed={failed}", flush=True)
+    finally:
+        store.close()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns the list of regressions of results against baseline.
+    """
+    regressions = []
+    for scale, stages in results.items():
+        for stage, current in stages.items():
+            previous = baseline.get(scale, {}).get(stage)
+            if not previous:
+                continue
+            if current.get("memory") != previous.get("memory"):
+                regressions.append(f"{scale} docs {stage}: baseline measured {previous.get('memory')} memory, "
+                                   f"this run {current.get('memory')}; rerun with the same --trace-memory setting")
+                continue
+            if current["documents_per_second"] < previous["documents_per_second"] * (1 - tolerance):
+                regressions.append(f"{scale} docs {stage}: {current['documents_per_second']} docs/s "
+                                   f"(baseline {previous['documents_per_second']})")
+            if current["peak_mb"] > max(previous["peak_mb"] * (1 + tolerance), previous["peak_mb"] + 1.0):
+                regressions.append(f"{scale} docs {stage}: peak {current['peak_mb']} MB "
+                                   f"(baseline {previous['peak_mb']})")
+            if current["failed"] > previous["failed"]:
+                regressions.append(f"{scale} docs {stage}: {current['failed']} failed (baseline {previous['failed']})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, nargs="+", default=[10, 1000])
+    parser.add_argument("--max-in-flight", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.05, help="fake analysis time per document")
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--save", default=None, help="write the results to this JSON file")
+    parser.add_argument("--compare", default=None, help="baseline JSON file from an earlier --save")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--trace-memory", action="store_true", help="per-stage tracemalloc peaks instead of RSS")
+    args = parser.parse_args()
+
+    server, endpoint = start_server_process(
+        latency=args.latency, throttle_rate=args.throttle_rate, failure_rate=args.failure_rate
+    )
+    results = {}
+    try:
+        for count in args.documents:
+            with tempfile.TemporaryDirectory() as work_folder:
+                results[str(count)] = run_scale(
+                    count, endpoint, args.max_in_flight, work_folder, args.trace_memory
+                )
+    finally:
+        server.terminate()
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION  {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Compares OCR_main.handle_folder_upload with and without the text-layer pre-check
+(use_text_layer=True, see text_layer) on a folder where --digital of every 100 files are
+born-digital PDFs with text on each page, --mixed are born-digital sets with a scanned
+cover sheet (text on every page but the first), and the rest are scans with no text layer.
+
+The scans cost analyze_latency + download_latency on the fake client either way; the
+born-digital files cost one local read of their text instead, and the mixed ones a read
+plus the analysis of their cover alone. The pre-check's own price is the page read that
+rejects each scan. Needs pypdf.
+
+Run from archscan_final:  python -m benchmarks.bench_text_layer --files 200 --digital 40 --mixed 20
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import OCR_main
+from ocr_cache import OcrCache
+from benchmarks.fake_client import FakeDocumentIntelligenceClient
+
+SHEET_LINES = [
+    "SHEET A-{page:03d}  FLOOR PLAN - LEVEL {page}",
+    "DRAWN BY: J. SMITH   CHECKED BY: R. JONES   DATE: 2024-11-07",
+    "GENERAL NOTES: ALL DIMENSIONS TO FACE OF STUD UNLESS NOTED OTHERWISE",
+    "DOOR SCHEDULE SEE SHEET A-601   WINDOW SCHEDULE SEE SHEET A-602",
+]
+
+
+def make_pdf(path, pages, with_text):
+    """
+    Writes a PDF of 36 x 24 inch sheets with a few lines of Helvetica text on every page if
+    with_text is True, or on the page numbers in with_text if it is a collection.
+    """
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page in range(1, pages + 1):
+        text = page in with_text if isinstance(with_text, (set, frozenset, list, tuple)) else with_text
+        lines = [line.format(page=page) for line in SHEET_LINES] if text else []
+        stream = b"BT /F1 24 Tf 72 1600 Td 30 TL " + b"".join(
+            b"(" + line.encode("latin-1") + b") Tj T* " for line in lines) + b"ET"
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        contents = len(objects)
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 2592 1728] /Contents %d 0 R "
+                       b"/Resources << /Font << /F1 3 0 R >> >> >>" % contents)
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [" + b" ".join(kids) + b"] /Count %d >>" % pages
+
+    # The file name in a comment keeps the scans from sharing one hash (and one cache entry)
+    body = bytearray(b"%%PDF-1.7\n%%%s\n" % os.path.basename(path).encode())
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(body))
+        body += b"%d 0 obj\n" % number + obj + b"\nendobj\n"
+    xref = len(body)
+    body += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    body += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    body += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(body)
+
+
+def timed_run(input_folder, args, **options):
+    # Page ranges are joined with pypdf, so the fake searchable PDF has to be a real one
+    client = FakeDocumentIntelligenceClient(args.analyze_latency, args.download_latency, pdf_bytes=args.pdf_bytes,
+                                            pages=args.pages)
+    with tempfile.TemporaryDirectory() as output_folder, tempfile.TemporaryDirectory() as cache_dir:
+        start = time.perf_counter()
+        summary = OCR_main.handle_folder_upload(
+            input_folder, output_folder, args.max_in_flight, client=client, cache=OcrCache(cache_dir), **options
+        )
+        elapsed = time.perf_counter() - start
+        outputs = sorted(os.listdir(output_folder))
+    return elapsed, summary, outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--digital", type=int, default=40, help="born-digital files per 100")
+    parser.add_argument("--mixed", type=int, default=0, help="files per 100 with text on all but the first page")
+    parser.add_argument("--pages", type=int, default=4, help="pages per file")
+    parser.add_argument("--analyze-latency", type=float, default=1.0)
+    parser.add_argument("--download-latency", type=float, default=0.2)
+    parser.add_argument("--max-in-flight", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as input_folder:
+        searchable_pdf = os.path.join(input_folder, "searchable.bin")
+        make_pdf(searchable_pdf, args.pages, with_text=True)
+        with open(searchable_pdf, "rb") as f:
+            args.pdf_bytes = f.read()
+        os.remove(searchable_pdf)
+        for index in range(args.files):
+            share = index % 100
+            if share < args.digital:
+                with_text = True
+            elif share < args.digital + args.mixed:
+                with_text = set(range(2, args.pages + 1))
+            else:
+                with_text = False
+            make_pdf(os.path.join(input_folder, f"sheet_{index:05d}.pdf"), args.pages, with_text)
+        print(f"{args.files} files of {args.pages} pages, {args.digital}% born-digital, {args.mixed}% mixed")
+        baseline = None
+        for label, use_text_layer in (("service", False), ("text layer", True)):
+            elapsed, summary, outputs = timed_run(input_folder, args, use_text_layer=use_text_layer)
+            if baseline is None:
+                baseline = (elapsed, outputs)
+            print(f"{label:10s} {elapsed:7.2f}s  {args.files / elapsed:7.1f} files/s  "
+                  f"speedup x{baseline[0] / elapsed:5.2f}  same output files={outputs == baseline[1]}")
+            if use_text_layer:
+                print(summary.splitlines()[-1])
+
+
+if __name__ == "__main__":
+    main()
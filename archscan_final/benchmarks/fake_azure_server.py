@@ -0,0 +1,434 @@
+"""
+Local stand-in for the Azure Document Intelligence REST API, so the real SDK clients
+and the whole pipeline can run without Azure keys.
+
+Implements, for both the Document Intelligence (/documentintelligence, used by OCR_main
+and nasa_ocr_read) and the Form Recognizer (/formrecognizer, used by large_format_custom)
+routes:
+    POST documentModels/{model}:analyze                 202 + Operation-Location
+    GET  documentModels/{model}/analyzeResults/{id}      running / succeeded / failed
+    GET  documentModels/{model}/analyzeResults/{id}/pdf  the searchable PDF (the upload echoed back)
+
+Results are recorded AnalyzeResult payloads (JSON files of either the bare analyzeResult
+or the whole operation response) picked by a hash of the upload, or synthetic ones when
+no recordings are given; synthetic read results honour the `pages` parameter and take
+longer the more pages are analyzed. Latency, throttling (429 with Retry-After), failure rates and
+the upload bandwidth shared by all clients (to stand in for an office uplink) are configurable.
+
+Standalone:  python -m benchmarks.fake_azure_server --port 8765 --latency 2 --throttle-rate 0.05
+Then point a client at http://127.0.0.1:8765/ with any key.
+"""
+import argparse
+import glob
+import hashlib
+import itertools
+import json
+import multiprocessing
+import random
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+_ANALYZE = re.compile(r"^/(documentintelligence|formrecognizer)/documentModels/([^/:]+):analyze$")
+_RESULT = re.compile(r"^/(documentintelligence|formrecognizer)/documentModels/([^/]+)/analyzeResults/([^/]+)(/pdf)?$")
+_PDF_PAGE = re.compile(rb"/Type\s*/Page\b(?!s)")
+
+
+def make_read_result_dict(model_id, seed, page_numbers, lines_per_page=40):
+    """
+    Builds a prebuilt-read analyzeResult for the given pages, with content, spans and paragraphs.
+    The text of a page depends only on (seed, page number), so the result for a page range
+    is exactly that slice of the result for the whole document.
+    """
+    content_lines = []
+    offset = 0
+    pages = []
+    paragraphs = []
+    for page_number in page_numbers:
+        lines = []
+        words = []
+        for index in range(lines_per_page):
+            if content_lines:
+                offset += 1
+            if index == 0:
+                page_start = offset
+            text = f"Sheet {page_number} of drawing set {seed:08x} line {index}"
+            polygon = [1.0, 1.0 + index, 9.0, 1.0 + index, 9.0, 1.5 + index, 1.0, 1.5 + index]
+            word_offset = offset
+            for word in text.split(" "):
+                words.append({"content": word, "polygon": polygon, "confidence": 0.99,
+                              "span": {"offset": word_offset, "length": len(word)}})
+                word_offset += len(word) + 1
+            lines.append({"content": text, "polygon": polygon, "spans": [{"offset": offset, "length": len(text)}]})
+            content_lines.append(text)
+            offset += len(text)
+        page_span = {"offset": page_start, "length": offset - page_start}
+        pages.append({"pageNumber": page_number, "angle": 0, "width": 36.0, "height": 24.0, "unit": "inch",
+                      "words": words, "lines": lines, "spans": [page_span]})
+        paragraphs.append({"content": "\n".join(content_lines[-lines_per_page:]), "spans": [dict(page_span)],
+                           "boundingRegions": [{"pageNumber": page_number, "polygon": [1.0, 1.0, 9.0, 1.0, 9.0,
+                                                                                       lines_per_page, 1.0,
+                                                                                       lines_per_page]}]})
+    return {
+        "apiVersion": "2024-11-30",
+        "modelId": model_id,
+        "stringIndexType": "textElements",
+        "content": "\n".join(content_lines),
+        "pages": pages,
+        "paragraphs": paragraphs,
+        "styles": [],
+        "contentFormat": "text",
+    }
+
+
+def make_custom_result_dict(model_id, seed, pages=1):
+    """
+    Builds a custom-model (Form Recognizer 2023-07-31) analyzeResult with title-block fields.
+    """
+    values = {
+        "Title": f"FLOOR PLAN LEVEL {seed % 12}",
+        "Date": "2024-11-07",
+        "Drawing_Number": f"A-{seed % 100000:05d}",
+        "Originator": "ARCHSCAN",
+        "Discipline": "Architectural",
+        "Floor Number": str(seed % 12),
+    }
+    region = {"pageNumber": 1, "polygon": [1.0, 1.0, 2.0, 1.0, 2.0, 1.5, 1.0, 1.5]}
+    fields = {
+        name: {"type": "string", "valueString": value, "content": value, "confidence": 0.9,
+               "boundingRegions": [region], "spans": [{"offset": 0, "length": len(value)}]}
+        for name, value in values.items()
+    }
+    return {
+        "apiVersion": "2023-07-31",
+        "modelId": model_id,
+        "stringIndexType": "utf16CodeUnit",
+        "content": " ".join(values.values()),
+        "pages": [
+            {"pageNumber": page, "angle": 0, "width": 36.0, "height": 24.0, "unit": "inch",
+             "words": [], "lines": [], "spans": [{"offset": 0, "length": 0}]}
+            for page in range(1, pages + 1)
+        ],
+        "tables": [],
+        "documents": [
+            {"docType": model_id, "boundingRegions": [region], "fields": fields, "confidence": 0.95,
+             "spans": [{"offset": 0, "length": 1}]}
+        ],
+    }
+
+
+def load_recordings(folder):
+    """
+    Loads every *.json under folder as an analyzeResult payload.
+    """
+    payloads = []
+    for path in sorted(glob.glob(f"{folder}/**/*.json", recursive=True)):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        payloads.append(data.get("analyzeResult", data))
+    return payloads
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_bytes(self, data, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _throttle(self):
+        server = self.server
+        if server.throttle_rate and random.random() < server.throttle_rate:
+            server.count("throttled")
+            retry_ms = int(server.throttle_retry_after * 1000)
+            self._send_json(
+                429,
+                {"error": {"code": "429", "message": "Rate limit is exceeded. Try again later."}},
+                {"Retry-After": str(max(1, round(server.throttle_retry_after))), "retry-after-ms": str(retry_ms)},
+            )
+            return True
+        return False
+
+    def _read_body(self):
+        remaining = int(self.headers.get("Content-Length") or 0)
+        chunks = []
+        while remaining > 0:
+            chunk = self.rfile.read(min(remaining, UPLOAD_CHUNK_SIZE))
+            if not chunk:
+                break
+            self.server.take_uplink(len(chunk))
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return b"".join(chunks)
+
+    def do_POST(self):
+        body = self._read_body()
+        url = urlsplit(self.path)
+        match = _ANALYZE.match(url.path)
+        if not match:
+            self._send_json(404, {"error": {"code": "NotFound", "message": url.path}})
+            return
+        if self._throttle():
+            return
+        api, model_id = match.groups()
+        query = parse_qs(url.query or "")
+        operation_id = self.server.start_operation(
+            api, model_id, body, "pdf" in ",".join(query.get("output", [])), (query.get("pages") or [None])[0]
+        )
+        location = f"http://{self.headers.get('Host')}/{api}/documentModels/{model_id}/analyzeResults/{operation_id}"
+        if url.query:
+            location += f"?{url.query}"
+        self.server.count("analyze")
+        self.send_response(202)
+        self.send_header("Operation-Location", location)
+        self.send_header("apim-request-id", operation_id)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/_fake/stats":
+            self._send_json(200, self.server.stats())
+            return
+        match = _RESULT.match(url.path)
+        if not match:
+            self._send_json(404, {"error": {"code": "NotFound", "message": url.path}})
+            return
+        if self._throttle():
+            return
+        _, _, operation_id, pdf = match.groups()
+        operation = self.server.operations.get(operation_id)
+        if operation is None:
+            self._send_json(404, {"error": {"code": "NotFound", "message": f"No operation {operation_id}"}})
+            return
+        if pdf:
+            self.server.count("pdf")
+            self._send_bytes(self.server.pop_pdf(operation_id), "application/pdf")
+            return
+
+        self.server.count("poll")
+        status = self.server.operation_status(operation)
+        body = {"status": status, "createdDateTime": operation["created"], "lastUpdatedDateTime": _now()}
+        if status == "succeeded":
+            body["analyzeResult"] = self.server.result_for(operation)
+        elif status == "failed":
+            body["error"] = {"code": "InvalidRequest", "message": "Simulated analysis failure.",
+                             "innererror": {"code": "InvalidContent", "message": "The file is corrupted."}}
+        self._send_json(200, body)
+
+
+class FakeAzureServer(ThreadingHTTPServer):
+    """
+    The stand-in server; serve_forever() in a thread, point clients at .endpoint.
+
+    latency            seconds each analysis runs (plus up to latency_jitter)
+    latency_per_page   further seconds per analyzed page
+    pages              pages of an upload that has no countable PDF page objects
+    throttle_rate      share of requests answered 429
+    failure_rate       share of analyses that end as "failed"
+    read_payloads      recorded prebuilt-read results for /documentintelligence
+    custom_payloads    recorded custom-model results for /formrecognizer
+    upload_mb_per_s    bandwidth all uploads share, in MB/s (None for unlimited)
+    """
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.5, latency_jitter=0.0, throttle_rate=0.0, throttle_retry_after=0.1,
+                 failure_rate=0.0, read_payloads=None, custom_payloads=None, pages=1, lines_per_page=40,
+                 upload_mb_per_s=None, latency_per_page=0.0):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.latency_per_page = latency_per_page
+        self.throttle_rate = throttle_rate
+        self.throttle_retry_after = throttle_retry_after
+        self.failure_rate = failure_rate
+        self.read_payloads = read_payloads or []
+        self.custom_payloads = custom_payloads or []
+        self.pages = pages
+        self.lines_per_page = lines_per_page
+        self.upload_mb_per_s = upload_mb_per_s
+        self._uplink_free_at = 0.0
+
+        self.operations = {}
+        self.counts = {"analyze": 0, "poll": 0, "pdf": 0, "throttled": 0, "failed": 0}
+        self.open_operations = 0
+        self.peak_open_operations = 0
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    @property
+    def endpoint(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/"
+
+    def count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts, open_operations=self.open_operations,
+                        peak_open_operations=self.peak_open_operations)
+
+    def handle_error(self, request, client_address):
+        # Clients drop keep-alive connections after a 429 or on shutdown; that is not a server error
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            return
+        super().handle_error(request, client_address)
+
+    def take_uplink(self, nbytes):
+        """
+        Waits until nbytes fit through the shared uplink; concurrent uploads queue for it.
+        """
+        if not self.upload_mb_per_s:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._uplink_free_at = max(now, self._uplink_free_at) + nbytes / (self.upload_mb_per_s * 1e6)
+            wait = self._uplink_free_at - now
+        time.sleep(wait)
+
+    def result_for(self, operation):
+        """
+        Builds an operation's result on demand from its seed, so 50k finished operations cost no memory.
+        """
+        api, model_id, seed = operation["api"], operation["model_id"], operation["seed"]
+        if api == "documentintelligence":
+            if self.read_payloads:
+                return dict(self.read_payloads[seed % len(self.read_payloads)], modelId=model_id)
+            first_page, last_page = operation["pages"]
+            return make_read_result_dict(model_id, seed, range(first_page, last_page + 1), self.lines_per_page)
+        if self.custom_payloads:
+            return dict(self.custom_payloads[seed % len(self.custom_payloads)], modelId=model_id)
+        return make_custom_result_dict(model_id, seed, self.pages)
+
+    def page_range(self, body, pages):
+        """
+        Returns the (first, last) pages of the upload to analyze, honouring a "first-last" pages parameter.
+        """
+        page_count = len(_PDF_PAGE.findall(body)) or self.pages
+        if not pages:
+            return 1, page_count
+        first, _, last = pages.partition("-")
+        return int(first), min(int(last or first), page_count)
+
+    def start_operation(self, api, model_id, body, keep_pdf, pages=None):
+        failed = self.failure_rate and random.random() < self.failure_rate
+        first_page, last_page = self.page_range(body, pages)
+        analysis_time = self.latency + self.latency_per_page * (last_page - first_page + 1)
+        operation = {
+            "ready_at": time.monotonic() + analysis_time + random.uniform(0, self.latency_jitter),
+            "pages": (first_page, last_page),
+            "created": _now(),
+            "failed": failed,
+            "api": api,
+            "model_id": model_id,
+            "seed": int.from_bytes(hashlib.sha256(body).digest()[:4], "big"),
+            "pdf": body if keep_pdf and not failed else None,
+            "open": True,
+        }
+        with self._lock:
+            operation_id = f"{next(self._ids):08d}-fake"
+            self.operations[operation_id] = operation
+            self.open_operations += 1
+            self.peak_open_operations = max(self.peak_open_operations, self.open_operations)
+        return operation_id
+
+    def operation_status(self, operation):
+        if time.monotonic() < operation["ready_at"]:
+            return "running"
+        with self._lock:
+            if operation["open"]:
+                operation["open"] = False
+                self.open_operations -= 1
+                if operation["failed"]:
+                    self.counts["failed"] += 1
+        return "failed" if operation["failed"] else "succeeded"
+
+    def pop_pdf(self, operation_id):
+        """
+        Returns the searchable PDF once; the upload is dropped afterwards to bound memory.
+        """
+        with self._lock:
+            operation = self.operations[operation_id]
+            data, operation["pdf"] = operation["pdf"], None
+        return data or b"%PDF-1.7\n%fake searchable pdf\n"
+
+    def start(self):
+        """
+        Serves on a daemon thread and returns self.
+        """
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def _serve(endpoint_queue, kwargs):
+    server = FakeAzureServer(**kwargs)
+    endpoint_queue.put(server.endpoint)
+    server.serve_forever()
+
+
+def start_server_process(**kwargs):
+    """
+    Runs a FakeAzureServer in a child process, so its threads and memory stay out of the
+    measurements of the process under test. Returns (process, endpoint); terminate() the process when done.
+    """
+    endpoint_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_serve, args=(endpoint_queue, kwargs), daemon=True)
+    process.start()
+    return process, endpoint_queue.get(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=2.0)
+    parser.add_argument("--latency-jitter", type=float, default=0.5)
+    parser.add_argument("--latency-per-page", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--upload-mb-per-s", type=float, default=None)
+    parser.add_argument("--read-recordings", default=None, help="folder of recorded prebuilt-read results")
+    parser.add_argument("--custom-recordings", default=None, help="folder of recorded custom-model results")
+    args = parser.parse_args()
+
+    server = FakeAzureServer(
+        args.port, args.latency, args.latency_jitter, args.throttle_rate, failure_rate=args.failure_rate,
+        read_payloads=load_recordings(args.read_recordings) if args.read_recordings else None,
+        custom_payloads=load_recordings(args.custom_recordings) if args.custom_recordings else None,
+        upload_mb_per_s=args.upload_mb_per_s, latency_per_page=args.latency_per_page,
+    )
+    print(f"Fake Document Intelligence endpoint: {server.endpoint}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n{server.counts}")
+
+
+if __name__ == "__main__":
+    main()
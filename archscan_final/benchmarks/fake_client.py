@@ -0,0 +1,117 @@
+"""
+In-process stand-in for DocumentIntelligenceClient used by the benchmarks.
+It sleeps instead of talking to Azure so concurrency gains can be measured offline.
+"""
+import itertools
+import threading
+import time
+
+from azure.ai.documentintelligence.models import AnalyzeResult
+from azure.core.exceptions import HttpResponseError
+
+
+def make_result_dict(file_name, pages=1, lines_per_page=40):
+    """
+    Builds a small prebuilt-read style AnalyzeResult dict.
+    """
+    result_pages = []
+    for page_number in range(1, pages + 1):
+        lines = [
+            {"content": f"Sheet {page_number} of the {file_name} drawing set line {index}", "polygon": [0.0] * 8}
+            for index in range(lines_per_page)
+        ]
+        result_pages.append({"pageNumber": page_number, "width": 36.0, "height": 24.0, "unit": "inch", "lines": lines})
+    return {"apiVersion": "2024-11-30", "modelId": "prebuilt-read", "content": "", "pages": result_pages}
+
+
+class FakePoller:
+    def __init__(self, operation_id, result_dict, latency):
+        self.details = {"operation_id": operation_id}
+        self._result_dict = result_dict
+        self._latency = latency
+
+    def result(self):
+        time.sleep(self._latency)
+        return AnalyzeResult(self._result_dict)
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self._body = body or {}
+
+    def json(self):
+        return self._body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise HttpResponseError(message=f"HTTP {self.status_code}", response=self)
+
+
+class FakeDocumentIntelligenceClient:
+    """
+    Mimics begin_analyze_document / get_analyze_result_pdf with fixed latencies, and
+    send_request for the raw analyze POST / operation GET used by the polling engine.
+    """
+
+    def __init__(self, analyze_latency=0.5, download_latency=0.1, pdf_bytes=b"%PDF-1.7\n%fake\n", pages=1):
+        self.analyze_latency = analyze_latency
+        self.download_latency = download_latency
+        self.pdf_bytes = pdf_bytes
+        self.pages = pages
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._operations = {}
+        self.threads_seen = set()
+
+    def begin_analyze_document(self, model_id, analyze_request=None, **kwargs):
+        if hasattr(analyze_request, "read"):
+            analyze_request.read()
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            operation_id = f"op-{next(self._ids)}"
+        return _TrackedPoller(self, operation_id, make_result_dict(operation_id, self.pages), self.analyze_latency)
+
+    def send_request(self, request, **kwargs):
+        with self._lock:
+            self.threads_seen.add(threading.get_ident())
+        if request.method == "POST":
+            with self._lock:
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+                operation_id = f"op-{next(self._ids)}"
+                self._operations[operation_id] = time.monotonic() + self.analyze_latency
+            location = f"https://fake.local/documentintelligence/documentModels/prebuilt-read/analyzeResults/{operation_id}"
+            return FakeResponse(202, headers={"Operation-Location": location})
+
+        operation_id = request.url.rsplit("/", 1)[-1]
+        with self._lock:
+            if time.monotonic() < self._operations.get(operation_id, 0):
+                return FakeResponse(200, {"status": "running"})
+            if self._operations.pop(operation_id, None) is not None:
+                self.in_flight -= 1
+        return FakeResponse(200, {"status": "succeeded", "analyzeResult": make_result_dict(operation_id, self.pages)})
+
+    def get_analyze_result_pdf(self, model_id, result_id, **kwargs):
+        time.sleep(self.download_latency)
+        return iter([self.pdf_bytes])
+
+    def close(self):
+        pass
+
+
+class _TrackedPoller(FakePoller):
+    def __init__(self, client, operation_id, result_dict, latency):
+        super().__init__(operation_id, result_dict, latency)
+        self._client = client
+
+    def result(self):
+        try:
+            return super().result()
+        finally:
+            with self._client._lock:
+                self._client.in_flight -= 1
@@ -0,0 +1,112 @@
+"""
+Shared Azure clients over one keep-alive HTTP session per endpoint.
+
+Creating a client per run (or per file) throws away its connections, so every run pays
+DNS, TCP and TLS setup again. get_shared_client() hands out one client per
+(client class, endpoint, key), all built on one requests session per endpoint whose
+connection pool is sized for the largest number of threads any of its callers asked for,
+so connections are reused across threads, runs and entry points.
+"""
+import threading
+
+import requests
+from azure.core.credentials import AzureKeyCredential
+from azure.core.pipeline.transport import RequestsTransport
+from requests.adapters import HTTPAdapter
+
+# Connections kept open per host. Should be at least the number of threads making calls
+# at once (analysis workers plus polling-engine HTTP workers); callers beyond it still
+# get a connection, but it is closed after use instead of returned to the pool.
+DEFAULT_POOL_SIZE = 32
+
+# Bytes read per block of a streamed response body (azure-core's default is 4 KiB),
+# so a searchable PDF download is not handled 4 KiB at a time (see pdf_download)
+DATA_BLOCK_SIZE = 1024 * 1024
+
+_sessions = {}
+_pool_sizes = {}
+_clients = {}
+_lock = threading.Lock()
+
+
+def _mount_pool(session, pool_size):
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+
+def _session_for(endpoint, pool_size):
+    """
+    Returns the endpoint's session with room for at least pool_size connections per host.
+    Call with _lock held.
+    """
+    session = _sessions.get(endpoint)
+    if session is None:
+        session = _sessions[endpoint] = requests.Session()
+        _mount_pool(session, pool_size)
+        _pool_sizes[endpoint] = pool_size
+    elif pool_size > _pool_sizes[endpoint]:
+        # A caller with more threads than the first one: the session (and every client on it) gets the
+        # larger pool. The old adapter's idle connections are closed; those in use are closed when released.
+        old_adapter = session.get_adapter("https://")
+        _mount_pool(session, pool_size)
+        _pool_sizes[endpoint] = pool_size
+        old_adapter.close()
+    return session
+
+
+def get_shared_client(client_class, endpoint, key, pool_size=DEFAULT_POOL_SIZE, **client_kwargs):
+    """
+    Returns the process-wide client_class instance for (endpoint, key), creating it on first use.
+    Works for DocumentIntelligenceClient and Form Recognizer's DocumentAnalysisClient alike.
+    The endpoint's session pool grows to pool_size if that is more than it has, whichever
+    caller came first. Extra keyword arguments (e.g. connection_verify) go to the client on creation.
+    """
+    cache_key = (client_class, endpoint, key)
+    with _lock:
+        session = _session_for(endpoint, pool_size)
+        client = _clients.get(cache_key)
+        if client is not None:
+            return client
+        # session_owner=False: closing one client must not close the session the others share
+        transport = RequestsTransport(session=session, session_owner=False, connection_data_block_size=DATA_BLOCK_SIZE)
+        client = client_class(endpoint=endpoint, credential=AzureKeyCredential(key), transport=transport,
+                              **client_kwargs)
+        _clients[cache_key] = client
+        return client
+
+
+def pool_stats(endpoint=None):
+    """
+    Connection-pool counters for one endpoint's session, or summed over all of them:
+    connections_opened (new TCP/TLS connections so far), requests, idle (connections
+    parked for reuse) and hosts. requests per connection opened is the reuse factor.
+    """
+    with _lock:
+        sessions = [_sessions[endpoint]] if endpoint in _sessions else ([] if endpoint else list(_sessions.values()))
+    stats = {"hosts": 0, "connections_opened": 0, "requests": 0, "idle": 0}
+    for session in sessions:
+        for adapter in set(session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for pool_key in pools.keys():
+                pool = pools.get(pool_key)
+                if pool is None:
+                    continue
+                stats["hosts"] += 1
+                stats["connections_opened"] += pool.num_connections
+                stats["requests"] += pool.num_requests
+                # The pool queue is pre-filled with None placeholders; only real connections count
+                stats["idle"] += sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool is not None else 0
+    return stats
+
+
+def close_all():
+    """
+    Closes every shared session and forgets the shared clients.
+    """
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+        _pool_sizes.clear()
+        _clients.clear()
@@ -0,0 +1,157 @@
+import heapq
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from scan_index import iter_pdf_files
+from upload_io import DEFAULT_LARGE_IN_FLIGHT, LARGE_FILE_BYTES, file_size
+
+# Number of analyses allowed in flight at once. Each one mostly waits on Azure,
+# so this is bounded by the service tier rather than by local CPU count.
+DEFAULT_MAX_IN_FLIGHT = 8
+
+
+def find_pdf_files(input_folder_path):
+    """
+    Gathers all PDF files below the input folder through the scan index (see scan_index.iter_pdf_files).
+    """
+    return list(iter_pdf_files(input_folder_path))
+
+
+def run_in_order(func, items, max_in_flight=DEFAULT_MAX_IN_FLIGHT, progress=None):
+    """
+    Calls func on every item with at most max_in_flight calls running at once.
+    Results are returned in the same order as the input items.
+
+    items may be a generator (e.g. scan_index.iter_pdf_files): it is consumed as slots free
+    up, so the first calls start while the rest are still being found.
+
+    progress, if given, is called as progress(done, total) on the calling thread once before
+    the first item finishes (done=0) and after each item finishes. total is len(items) when
+    items has a length, otherwise the number of items taken from the generator so far. If
+    progress raises (e.g. to cancel the run), no further item is started and the running
+    ones are waited for.
+    """
+    return _run(func, items, max_in_flight, progress)
+
+
+def map_ahead(func, items, ahead, max_in_flight=DEFAULT_MAX_IN_FLIGHT, executor=None):
+    """
+    Yields func(item) for every item, in input order, computing on max_in_flight threads at most
+    `ahead` results beyond the one last yielded. Unlike run_in_order nothing is kept once it is
+    yielded, so a slow consumer holds the results in memory to `ahead`, not to the input size,
+    and items is read only `ahead` past it.
+    Closing the generator drops the calls not started yet and waits for the running ones.
+    executor (e.g. a ProcessPoolExecutor) runs the calls instead of a thread pool of its own;
+    it is shut down the same way when the generator finishes.
+    """
+    items = iter(items)
+    pending = deque()
+    executor = executor or ThreadPoolExecutor(max_workers=max(1, max_in_flight))
+    try:
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= max(1, ahead):
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        # Stops the walk behind a generator that was not used up
+        if hasattr(items, "close"):
+            items.close()
+
+
+def split_by_size(file_paths, large_file_bytes=None):
+    """
+    Splits files into (small files in input order, large files largest first) around large_file_bytes.
+    Starting the largest uploads first lets them overlap the stream of small files
+    instead of trailing on their own at the end of a run.
+    """
+    large_file_bytes = large_file_bytes or LARGE_FILE_BYTES
+    sizes = {file_path: file_size(file_path) for file_path in file_paths}
+    small = [file_path for file_path in file_paths if sizes[file_path] < large_file_bytes]
+    large = sorted((file_path for file_path in file_paths if sizes[file_path] >= large_file_bytes),
+                   key=lambda file_path: sizes[file_path], reverse=True)
+    return small, large
+
+
+def run_by_size(func, file_paths, max_in_flight=DEFAULT_MAX_IN_FLIGHT, large_in_flight=DEFAULT_LARGE_IN_FLIGHT,
+                large_file_bytes=None, progress=None):
+    """
+    Like run_in_order for files, but at most large_in_flight of the max_in_flight calls run
+    on files of large_file_bytes or more, so a batch of E-size scans cannot take every slot
+    (and the uplink) while the small files queue behind them. A waiting large file gets the
+    next free slot of its lane, largest first among those found so far, so the big uploads
+    overlap the stream of small files instead of trailing on their own at the end of a run.
+    Results keep the input order, and progress is reported as in run_in_order.
+    """
+    large_file_bytes = large_file_bytes or LARGE_FILE_BYTES
+    large_slots = min(max(1, large_in_flight), max(1, max_in_flight - 1))
+    return _run(func, file_paths, max_in_flight, progress, large_file_bytes, large_slots)
+
+
+def _run(func, items, max_in_flight, progress, large_file_bytes=None, large_slots=0):
+    total = len(items) if hasattr(items, "__len__") else None
+    items = iter(items)
+    max_in_flight = max(1, max_in_flight)
+    results = []
+    small = deque()
+    # Large files waiting for a slot, as (-size, index, path) so the largest comes first
+    large = []
+    running = {}
+    large_running = 0
+    done = 0
+    exhausted = False
+    started = False
+
+    executor = ThreadPoolExecutor(max_workers=max_in_flight)
+    try:
+        while True:
+            # Only the next few items are taken ahead of the free slots; large ones can be waiting beyond that
+            while not exhausted and len(small) < max_in_flight:
+                try:
+                    item = next(items)
+                except StopIteration:
+                    exhausted = True
+                    break
+                results.append(None)
+                size = file_size(item) if large_file_bytes else 0
+                if large_file_bytes and size >= large_file_bytes:
+                    heapq.heappush(large, (-size, len(results) - 1, item))
+                else:
+                    small.append((len(results) - 1, item))
+
+            while len(running) < max_in_flight:
+                if large and large_running < large_slots:
+                    _, index, item = heapq.heappop(large)
+                    large_running += 1
+                    running[executor.submit(func, item)] = (index, True)
+                elif small:
+                    index, item = small.popleft()
+                    running[executor.submit(func, item)] = (index, False)
+                else:
+                    break
+
+            if not started and progress is not None:
+                started = True
+                progress(0, total if total is not None else len(results))
+            if not running:
+                if exhausted:
+                    break
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                index, is_large = running.pop(future)
+                large_running -= is_large
+                results[index] = future.result()
+                done += 1
+                if progress is not None:
+                    progress(done, total if total is not None else len(results))
+    finally:
+        executor.shutdown(wait=True)
+        # Stops the walk behind a generator that was not used up
+        if hasattr(items, "close"):
+            items.close()
+
+    return results
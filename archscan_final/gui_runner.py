@@ -0,0 +1,97 @@
+"""
+Runs a folder of files off the Tk main loop.
+
+The run happens on a worker thread and never touches a widget: its progress(done, total)
+hook and its result are put on a queue, and the Tk thread drains that queue with
+root.after, so the window keeps redrawing and everything Tk-side stays on the Tk thread.
+Cancel makes the next progress call raise RunCancelled; the run then drops the files not
+started yet (see concurrent_ocr.run_in_order) and waits for the ones already in flight,
+whose results are kept, before it returns.
+"""
+import queue
+import threading
+import time
+
+from instrumentation import format_duration
+
+# How often the Tk thread drains the worker's events
+POLL_MS = 100
+
+
+class RunCancelled(Exception):
+    """
+    Raised from the progress hook of a cancelled run.
+    """
+
+
+def progress_text(done, total, elapsed):
+    """
+    "12/60 files  2.4 files/s  ETA 0:20" for a run that has been going for elapsed seconds.
+    """
+    text = f"{done}/{total} files"
+    if done and elapsed > 0:
+        rate = done / elapsed
+        text += f"  {rate:.1f} files/s  ETA {format_duration((total - done) / rate)}"
+    return text
+
+
+class BackgroundRun:
+    """
+    Calls func(progress) on a worker thread. On the Tk thread, on_progress(done, total, elapsed)
+    follows the run and on_finish(result, error) is called once at the end, error being None,
+    a RunCancelled or whatever func raised.
+    """
+
+    def __init__(self, root, func, on_progress, on_finish):
+        self.root = root
+        self.func = func
+        self.on_progress = on_progress
+        self.on_finish = on_finish
+        self.events = queue.Queue()
+        self.cancel_requested = threading.Event()
+        self.started = time.monotonic()
+        self.thread = threading.Thread(target=self._work, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        self.root.after(POLL_MS, self._drain)
+        return self
+
+    def cancel(self):
+        self.cancel_requested.set()
+
+    @property
+    def cancelled(self):
+        return self.cancel_requested.is_set()
+
+    def _progress(self, done, total):
+        if self.cancel_requested.is_set():
+            raise RunCancelled("Run cancelled")
+        self.events.put(("progress", done, total))
+
+    def _work(self):
+        try:
+            result = self.func(self._progress)
+        except Exception as e:
+            self.events.put(("finish", None, e))
+        else:
+            self.events.put(("finish", result, None))
+
+    def _drain(self):
+        progress = None
+        while True:
+            try:
+                event = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if event[0] == "progress":
+                # Only the latest count is worth drawing
+                progress = event[1:]
+                continue
+            if progress:
+                self.on_progress(*progress, time.monotonic() - self.started)
+            self.on_finish(*event[1:])
+            return
+        if progress:
+            self.on_progress(*progress, time.monotonic() - self.started)
+        self.root.after(POLL_MS, self._drain)
@@ -0,0 +1,202 @@
+"""
+Per-file, per-stage timings and byte counts for the OCR and extraction pipelines.
+
+Pipeline code wraps each stage in timed(stage, file_name); while a MetricsRecorder is
+installed with recording(), every stage of every file is recorded, otherwise timed()
+costs a global lookup. At the end of a run the recorder summarizes p50/p95/p99 per stage
+and exports to JSON or to a Prometheus node_exporter textfile.
+
+Stages used by the pipelines:
+    hash, cache_lookup     reading the input for its SHA-256, OCR cache lookup
+    text_layer             reading a PDF's own text layer (see text_layer)
+    analyze                the whole analyze call through the SDK poller (upload + service + polling)
+    upload, service, poll  the same split up, when the polling engine is used
+    pdf_download           fetching the searchable PDF (bytes = PDF size)
+    result_write           serializing the AnalyzeResult to disk (bytes = file size)
+    stop_word_filter       filtering line text into _filtered.txt
+    checkpoint, export     custom-model store commits and the spreadsheet export
+"""
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+QUANTILES = (0.5, 0.95, 0.99)
+PROMETHEUS_PREFIX = "archscan"
+
+
+class _Span:
+    """
+    Handed to the body of a timed() block so it can report how many bytes the stage moved.
+    """
+    __slots__ = ("bytes",)
+
+    def __init__(self, nbytes=0):
+        self.bytes = nbytes
+
+
+def percentile(sorted_values, quantile):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(quantile * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def format_duration(seconds):
+    """
+    "4:05" or, from an hour on, "1:04:05".
+    """
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+
+class MetricsRecorder:
+    """
+    Thread-safe collector of (file, stage, seconds, bytes) records.
+    """
+
+    def __init__(self):
+        self.records = []
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds, file_name=None, nbytes=0):
+        with self._lock:
+            self.records.append((file_name, stage, seconds, nbytes))
+
+    def summary(self):
+        """
+        Returns {stage: {count, total_seconds, p50, p95, p99, max, bytes}} in first-seen stage order.
+        """
+        with self._lock:
+            records = list(self.records)
+        durations = {}
+        byte_counts = {}
+        for _, stage, seconds, nbytes in records:
+            durations.setdefault(stage, []).append(seconds)
+            byte_counts[stage] = byte_counts.get(stage, 0) + nbytes
+
+        summary = {}
+        for stage, values in durations.items():
+            values.sort()
+            stats = {"count": len(values), "total_seconds": sum(values)}
+            for quantile in QUANTILES:
+                stats[f"p{int(quantile * 100)}"] = percentile(values, quantile)
+            stats["max"] = values[-1]
+            stats["bytes"] = byte_counts[stage]
+            summary[stage] = stats
+        return summary
+
+    def format_summary(self):
+        """
+        Returns the summary as a fixed-width text table.
+        """
+        lines = [f"{'stage':18s} {'count':>7s} {'total s':>10s} {'p50 s':>9s} {'p95 s':>9s} {'p99 s':>9s} {'MB':>10s}"]
+        for stage, stats in self.summary().items():
+            lines.append(
+                f"{stage:18s} {stats['count']:7d} {stats['total_seconds']:10.2f} {stats['p50']:9.3f} "
+                f"{stats['p95']:9.3f} {stats['p99']:9.3f} {stats['bytes'] / 1e6:10.2f}"
+            )
+        return "\n".join(lines)
+
+    def to_json(self):
+        with self._lock:
+            records = list(self.records)
+        return {
+            "started": self.started,
+            "summary": self.summary(),
+            "records": [
+                {"file": file_name, "stage": stage, "seconds": seconds, "bytes": nbytes}
+                for file_name, stage, seconds, nbytes in records
+            ],
+        }
+
+    def to_prometheus(self):
+        """
+        Renders the summary in the Prometheus text exposition format.
+        """
+        summary = self.summary()
+        lines = [
+            f"# HELP {PROMETHEUS_PREFIX}_stage_seconds Per-file duration of each pipeline stage.",
+            f"# TYPE {PROMETHEUS_PREFIX}_stage_seconds summary",
+        ]
+        for stage, stats in summary.items():
+            for quantile in QUANTILES:
+                lines.append(
+                    f'{PROMETHEUS_PREFIX}_stage_seconds{{stage="{stage}",quantile="{quantile}"}} '
+                    f"{stats[f'p{int(quantile * 100)}']:.6f}"
+                )
+            lines.append(f'{PROMETHEUS_PREFIX}_stage_seconds_sum{{stage="{stage}"}} {stats["total_seconds"]:.6f}')
+            lines.append(f'{PROMETHEUS_PREFIX}_stage_seconds_count{{stage="{stage}"}} {stats["count"]}')
+        lines.append(f"# HELP {PROMETHEUS_PREFIX}_stage_bytes_total Bytes moved by each pipeline stage.")
+        lines.append(f"# TYPE {PROMETHEUS_PREFIX}_stage_bytes_total counter")
+        for stage, stats in summary.items():
+            lines.append(f'{PROMETHEUS_PREFIX}_stage_bytes_total{{stage="{stage}"}} {stats["bytes"]}')
+        lines.append(f"# HELP {PROMETHEUS_PREFIX}_run_started_seconds Unix time the run started.")
+        lines.append(f"# TYPE {PROMETHEUS_PREFIX}_run_started_seconds gauge")
+        lines.append(f"{PROMETHEUS_PREFIX}_run_started_seconds {self.started:.3f}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, output_path):
+        """
+        Writes the metrics to output_path: Prometheus textfile for .prom, JSON otherwise.
+        The file is replaced atomically, as the node_exporter textfile collector expects.
+        """
+        if output_path.lower().endswith(".prom"):
+            text = self.to_prometheus()
+        else:
+            text = json.dumps(self.to_json(), indent=2)
+        tmp_path = f"{output_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, output_path)
+
+
+_active = None
+
+
+@contextmanager
+def recording(recorder):
+    """
+    Installs recorder as the process-wide target of timed() for the duration of the block.
+    """
+    global _active
+    previous = _active
+    _active = recorder
+    try:
+        yield recorder
+    finally:
+        _active = previous
+
+
+@contextmanager
+def timed(stage, file_name=None, nbytes=0):
+    """
+    Times the block as one stage of one file. Set span.bytes inside the block to record a byte count.
+    Nothing is recorded unless a recorder is installed.
+    """
+    recorder = _active
+    span = _Span(nbytes)
+    if recorder is None:
+        yield span
+        return
+    start = time.perf_counter()
+    try:
+        yield span
+    finally:
+        recorder.record(stage, time.perf_counter() - start, file_name, span.bytes)
+
+
+def record(stage, seconds, file_name=None, nbytes=0):
+    """
+    Records a stage measured elsewhere (e.g. time spent waiting on the service).
+    """
+    recorder = _active
+    if recorder is not None:
+        recorder.record(stage, seconds, file_name, nbytes)
@@ -0,0 +1,90 @@
+"""
+Tk panel that makes a GUI a thin client of the job queue: it submits the selected folders
+as a job with a priority, starts a background worker if none is running, and shows the
+live progress of every queued and running job.
+"""
+from job_queue import DEFAULT_QUEUE_PATH, PRIORITIES, JobQueue, ensure_worker
+
+# How often the job list is reread from the queue
+REFRESH_MS = 1000
+
+PRIORITY_NAMES = {number: name for name, number in PRIORITIES.items()}
+
+
+def add_job_panel(parent, kind, get_folders, get_model_id=None, options=None, show_text=None,
+                  queue_path=DEFAULT_QUEUE_PATH):
+    """
+    Builds the panel in parent and returns its frame for the caller to place.
+
+    get_folders() returns (input folder, output folder) or None when not chosen yet;
+    get_model_id() gives the model of an extract job. Double-clicking a job passes its
+    summary (or error) to show_text.
+    """
+    import tkinter as tk
+    from tkinter import messagebox, ttk
+
+    queue = JobQueue(queue_path)
+    frame = tk.Frame(parent, bg="#f0f0f0")
+
+    def add_job():
+        folders = get_folders()
+        if not folders:
+            messagebox.showwarning("Folders missing", "Please select both input and output folders before queueing.")
+            return
+        model_id = get_model_id() if get_model_id else None
+        job_id = queue.submit(kind, folders[0], folders[1], model_id, priority_box.get(), options)
+        ensure_worker(queue_path)
+        refresh(reschedule=False)
+        jobs_view.selection_set(str(job_id))
+
+    def cancel_job():
+        for item in jobs_view.selection():
+            queue.cancel(int(item))
+        refresh(reschedule=False)
+
+    def show_job(_event=None):
+        selection = jobs_view.selection()
+        if not selection or show_text is None:
+            return
+        job = queue.get(int(selection[0]))
+        if job:
+            show_text(job["summary"] or job["error"] or f"Job {job['id']} is {job['status']}.")
+
+    def refresh(reschedule=True):
+        selection = jobs_view.selection()
+        jobs_view.delete(*jobs_view.get_children())
+        for job in queue.list_jobs(limit=50):
+            if job["files_total"]:
+                progress = f"{job['files_done']}/{job['files_total']} ({100 * job['files_done'] // job['files_total']}%)"
+            else:
+                progress = "-"
+            jobs_view.insert("", "end", iid=str(job["id"]), values=(
+                job["id"], job["kind"], PRIORITY_NAMES.get(job["priority"], job["priority"]), job["status"],
+                progress, job["input_folder"],
+            ))
+        jobs_view.selection_set([item for item in selection if jobs_view.exists(item)])
+        if reschedule:
+            frame.after(REFRESH_MS, refresh)
+
+    controls = tk.Frame(frame, bg="#f0f0f0")
+    controls.pack(fill="x")
+    tk.Label(controls, text="Priority:", font=("Helvetica", 12), bg="#f0f0f0").pack(side="left", padx=5)
+    priority_box = ttk.Combobox(controls, values=list(PRIORITIES), state="readonly", width=10,
+                                font=("Helvetica", 12))
+    priority_box.set("normal")
+    priority_box.pack(side="left", padx=5)
+    tk.Button(controls, text="Add to Queue", command=add_job, font=("Helvetica", 12), bg="#4a90e2", fg="white",
+              padx=10, pady=5).pack(side="left", padx=10)
+    tk.Button(controls, text="Cancel Job", command=cancel_job, font=("Helvetica", 12), bg="#4a90e2", fg="white",
+              padx=10, pady=5).pack(side="left", padx=10)
+
+    columns = ("id", "kind", "priority", "status", "progress", "input")
+    jobs_view = ttk.Treeview(frame, columns=columns, show="headings", height=6)
+    for column, width in zip(columns, (50, 60, 80, 80, 120, 400)):
+        jobs_view.heading(column, text=column.capitalize())
+        jobs_view.column(column, width=width, stretch=column == "input")
+    jobs_view.pack(fill="x", pady=5)
+    jobs_view.bind("<Double-1>", show_job)
+
+    refresh()
+    return frame
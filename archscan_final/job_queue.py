@@ -0,0 +1,426 @@
+"""
+Persistent priority queue of folder jobs, shared by the GUIs, the CLI and worker processes.
+
+A job is one folder run: "ocr" (OCR_main.handle_folder_upload) or "extract"
+(large_format_custom.run_folder with the job's model). Jobs live in a SQLite database
+(WAL mode, so any number of processes can submit and watch while workers drain it) and
+are claimed lowest priority number first, oldest first within a priority.
+
+Workers report progress per file. At each file boundary a running job also checks
+whether it has been cancelled, or whether a more urgent job is waiting that no idle
+worker can take: then it stops and goes back on the queue, so an urgent client request
+takes over the worker within one file of a long archive backfill. Stopping loses no work: analyses already running on
+the service are waited out and their files finished (see ocr_file.run_submitted), and the
+OCR cache and the results store make the rerun skip every file that was already finished.
+
+Workers that die are noticed by their heartbeat going stale; their jobs are requeued, up to
+MAX_ATTEMPTS runs, after which the job fails rather than take down worker after worker.
+"""
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Lower numbers run first
+PRIORITIES = {"urgent": 0, "normal": 50, "backfill": 100}
+DEFAULT_PRIORITY = PRIORITIES["normal"]
+
+JOB_KINDS = ("ocr", "extract")
+
+DEFAULT_QUEUE_PATH = os.environ.get(
+    "ARCHSCAN_QUEUE_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "job_queue.sqlite3")
+)
+
+# Workers refresh their heartbeat this often; jobs of a worker silent for STALE_AFTER are requeued
+HEARTBEAT_INTERVAL = 5.0
+STALE_AFTER = 60.0
+
+# Runs a job may take (preempted runs do not count) before a worker dying on it fails it
+MAX_ATTEMPTS = 3
+
+# Idle workers look for new jobs this often
+POLL_INTERVAL = 2.0
+
+# Progress is written at most this often (and always for the last file)
+PROGRESS_INTERVAL = 0.5
+
+
+class JobStopped(Exception):
+    """
+    Raised from a job's progress callback to stop it at a file boundary.
+    requeue is True when the job was preempted and should run again later.
+    """
+
+    def __init__(self, reason, requeue=False):
+        super().__init__(reason)
+        self.requeue = requeue
+
+
+class JobQueue:
+    """
+    SQLite-backed job queue. Safe to use from several threads and processes.
+    """
+
+    def __init__(self, db_path=DEFAULT_QUEUE_PATH):
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # Autocommit mode; writes go through _transaction(), which takes the write lock up front
+        self._db = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        with self._transaction():
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "kind TEXT NOT NULL, "
+                "input_folder TEXT NOT NULL, "
+                "output_folder TEXT NOT NULL, "
+                "model_id TEXT, "
+                "priority INTEGER NOT NULL, "
+                "options TEXT NOT NULL, "
+                "status TEXT NOT NULL, "
+                "submitted REAL NOT NULL, "
+                "started REAL, "
+                "finished REAL, "
+                "worker TEXT, "
+                "attempts INTEGER NOT NULL DEFAULT 0, "
+                "cancel_requested INTEGER NOT NULL DEFAULT 0, "
+                "files_done INTEGER NOT NULL DEFAULT 0, "
+                "files_total INTEGER NOT NULL DEFAULT 0, "
+                "summary TEXT, "
+                "error TEXT)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS jobs_pending ON jobs (status, priority, id)")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS workers "
+                "(name TEXT PRIMARY KEY, pid INTEGER, heartbeat REAL NOT NULL, max_priority INTEGER)"
+            )
+            columns = [row[1] for row in self._db.execute("PRAGMA table_info(workers)")]
+            if "max_priority" not in columns:
+                self._db.execute("ALTER TABLE workers ADD COLUMN max_priority INTEGER")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    @staticmethod
+    def _job(row):
+        if row is None:
+            return None
+        job = dict(row)
+        job["options"] = json.loads(job["options"])
+        return job
+
+    def submit(self, kind, input_folder, output_folder, model_id=None, priority=DEFAULT_PRIORITY, options=None):
+        """
+        Queues a folder job and returns its id. priority is a number or a PRIORITIES name.
+        """
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        priority = PRIORITIES.get(priority, priority)
+        with self._transaction() as db:
+            cursor = db.execute(
+                "INSERT INTO jobs (kind, input_folder, output_folder, model_id, priority, options, status, submitted) "
+                "VALUES (?, ?, ?, ?, ?, ?, 'queued', ?)",
+                (kind, os.path.abspath(input_folder), os.path.abspath(output_folder), model_id, int(priority),
+                 json.dumps(options or {}), time.time()),
+            )
+            return cursor.lastrowid
+
+    def get(self, job_id):
+        with self._lock:
+            return self._job(self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def list_jobs(self, statuses=None, limit=200):
+        """
+        Returns jobs, running then queued (in claim order) then the most recently finished.
+        """
+        query = "SELECT * FROM jobs"
+        params = []
+        if statuses:
+            query += f" WHERE status IN ({', '.join('?' for _ in statuses)})"
+            params.extend(statuses)
+        query += (" ORDER BY CASE status WHEN 'running' THEN 0 WHEN 'queued' THEN 1 ELSE 2 END, "
+                  "CASE WHEN status IN ('running', 'queued') THEN priority ELSE 0 END, "
+                  "CASE WHEN status IN ('running', 'queued') THEN id ELSE -id END LIMIT ?")
+        params.append(limit)
+        with self._lock:
+            return [self._job(row) for row in self._db.execute(query, params).fetchall()]
+
+    def claim(self, worker, max_priority=None):
+        """
+        Marks the most urgent queued job as running on worker and returns it, or None.
+        With max_priority, only jobs at least that urgent are taken.
+        """
+        with self._transaction() as db:
+            query = "SELECT id FROM jobs WHERE status = 'queued'"
+            params = []
+            if max_priority is not None:
+                query += " AND priority <= ?"
+                params.append(max_priority)
+            row = db.execute(query + " ORDER BY priority, id LIMIT 1", params).fetchone()
+            if row is None:
+                return None
+            db.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, started = COALESCE(started, ?), "
+                "attempts = attempts + 1 WHERE id = ?",
+                (worker, time.time(), row["id"]),
+            )
+            return self._job(db.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone())
+
+    def update_progress(self, job_id, files_done, files_total):
+        with self._transaction() as db:
+            db.execute("UPDATE jobs SET files_done = ?, files_total = ? WHERE id = ?",
+                       (files_done, files_total, job_id))
+
+    def should_stop(self, job, max_age=STALE_AFTER):
+        """
+        Returns "cancelled", "preempted" or None for a running job.
+        A job is preempted when a more urgent job is waiting that no idle live worker can claim.
+        """
+        with self._lock:
+            row = self._db.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job["id"],)).fetchone()
+            if row is None or row["cancel_requested"]:
+                return "cancelled"
+            waiting = [row["priority"] for row in self._db.execute(
+                "SELECT priority FROM jobs WHERE status = 'queued' AND priority < ? ORDER BY priority",
+                (job["priority"],),
+            )]
+            if not waiting:
+                return None
+            idle = [row["max_priority"] for row in self._db.execute(
+                "SELECT max_priority FROM workers WHERE heartbeat >= ? AND name IS NOT ? AND name NOT IN "
+                "(SELECT worker FROM jobs WHERE status = 'running' AND worker IS NOT NULL)",
+                (time.time() - max_age, job.get("worker")),
+            )]
+        # Hand each waiting job, most urgent first, the most reserved idle worker that takes it
+        idle.sort(key=lambda limit: float("inf") if limit is None else limit)
+        for priority in waiting:
+            taker = next((i for i, limit in enumerate(idle) if limit is None or priority <= limit), None)
+            if taker is None:
+                return "preempted"
+            del idle[taker]
+        return None
+
+    def finish(self, job_id, status, summary=None, error=None):
+        """
+        Ends a running job as "done", "failed" or "cancelled", or puts it back as "queued".
+        """
+        finished = None if status == "queued" else time.time()
+        # A preempted run does not count as one of the job's attempts
+        uncounted = 1 if status == "queued" else 0
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE jobs SET status = ?, finished = ?, summary = ?, error = ?, worker = NULL, "
+                "attempts = attempts - ? WHERE id = ?",
+                (status, finished, summary, error, uncounted, job_id),
+            )
+
+    def cancel(self, job_id):
+        """
+        Cancels a queued job, or asks a running one to stop after its current files. Returns False if already over.
+        """
+        with self._transaction() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id),
+            )
+            if cursor.rowcount:
+                return True
+            cursor = db.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,))
+            return bool(cursor.rowcount)
+
+    def set_priority(self, job_id, priority):
+        priority = PRIORITIES.get(priority, priority)
+        with self._transaction() as db:
+            db.execute("UPDATE jobs SET priority = ? WHERE id = ?", (int(priority), job_id))
+
+    def heartbeat(self, worker, max_priority=None):
+        with self._transaction() as db:
+            db.execute("INSERT OR REPLACE INTO workers (name, pid, heartbeat, max_priority) VALUES (?, ?, ?, ?)",
+                       (worker, os.getpid(), time.time(), max_priority))
+
+    def remove_worker(self, worker):
+        with self._transaction() as db:
+            db.execute("DELETE FROM workers WHERE name = ?", (worker,))
+
+    def live_workers(self, max_age=STALE_AFTER):
+        with self._lock:
+            rows = self._db.execute("SELECT name FROM workers WHERE heartbeat >= ?", (time.time() - max_age,))
+            return [row["name"] for row in rows.fetchall()]
+
+    def requeue_stale(self, max_age=STALE_AFTER, max_attempts=MAX_ATTEMPTS):
+        """
+        Puts running jobs whose worker stopped sending heartbeats back on the queue, or fails
+        them once they have been run max_attempts times. Returns how many were requeued.
+        """
+        stale = ("status = 'running' AND "
+                 "(worker IS NULL OR worker NOT IN (SELECT name FROM workers WHERE heartbeat >= ?))")
+        params = (time.time() - max_age,)
+        with self._transaction() as db:
+            db.execute(
+                f"UPDATE jobs SET status = 'failed', finished = ?, worker = NULL, "
+                f"error = 'Worker lost on each of ' || attempts || ' attempts' WHERE {stale} AND attempts >= ?",
+                (time.time(), *params, max_attempts),
+            )
+            cursor = db.execute(f"UPDATE jobs SET status = 'queued', worker = NULL WHERE {stale}", params)
+            return cursor.rowcount
+
+
+def execute_job(job, progress):
+    """
+    Runs one job's folder and returns its summary text.
+    """
+    options = job["options"]
+    os.makedirs(job["output_folder"], exist_ok=True)
+
+    if job["kind"] == "ocr":
+        import OCR_main
+        from concurrent_ocr import DEFAULT_MAX_IN_FLIGHT
+        from ocr_cache import OcrCache
+
+        return OCR_main.handle_folder_upload(
+            job["input_folder"], job["output_folder"], options.get("max_in_flight", DEFAULT_MAX_IN_FLIGHT),
+            cache=OcrCache(options["cache_dir"]) if options.get("cache_dir") else None,
+            result_format=options.get("format", "json"), max_operations=options.get("max_operations"),
+            pages_per_range=options.get("split_pages"), progress=progress, pipelined=options.get("pipeline", False),
+            stage_workers=options.get("stage_workers"), queue_size=options.get("queue_size"),
+            use_text_layer=options.get("use_text_layer", False),
+        )
+
+    import large_format_custom
+    from rate_limiter import AdaptiveRateLimiter
+
+    limiter = AdaptiveRateLimiter(
+        requests_per_second=options.get("requests_per_second", 15), max_concurrency=options.get("max_in_flight", 16)
+    )
+    summary, unsupported_files, _ = large_format_custom.run_folder(
+        job["input_folder"], job["output_folder"], job["model_id"] or large_format_custom.DEFAULT_MODEL_ID,
+        f"document_analysis_results.{options.get('export_format', 'xlsx')}", limiter, progress=progress,
+    )
+    if unsupported_files:
+        summary += f"\n{len(unsupported_files)} unsupported file(s): see unsupported_files.txt"
+    return summary
+
+
+def run_job(queue, job):
+    """
+    Runs a claimed job to its end state, recording progress as it goes.
+    """
+    last_write = [0.0]
+
+    def progress(done, total):
+        now = time.monotonic()
+        if done == total or now - last_write[0] >= PROGRESS_INTERVAL:
+            last_write[0] = now
+            queue.update_progress(job["id"], done, total)
+            reason = queue.should_stop(job)
+            if reason:
+                raise JobStopped(reason, requeue=reason == "preempted")
+
+    try:
+        summary = execute_job(job, progress)
+    except JobStopped as e:
+        queue.finish(job["id"], "queued" if e.requeue else "cancelled", error=str(e))
+        return
+    except Exception as e:
+        queue.finish(job["id"], "failed", error=f"{type(e).__name__}: {e}")
+        return
+    queue.finish(job["id"], "done", summary=summary)
+
+
+def run_worker(queue_path=DEFAULT_QUEUE_PATH, worker=None, exit_when_idle=False, max_priority=None):
+    """
+    Drains the queue until interrupted (or, with exit_when_idle, until it is empty).
+    max_priority reserves the worker for jobs at least that urgent.
+    """
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    queue = JobQueue(queue_path)
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(HEARTBEAT_INTERVAL):
+            queue.heartbeat(worker, max_priority)
+
+    queue.heartbeat(worker, max_priority)
+    threading.Thread(target=beat, daemon=True).start()
+    try:
+        while True:
+            queue.requeue_stale()
+            job = queue.claim(worker, max_priority)
+            if job is None:
+                if exit_when_idle:
+                    return
+                time.sleep(POLL_INTERVAL)
+                continue
+            print(f"[{worker}] job {job['id']}: {job['kind']} {job['input_folder']}", flush=True)
+            run_job(queue, job)
+    finally:
+        stop.set()
+        queue.remove_worker(worker)
+        queue.close()
+
+
+def run_workers(processes, queue_path=DEFAULT_QUEUE_PATH, exit_when_idle=False, urgent_workers=0):
+    """
+    Runs processes worker processes and waits for them. The first urgent_workers of them
+    only take urgent jobs, so urgent work starts at once even while every other worker is busy.
+    """
+    workers = []
+    for index in range(max(1, processes)):
+        max_priority = PRIORITIES["urgent"] if index < urgent_workers else None
+        process = multiprocessing.Process(
+            target=run_worker, args=(queue_path, None, exit_when_idle, max_priority), name=f"archscan-worker-{index}"
+        )
+        process.start()
+        workers.append(process)
+    try:
+        for process in workers:
+            process.join()
+    except KeyboardInterrupt:
+        for process in workers:
+            process.terminate()
+        for process in workers:
+            process.join()
+
+
+def ensure_worker(queue_path=DEFAULT_QUEUE_PATH):
+    """
+    Starts a background worker process (which exits once the queue is empty) unless one is alive.
+    Used by the GUIs, so a queued job runs even when no worker service is set up.
+    """
+    with JobQueue(queue_path) as queue:
+        if queue.live_workers():
+            return False
+    cli_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "archscan_cli.py")
+    subprocess.Popen(
+        [sys.executable, cli_path, "worker", "--exit-when-idle", "--queue", queue_path],
+        stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True,
+    )
+    return True
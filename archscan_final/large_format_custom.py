@@ -1,14 +1,17 @@
 import os
-import json
-import pandas as pd
-import re
 import threading
-from azure.core.credentials import AzureKeyCredential
-from azure.ai.formrecognizer import DocumentAnalysisClient
+from azure.ai.formrecognizer import AnalyzeResult, DocumentAnalysisClient
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
-import tkinter as tk
-from tkinter import filedialog, messagebox, scrolledtext, ttk
+from ocr_cache import client_api_version, get_default_cache
+from scan_index import indexed_hash, iter_pdf_files
+from results_export import DOCUMENT_LAYOUT_VERSION, clean_text, export_results
+from results_store import CheckpointWriter, open_results_store
+from rate_limiter import AdaptiveRateLimiter, ThrottledError
+from client_pool import get_shared_client
+from instrumentation import timed
+from concurrent_ocr import split_by_size
+from upload_io import DEFAULT_LARGE_IN_FLIGHT, open_upload
 
 # Define the models here
 MODEL_IDS = {
@@ -32,71 +35,141 @@ def read_credentials(file_path):
             ai_credentials[key] = value.strip('"')
     return ai_credentials
 
-# Read credentials from the azure_credentials.txt file
-credentials_file_path = "text_files/credentials.txt"  # Ensure this is correct
-credentials = read_credentials(credentials_file_path)
-endpoint = credentials["endpoint"]
-key = credentials["key"]
-
-# Initialize the Azure Form Recognizer client
-client = DocumentAnalysisClient(endpoint=endpoint, credential=AzureKeyCredential(key))
+# Credentials file, relative to this script so it works from any working directory
+credentials_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "text_files", "credentials.txt")
+DEFAULT_MODEL_ID = MODEL_IDS["Large_Format_2024_11_07"]
+
+# Further models, one per line as either a bare model id or "Label": "model_id" (ARCHSCAN_MODEL_IDS to override)
+MODEL_IDS_FILE = os.environ.get(
+    "ARCHSCAN_MODEL_IDS", os.path.join(os.path.dirname(os.path.abspath(__file__)), "text_files", "model_ids.txt")
+)
+
+# Function to get the selectable models: MODEL_IDS plus any listed in model_ids.txt, as {label: model id}
+def load_model_ids(file_path=MODEL_IDS_FILE):
+    model_ids = dict(MODEL_IDS)
+    if not os.path.exists(file_path):
+        return model_ids
+    with open(file_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            line = line.strip().rstrip(",")
+            if not line or line.startswith("#"):
+                continue
+            label, separator, model_id = line.partition(":")
+            if separator:
+                model_ids[label.strip().strip('"')] = model_id.strip().strip('"')
+            else:
+                model_ids[line.strip('"')] = line.strip('"')
+    return model_ids
+
+# Function to turn a model label (or a model id used as is) into the model id
+def resolve_model_id(name):
+    return load_model_ids().get(name, name)
+
+# Shared limiter that every analyze call goes through. Set requests_per_second to the
+# tier's transaction limit; the concurrency window adapts to 429s on its own.
+rate_limiter = AdaptiveRateLimiter(requests_per_second=15, max_concurrency=16)
+
+# Retries the client's own policy makes before an error reaches the limiter, which retries on top
+# of them: few enough that the limiter's window reacts to 429s, enough to ride out a lost status poll
+SDK_RETRY_TOTAL = 2
+
+# The Azure Form Recognizer client is created on first use rather than at import
+client = None
+_client_lock = threading.Lock()
+
+# Function to get (and lazily create) the shared Azure Form Recognizer client.
+# Its connection pool has room for every analysis thread the limiter allows plus its poller thread.
+def get_client():
+    global client
+    with _client_lock:
+        if client is None:
+            credentials = read_credentials(credentials_file_path)
+            client = get_shared_client(
+                DocumentAnalysisClient, credentials["endpoint"], credentials["key"],
+                pool_size=2 * rate_limiter.max_concurrency, retry_total=SDK_RETRY_TOTAL
+            )
+        return client
+
+# Function to submit the analysis and return its poller (run by the rate limiter's call_and_wait,
+# which retries the submit and holds its slot until the poller finishes).
+# The document is streamed from a memory map, so a 500 MB scan is never read into memory.
+# Once stop is set, a file still waiting for a limiter slot or a retry is not submitted.
+def submit_analysis(client, model_id, document_path, stop=None):
+    if stop is not None and stop.is_set():
+        raise RuntimeError(f"Run stopped before {os.path.basename(document_path)} was submitted")
+    with open_upload(document_path) as f:
+        return client.begin_analyze_document(model_id=model_id, document=f)
+
+# Function to turn an AnalyzeResult into the stored per-document layout.
+# Fields are stored once per document; each field records the pages its bounding regions fall on.
+def build_document_result(file_name, file_hash, result):
+    document_fields = {}
+    for document in result.documents:
+        for name, field in document.fields.items():
+            document_fields[name] = {
+                "value": field.value,
+                "confidence": field.confidence,
+                "page_numbers": sorted({region.page_number for region in field.bounding_regions or []}),
+            }
 
-# Function to clean text values and replace pilcrow-like symbols
-def clean_text(value):
-    if isinstance(value, str):
-        value = re.sub(r'[\u00b6\u2029\r\n]+', ' ', value)  # Handles ¶, paragraph separators, and newlines
-        return value.strip()
-    return value
+    pages = []
+    for page in result.pages:
+        page_info = {"page_number": page.page_number, "tables": "No tables found on this page."}
+        if hasattr(page, "tables"):
+            page_info["tables"] = [{"table_data": table.cells} for table in page.tables]
+        pages.append(page_info)
+
+    return {
+        "file_name": file_name,
+        "file_hash": file_hash,
+        "layout_version": DOCUMENT_LAYOUT_VERSION,
+        "pages": pages,
+        "document_fields": document_fields,
+    }
 
 # Function to analyze a document
-def analyze_document(client, model_id, document_path):
+def analyze_document(client, model_id, document_path, limiter=None, cache=None, stop=None):
+    limiter = limiter or rate_limiter
+    cache = cache or get_default_cache()
     try:
-        with open(document_path, "rb") as f:
-            poller = client.begin_analyze_document(model_id=model_id, document=f)
-        result = poller.result()
-
-        document_result = {
-            "file_name": os.path.basename(document_path),
-            "pages": []
-        }
-
-        for page in result.pages:
-            page_info = {"page_number": page.page_number, "tables": "No tables found on this page."}
-            if hasattr(page, "tables"):
-                page_info["tables"] = [{"table_data": table.cells} for table in page.tables]
-
-            document_fields = {
-                name: {"value": field.value, "confidence": field.confidence}
-                for document in result.documents
-                for name, field in document.fields.items()
-            }
-
-            page_info["document_fields"] = document_fields
-            document_result["pages"].append(page_info)
-
+        # Reuse an earlier analysis of identical bytes with the same model (the hash itself comes from the scan index)
+        file_hash = indexed_hash(document_path)
+        if file_hash is None:
+            raise OSError(f"Cannot read {document_path}")
+        api_version = client_api_version(client)
+        with timed("cache_lookup", document_path):
+            cached = cache.get(file_hash, model_id, api_version)
+        if cached:
+            result = AnalyzeResult.from_dict(cached[0])
+        else:
+            # Includes time spent waiting on the rate limiter and retrying throttled calls. Polls that
+            # exhaust the SDK's retries raise ThrottledError: the file is retried on a later run, not resubmitted now
+            with timed("analyze", document_path):
+                result = limiter.call_and_wait(submit_analysis, client, model_id, document_path, stop)
+            cache.put(file_hash, model_id, api_version, result.to_dict())
+
+        document_result = build_document_result(os.path.basename(document_path), file_hash, result)
         return document_result
+    except ThrottledError:
+        raise
     except Exception as e:
         raise Exception(f"Error processing {document_path}: {str(e)}")
 
-# Function to filter new files for processing
-def filter_new_files(folder_path, json_file_path, excel_file_path):
-    existing_file_names = set()
-
-    if os.path.exists(json_file_path):
-        with open(json_file_path, "r") as json_file:
-            existing_data = json.load(json_file)
-        existing_file_names.update(doc["file_name"] for doc in existing_data)
-
-    if os.path.exists(excel_file_path):
-        df_existing = pd.read_excel(excel_file_path)
-        existing_file_names.update(df_existing['File Name'].unique())
-
-    pdf_files = [
-        os.path.join(dirpath, filename)
-        for dirpath, _, filenames in os.walk(folder_path)
-        for filename in filenames
-        if filename.endswith(".pdf") and filename not in existing_file_names
-    ]
+# Function to filter new files for processing (the folder is walked through the scan index).
+# Files are matched by content hash, so a renamed copy of a stored drawing is skipped and a different
+# drawing that reuses a stored name is not. Names only decide for rows stored without a hash (legacy
+# JSON imports) and for files that cannot be read, which analyze_document then reports.
+def filter_new_files(folder_path, store):
+    pdf_files = []
+    for file_path in iter_pdf_files(folder_path):
+        file_name = os.path.basename(file_path)
+        file_hash = indexed_hash(file_path)
+        if file_hash is None:
+            known = store.has_file_name(file_name)
+        else:
+            known = store.has_file_hash(file_hash) or store.has_unhashed_file_name(file_name)
+        if not known:
+            pdf_files.append(file_path)
 
     return pdf_files
 
@@ -107,107 +180,135 @@ def ensure_log_file_exists(log_file_path):
         with open(log_file_path, "w") as log_file:
             log_file.write("Unsupported or Corrupted Files:\n")
 
-# Function to process a folder of documents
-def process_folder(client, model_id, folder_path, json_file_path, excel_file_path, unsupported_files_log):
-    pdf_files = filter_new_files(folder_path, json_file_path, excel_file_path)
+# Function to process a folder of documents: the files not in the store yet go through process_files.
+def process_folder(client, model_id, folder_path, store, unsupported_files_log,
+                   throttled_files_log=None, limiter=None, cache=None, progress=None):
+    pdf_files = filter_new_files(folder_path, store)
     if not pdf_files:
         print("No new files to process.")
-        return [], []
+        return 0, [], []
+    return process_files(client, model_id, pdf_files, store, unsupported_files_log, throttled_files_log, limiter,
+                         cache, progress)
+
+# Function to process a list of documents. Each result is checkpointed into the store as it
+# completes (committed in small batches), so a crashed run resumes with only the unfinished files.
+# Returns (number of documents saved, unsupported files, throttled files); progress(done, total) follows each file.
+def process_files(client, model_id, pdf_files, store, unsupported_files_log,
+                  throttled_files_log=None, limiter=None, cache=None, progress=None):
+    limiter = limiter or rate_limiter
+    if throttled_files_log is None:
+        throttled_files_log = os.path.join(os.path.dirname(unsupported_files_log), "throttled_files.txt")
 
-    all_results = []
     unsupported_files = []
+    throttled_files = []
 
     ensure_log_file_exists(unsupported_files_log)
 
     with open(unsupported_files_log, "a") as log_file:
         log_file.write("\nProcessing new batch:\n")
 
-    with ThreadPoolExecutor() as executor:
-        future_to_file = {executor.submit(analyze_document, client, model_id, file): file for file in pdf_files}
-
-        with tqdm(total=len(pdf_files), desc="Processing Documents", unit="file") as progress_bar:
-            for future in as_completed(future_to_file):
-                file = future_to_file[future]
-                try:
-                    result = future.result()
-                    all_results.append(result)
-                except Exception as e:
-                    unsupported_files.append(file)
-                    with open(unsupported_files_log, "a") as log_file:
-                        log_file.write(f"{file}\n")
-                progress_bar.update(1)
-
-    return all_results, unsupported_files
-
-# New JSON to Excel function
-def json_to_excel(json_file_path, excel_file_path):
-    with open(json_file_path, "r") as f:
-        data = json.load(f)
-
-    excel_data = []
-    for doc in data:
-        for page in doc["pages"]:
-            document_fields = page.get("document_fields", {})
-            excel_data.append({
-                "File Name": clean_text(doc["file_name"]),
-                "Page Number": clean_text(str(page["page_number"])),
-                "Tables": clean_text(page["tables"]) if isinstance(page["tables"], str) else "Tables found",
-                "Title": clean_text(document_fields.get("Title", {}).get("value", "N/A")),
-                "Title Confidence": clean_text(str(document_fields.get("Title", {}).get("confidence", "N/A"))),
-                "Date": clean_text(document_fields.get("Date", {}).get("value", "N/A")),
-                "Date Confidence": clean_text(str(document_fields.get("Date", {}).get("confidence", "N/A"))),
-                "Drawing Number": clean_text(document_fields.get("Drawing_Number", {}).get("value", "N/A")),
-                "Drawing Number Confidence": clean_text(str(document_fields.get("Drawing_Number", {}).get("confidence", "N/A"))),
-                "Originator": clean_text(document_fields.get("Originator", {}).get("value", "N/A")),
-                "Originator Confidence": clean_text(str(document_fields.get("Originator", {}).get("confidence", "N/A"))),
-                "Discipline": clean_text(document_fields.get("Discipline", {}).get("value", "N/A")),
-                "Discipline Confidence": clean_text(str(document_fields.get("Discipline", {}).get("confidence", "N/A"))),
-                "Floor Number": clean_text(document_fields.get("Floor Number", {}).get("value", "N/A")),
-                "Floor Number Confidence": clean_text(str(document_fields.get("Floor Number", {}).get("confidence", "N/A")))
-            })
-
-    df_new = pd.DataFrame(excel_data)
-    if os.path.exists(excel_file_path):
-        df_existing = pd.read_excel(excel_file_path)
-        existing_file_names = df_existing['File Name'].unique()
-        df_new = df_new[~df_new['File Name'].isin(existing_file_names)]
-        df_combined = pd.concat([df_existing, df_new], ignore_index=True)
-    else:
-        df_combined = df_new
-
-    df_combined.to_excel(excel_file_path, index=False)
-    print(f"Data written to {excel_file_path}")
-
-# Function to handle folder selection and processing in a separate thread
-def handle_folder_upload(input_folder_path, output_folder_path):
-    model_id = MODEL_IDS["Large_Format_2024_11_07"]
+    # Threads beyond the limiter's window just wait for a slot. Large-format files run on their
+    # own small lane, largest first, so they cannot take every slot while small files queue behind them.
+    small_files, large_files = split_by_size(pdf_files)
+    stop = threading.Event()
+    with CheckpointWriter(store) as checkpoint:
+        executor = ThreadPoolExecutor(max_workers=limiter.max_concurrency)
+        large_executor = ThreadPoolExecutor(max_workers=DEFAULT_LARGE_IN_FLIGHT)
+        try:
+            future_to_file = {large_executor.submit(analyze_document, client, model_id, file, limiter, cache, stop): file for file in large_files}
+            future_to_file.update({executor.submit(analyze_document, client, model_id, file, limiter, cache, stop): file for file in small_files})
+
+            if progress is not None:
+                progress(0, len(pdf_files))
+            with tqdm(total=len(pdf_files), desc="Processing Documents", unit="file") as progress_bar:
+                for future in as_completed(future_to_file):
+                    file = future_to_file[future]
+                    try:
+                        result = future.result()
+                        checkpoint.add(result)
+                    except ThrottledError:
+                        # Not corrupt: left out of the results so the next run picks it up again
+                        throttled_files.append(file)
+                        with open(throttled_files_log, "a") as log_file:
+                            log_file.write(f"{file}\n")
+                    except Exception as e:
+                        unsupported_files.append(file)
+                        with open(unsupported_files_log, "a") as log_file:
+                            log_file.write(f"{file}\n")
+                    progress_bar.update(1)
+                    if progress is not None:
+                        progress(progress_bar.n, len(pdf_files))
+        finally:
+            # On an interrupt (or a progress hook that stops the run), drop queued files instead of
+            # analyzing them; they stay unfinished for the next run. Analyses already submitted finish into the OCR cache.
+            stop.set()
+            large_executor.shutdown(wait=False, cancel_futures=True)
+            executor.shutdown(wait=True, cancel_futures=True)
+            large_executor.shutdown(wait=True)
+
+    return checkpoint.saved, unsupported_files, throttled_files
+
+# Function to export the stored results to Excel (or .csv / .parquet by extension).
+# Rows are streamed from the store; an existing workbook is read back once, the first time the store
+# exports over it, to keep the rows of files only it held (see results_export.import_legacy_excel).
+def json_to_excel(store, excel_file_path):
+    with timed("export") as span:
+        export_results(store, excel_file_path)
+        span.bytes = os.path.getsize(excel_file_path)
+
+# Function to process a folder and export the results; returns (summary, unsupported files, throttled files).
+# progress(done, total) is called as files finish; raising from it stops the run (finished files stay stored).
+def run_folder(input_folder_path, output_folder_path, model_id=DEFAULT_MODEL_ID, export_file_name=None, limiter=None,
+               progress=None):
     json_file_path = os.path.join(output_folder_path, "document_results.json")
-    excel_file_path = os.path.join(output_folder_path, "document_analysis_results.xlsx")
+    excel_file_path = os.path.join(output_folder_path, export_file_name or "document_analysis_results.xlsx")
     unsupported_files_log = os.path.join(output_folder_path, "unsupported_files.txt")
+    throttled_files_log = os.path.join(output_folder_path, "throttled_files.txt")
 
-    all_results, unsupported_files = process_folder(
-        client, model_id, input_folder_path, json_file_path, excel_file_path, unsupported_files_log
-    )
-    save_to_json(json_file_path, all_results)
-    json_to_excel(json_file_path, excel_file_path)
-
-    return f"Processed folder: {input_folder_path}\nResults saved to {output_folder_path}"
+    # Results live in document_results.sqlite3; an older document_results.json is imported once
+    with open_results_store(output_folder_path, json_file_path) as store:
+        saved_count, unsupported_files, throttled_files = process_folder(
+            get_client(), model_id, input_folder_path, store, unsupported_files_log, throttled_files_log, limiter,
+            progress=progress
+        )
+        print(f"{saved_count} results saved to {store.db_path}")
+        json_to_excel(store, excel_file_path)
 
-# Function to save results to a JSON file
-def save_to_json(json_file_path, all_results):
-    if os.path.exists(json_file_path):
-        with open(json_file_path, "r") as json_file:
-            existing_data = json.load(json_file)
-        all_results = existing_data + all_results
+    summary = f"Processed folder: {input_folder_path}\nResults saved to {output_folder_path}"
+    if throttled_files:
+        summary += f"\n{len(throttled_files)} file(s) throttled by Azure; they will be retried on the next run"
+    return summary, unsupported_files, throttled_files
 
-    with open(json_file_path, "w") as json_file:
-        json.dump(all_results, json_file, indent=4)
-    print(f"All results saved to {json_file_path}")
+# Function to handle folder selection and processing (the GUI runs it on a worker thread, see gui_runner)
+def handle_folder_upload(input_folder_path, output_folder_path, model_id=DEFAULT_MODEL_ID, export_file_name=None,
+                         progress=None):
+    return run_folder(input_folder_path, output_folder_path, model_id, export_file_name, progress=progress)[0]
 
 # Function to start the Tkinter GUI
 def start_gui(handle_folder_upload):
+    # Imported here so the processing functions can be used on machines without a display
+    import tkinter as tk
+    from tkinter import filedialog, messagebox, scrolledtext, ttk
+    from gui_runner import BackgroundRun, RunCancelled, progress_text
+    from job_panel import add_job_panel
+
     selected_input_folder = None
     selected_output_folder = None
+    run = None
+    model_ids = load_model_ids()
+    default_model_label = next(label for label, model_id in model_ids.items() if model_id == DEFAULT_MODEL_ID)
+
+    def selected_model_id():
+        return model_ids.get(model_combo.get(), DEFAULT_MODEL_ID)
+
+    def selected_folders():
+        if selected_input_folder and selected_output_folder:
+            return selected_input_folder, selected_output_folder
+        return None
+
+    def show_job_text(text):
+        output_text.delete(1.0, tk.END)
+        output_text.insert(tk.END, text)
 
     def upload_folder():
         nonlocal selected_input_folder
@@ -225,20 +326,45 @@ def start_gui(handle_folder_upload):
         destination_label.config(
             text=f"Output folder: {os.path.basename(selected_output_folder)}" if selected_output_folder else "No output folder selected.")
 
+    # The worker thread never touches a widget: progress and the result come back through gui_runner
     def run_process():
+        nonlocal run
         if not selected_input_folder or not selected_output_folder:
             messagebox.showwarning("Folders missing", "Please select both input and output folders before running.")
             return
+        input_folder, output_folder, model_id = selected_input_folder, selected_output_folder, selected_model_id()
         status_label.config(text="Processing...")
-
-        def background_task():
-            result = handle_folder_upload(selected_input_folder, selected_output_folder)
+        progress_bar.config(value=0, maximum=1)
+        run_button.config(state=tk.DISABLED)
+        cancel_button.config(state=tk.NORMAL)
+        run = BackgroundRun(
+            root, lambda progress: handle_folder_upload(input_folder, output_folder, model_id, progress=progress),
+            show_progress, lambda result, error: finish_run(result, error, output_folder)
+        ).start()
+
+    def show_progress(done, total, elapsed):
+        progress_bar.config(value=done, maximum=max(total, 1))
+        if not run.cancelled:
+            status_label.config(text=f"Processing... {progress_text(done, total, elapsed)}")
+
+    def cancel_run():
+        run.cancel()
+        cancel_button.config(state=tk.DISABLED)
+        status_label.config(text="Cancelling... waiting for the files in flight to finish.")
+
+    def finish_run(result, error, output_folder):
+        run_button.config(state=tk.NORMAL)
+        cancel_button.config(state=tk.DISABLED)
+        if isinstance(error, RunCancelled):
+            status_label.config(text="Processing cancelled. Finished files are stored and skipped on the next run.")
+        elif error is not None:
+            status_label.config(text="Processing failed.")
+            messagebox.showerror("Error", f"{type(error).__name__}: {error}")
+        else:
             output_text.delete(1.0, tk.END)
             output_text.insert(tk.END, result)
             status_label.config(text="Processing complete.")
-            root.after(0, lambda: messagebox.showinfo("Success", f"Files saved to {selected_output_folder}"))
-
-        threading.Thread(target=background_task).start()
+            messagebox.showinfo("Success", f"Files saved to {output_folder}")
 
     #Create GUI
     root = tk.Tk()
@@ -281,15 +407,33 @@ def start_gui(handle_folder_upload):
     run_frame.pack(side='left',padx=10)
     run_button = tk.Button(button_frame, text="Run", command=run_process, font=("Helvetica", 12), bg="#4a90e2", fg="white", padx=10, pady=5)
     run_button.pack(side='top', padx=10, pady=10)
+    cancel_button = tk.Button(button_frame, text="Cancel", command=cancel_run, font=("Helvetica", 12), bg="#4a90e2", fg="white", padx=10, pady=5, state=tk.DISABLED)
+    cancel_button.pack(side='top', padx=10, pady=10)
+
+    #Model selection (MODEL_IDS plus model_ids.txt), used by Run and by queued jobs
+    model_frame = tk.Frame(main_frame, bg='#f0f0f0')
+    model_frame.pack(pady=5)
+    tk.Label(model_frame, text="Model:", font=("Helvetica", 12), bg="#f0f0f0").pack(side='left', padx=5)
+    model_combo = ttk.Combobox(model_frame, values=list(model_ids), state="readonly", width=35, font=("Helvetica", 12))
+    model_combo.set(default_model_label)
+    model_combo.pack(side='left', padx=5)
+
+    #Job queue panel
+    job_panel = add_job_panel(main_frame, "extract", selected_folders, selected_model_id, show_text=show_job_text)
+    job_panel.pack(fill='x', padx=10)
 
     #Output text
-    output_text = scrolledtext.ScrolledText(main_frame, wrap=tk.WORD, width=100, height=25, font=("Courier", 10))
+    output_text = scrolledtext.ScrolledText(main_frame, wrap=tk.WORD, width=100, height=18, font=("Courier", 10))
     output_text.pack(pady=10, expand=True, fill='both')
 
     #Status label
     status_label = tk.Label(main_frame, text="", font=("Helvetica", 10), bg="#f0f0f0", fg="#4a90e2")
     status_label.pack(pady=10)
 
+    #Progress bar
+    progress_bar = ttk.Progressbar(main_frame, orient="horizontal", mode="determinate", length=400)
+    progress_bar.pack(pady=10)
+
     root.mainloop()
 
 # Entry point
@@ -4,21 +4,28 @@ NASA-Style Python Script for OCR and Text Filtering Using Azure Document Intelli
 """
 
 import os
-import json
-import tkinter as tk
-from tkinter import filedialog
-from tkinter import messagebox
-from tkinter import scrolledtext
-from tkinter import ttk
-from typing import Set
-from azure.core.credentials import AzureKeyCredential
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional, Set, Tuple, Union
 from azure.ai.documentintelligence import DocumentIntelligenceClient
-from azure.ai.documentintelligence.models import AnalyzeOutputOption, AnalyzeResult
+from ocr_cache import OcrCache, client_api_version, get_default_cache
+from scan_index import iter_pdf_files
+from stop_words import StopWordFilter
+from ocr_json_stream import iter_line_contents
+from result_format import DEFAULT_RESULT_FORMAT, write_result
+from concurrent_ocr import DEFAULT_MAX_IN_FLIGHT, run_by_size
+from polling_engine import AnalyzePollingEngine
+from client_pool import get_shared_client
+from instrumentation import timed
+from ocr_file import OcrFile, analyze_file, cache_result, run_submitted, start_pdf, submit_uncached
+from ocr_pipeline import run_ocr_pipeline
+from text_layer import TextLayerReport
 
 # -----------------------------------------------------------------------------
 # Global Constants
 # -----------------------------------------------------------------------------
-STOP_WORDS_FILE_PATH = "text_files/stop_words.txt"
+STOP_WORDS_FILE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "text_files", "stop_words.txt"
+)
 AZURE_ENDPOINT = "https://as-lf-ai-01.cognitiveservices.azure.com/"
 AZURE_KEY = "18ce006f0ac44579a36bfaf01653254c"
 
@@ -29,17 +36,18 @@ AZURE_KEY = "18ce006f0ac44579a36bfaf01653254c"
 def load_stop_words_from_file(file_path: str) -> Set[str]:
     """
     Load stop words from a text file. If the file is not found,
-    display an error and return an empty set.
+    report it and return an empty set (the GUI shows the error on start).
     """
     try:
         with open(file_path, "r", encoding="utf-8") as file_handle:
             return {line.strip().lower() for line in file_handle}
     except FileNotFoundError:
-        messagebox.showerror("Error", f"Stop words file not found: {file_path}")
+        print(f"Stop words file not found: {file_path}")
         return set()
 
 
 STOP_WORDS = load_stop_words_from_file(STOP_WORDS_FILE_PATH)
+STOP_WORD_FILTER = StopWordFilter(STOP_WORDS)
 
 
 # -----------------------------------------------------------------------------
@@ -48,54 +56,56 @@ STOP_WORDS = load_stop_words_from_file(STOP_WORDS_FILE_PATH)
 def process_single_pdf(
         file_path: str,
         output_folder: str,
-        client: DocumentIntelligenceClient
+        client: DocumentIntelligenceClient,
+        cache: Optional[OcrCache] = None,
+        result_format: str = DEFAULT_RESULT_FORMAT,
+        file_hash: Optional[str] = None,
+        analysis: Optional[Future] = None,
+        pages_per_range: Optional[int] = None,
+        text_layer: Optional[TextLayerReport] = None
 ) -> str:
     """
     Process a single PDF file for OCR using Azure Document Intelligence,
-    save output as PDF, JSON, and filtered text.
+    save output as PDF, JSON, and filtered text. Results for a file that was
+    already analyzed with the same model and API version come from the cache.
 
     :param file_path: Full path to the input PDF file
     :param output_folder: Output directory to save results
     :param client: DocumentIntelligenceClient instance
+    :param cache: OCR result cache; the shared default cache if omitted
+    :param result_format: On-disk result format (see result_format.RESULT_FORMATS)
+    :param file_hash: SHA-256 of the file if already known
+    :param analysis: AnalyzePollingEngine future already running for this file, if any
+    :param pages_per_range: Split PDFs with more pages than this into concurrently analyzed page ranges
+    :param text_layer: Text-layer pre-check; pages that carry usable text are read locally
     :return: A status message indicating success or failure
     """
-    base_name = os.path.splitext(os.path.basename(file_path))[0]
-    pdf_path_out = os.path.join(output_folder, f"{base_name}.pdf")
-    json_path_out = os.path.join(output_folder, f"{base_name}.json")
-    text_path_out = os.path.join(output_folder, f"{base_name}_filtered.txt")
+    cache = cache or get_default_cache()
 
     try:
-        with open(file_path, "rb") as handle_in:
-            poller = client.begin_analyze_document(
-                model_id="prebuilt-read",
-                analyze_request=handle_in,
-                output=[AnalyzeOutputOption.PDF],
-                content_type="application/octet-stream",
-            )
-            analyze_result: AnalyzeResult = poller.result()
-
-        response = client.get_analyze_result_pdf(
-            model_id=analyze_result.model_id,
-            result_id=poller.details["operation_id"],
+        ocr_file = OcrFile(file_path, output_folder, result_format)
+        ocr_file.file_hash = file_hash
+        api_version = client_api_version(client)
+        analyze_file(
+            ocr_file, client, cache, api_version, analysis,
+            pages_per_range=pages_per_range, text_layer=text_layer
         )
-        with open(pdf_path_out, "wb") as handle_out_pdf:
-            handle_out_pdf.writelines(response)
-
-        as_dict_result = analyze_result.as_dict()
-        with open(json_path_out, "w", encoding="utf-8") as handle_out_json:
-            json.dump(as_dict_result, handle_out_json, indent=4, ensure_ascii=False)
-
-        with open(text_path_out, "w", encoding="utf-8") as handle_out_text:
-            for page in as_dict_result.get("pages", []):
-                for line in page.get("lines", []):
-                    content = line.get("content", "")
-                    tokens = content.split()
-                    filtered_tokens = [
-                        token
-                        for token in tokens
-                        if token.lower() not in STOP_WORDS
-                    ]
-                    handle_out_text.write(" ".join(filtered_tokens) + "\n")
+
+        # Searchable PDF download, overlapped with writing the result and filtered text
+        pdf_download: Optional[Future] = start_pdf(ocr_file, client, cache, api_version)
+
+        with timed("result_write", file_path) as span:
+            span.bytes = write_result(ocr_file.result_json, ocr_file.result_file, result_format)
+
+        with timed("stop_word_filter", file_path):
+            with open(ocr_file.txt_output_file, "w", encoding="utf-8") as handle_out_text:
+                handle_out_text.writelines(
+                    line + "\n" for line in STOP_WORD_FILTER.filter_result(ocr_file.result_json)
+                )
+
+        if pdf_download is not None:
+            _, ocr_file.pdf_checksum = pdf_download.result()
+        cache_result(ocr_file, cache, api_version)
 
         return f"Processed: {file_path}\n"
 
@@ -110,70 +120,159 @@ def process_single_pdf(
 # -----------------------------------------------------------------------------
 def filter_text_from_json(
         json_path: str,
-        stop_words: Set[str],
+        stop_words: Union[Set[str], StopWordFilter],
         output_txt_path: str
 ) -> None:
     """
-    Load OCR JSON data, filter out stop words, and write the cleaned
-    text to a .txt file.
+    Stream OCR JSON line contents page by page, filter out stop words,
+    and write the cleaned text to a .txt file.
 
     :param json_path: Path to the JSON file
-    :param stop_words: Set of stop words to filter out
+    :param stop_words: Set of stop words, or a prepared StopWordFilter
     :param output_txt_path: the Path where the filtered text will be written
     """
     try:
-        with open(json_path, "r", encoding="utf-8") as handle_in:
-            data = json.load(handle_in)
-
-        filtered_lines = []
-        for page in data.get("pages", []):
-            for line in page.get("lines", []):
-                content = line.get("content", "")
-                tokens = content.split()
-                filtered_tokens = [
-                    token
-                    for token in tokens
-                    if token.lower() not in stop_words
-                ]
-                filtered_lines.append(" ".join(filtered_tokens))
-
         with open(output_txt_path, "w", encoding="utf-8") as handle_out:
-            handle_out.write("\n".join(filtered_lines))
+            StopWordFilter.coerce(stop_words).write_lines(
+                iter_line_contents(json_path),
+                handle_out
+            )
 
     except Exception as exc:
         print(f"Error processing JSON file {json_path}: {exc}")
 
 
+# -----------------------------------------------------------------------------
+# Submit Uncached PDF
+# -----------------------------------------------------------------------------
+def submit_uncached_pdf(
+        file_path: str,
+        client: DocumentIntelligenceClient,
+        cache: OcrCache,
+        engine: AnalyzePollingEngine,
+        pages_per_range: Optional[int] = None,
+        text_layer: Optional[TextLayerReport] = None
+) -> Tuple[Optional[str], Optional[Future]]:
+    """
+    Hash a PDF and, unless the OCR cache already holds its result, submit it
+    to the polling engine. Errors are left for process_single_pdf to report,
+    and PDFs long enough to be split into page ranges, or with a text layer on
+    only some pages, are left for it to split. A PDF read wholly from its text
+    layer gets a completed future with no result id.
+
+    :param file_path: Full path to the input PDF file
+    :param client: DocumentIntelligenceClient instance
+    :param cache: OCR result cache
+    :param engine: Running AnalyzePollingEngine
+    :param pages_per_range: Page-range size of split mode, if enabled
+    :param text_layer: Text-layer pre-check, if enabled
+    :return: The file hash (None if unreadable) and the analysis future (None on a cache hit)
+    """
+    return submit_uncached(file_path, client, cache, engine, pages_per_range, text_layer)
+
+
 # -----------------------------------------------------------------------------
 # Handle Folder Upload
 # -----------------------------------------------------------------------------
 def handle_folder_upload(
         input_folder: str,
-        output_folder: str
+        output_folder: str,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+        client: Optional[DocumentIntelligenceClient] = None,
+        cache: Optional[OcrCache] = None,
+        result_format: str = DEFAULT_RESULT_FORMAT,
+        max_operations: Optional[int] = None,
+        pages_per_range: Optional[int] = None,
+        progress: Optional[Callable[[int, int], None]] = None,
+        pipelined: bool = False,
+        stage_workers: Optional[Dict[str, int]] = None,
+        queue_size: Optional[int] = None,
+        use_text_layer: bool = False
 ) -> str:
     """
-    Scan an input folder for PDF files, process them, and summarize the results.
+    Scan an input folder for PDF files, process them concurrently (large
+    files on their own low-concurrency lane), and summarize the results
+    in input order. With max_operations set, the
+    analyses are submitted ahead of the workers (by at most max_operations
+    + max_in_flight files) to an AnalyzePollingEngine and polled from one
+    event loop, and the worker threads only finish each file; a stopped run
+    still finishes the files whose analyses were open (see ocr_file.run_submitted).
+    With pages_per_range set, long PDFs are analyzed as concurrent page
+    ranges and their results merged. With pipelined set, the files go
+    through the staged pipeline of ocr_pipeline instead. With
+    use_text_layer set, PDF pages that already carry a usable text layer
+    are read locally instead of analyzed (needs pypdf), and the summary ends
+    with the pages, cost and time that saved.
 
     :param input_folder: Input folder path containing PDF files
     :param output_folder: Output folder path
+    :param max_in_flight: Maximum number of analyses running at once
+    :param client: Optional client to reuse; the shared pooled client if omitted
+    :param cache: OCR result cache; the shared default cache if omitted
+    :param result_format: On-disk result format (see result_format.RESULT_FORMATS)
+    :param max_operations: Analyses kept open on the service by the polling engine
+    :param pages_per_range: Split PDFs with more pages than this into page ranges
+    :param progress: Called as progress(done, total) as files finish; raising stops the run
+    :param pipelined: Run analyze, download, serialize, filter and export as overlapping stages
+    :param stage_workers: Workers of single stages, e.g. {"download": 16} (see ocr_pipeline.stage_workers_for)
+    :param queue_size: Files allowed to wait in front of each stage
+    :param use_text_layer: Read PDF pages with a usable text layer locally (see text_layer)
     :return: A summary string of all processed files
     """
-    client = DocumentIntelligenceClient(
-        endpoint=AZURE_ENDPOINT,
-        credential=AzureKeyCredential(AZURE_KEY)
-    )
-
-    summary = ""
-    pdf_files_list = []
-    for root, _, file_list in os.walk(input_folder):
-        for filename in file_list:
-            if filename.lower().endswith(".pdf"):
-                pdf_files_list.append(os.path.join(root, filename))
-
-    for pdf_path in pdf_files_list:
-        summary += process_single_pdf(pdf_path, output_folder, client)
-
-    return summary
+    if client is None:
+        client = get_shared_client(DocumentIntelligenceClient, AZURE_ENDPOINT, AZURE_KEY)
+
+    text_layer = TextLayerReport() if use_text_layer else None
+
+    # Found through the scan index and fed to the workers as the walk goes
+    pdf_files = iter_pdf_files(input_folder)
+
+    if pipelined:
+        summaries = run_ocr_pipeline(
+            pdf_files,
+            output_folder,
+            client,
+            STOP_WORDS,
+            cache,
+            result_format,
+            max_in_flight,
+            stage_workers,
+            queue_size,
+            max_operations,
+            pages_per_range,
+            progress,
+            text_layer
+        )
+        return "".join(summaries) + (text_layer.summary() if text_layer else "")
+
+    if not max_operations:
+        summaries = run_by_size(
+            lambda pdf_path: process_single_pdf(
+                pdf_path, output_folder, client, cache, result_format, pages_per_range=pages_per_range,
+                text_layer=text_layer
+            ),
+            pdf_files,
+            max_in_flight,
+            progress=progress
+        )
+        return "".join(summaries) + (text_layer.summary() if text_layer else "")
+
+    cache = cache or get_default_cache()
+    with AnalyzePollingEngine(client, "prebuilt-read", max_operations) as engine:
+        # Submitted ahead of the workers as they go, so each analysis is dropped once its file is written
+        summaries = run_submitted(
+            engine,
+            pdf_files,
+            lambda pdf_path: submit_uncached_pdf(pdf_path, client, cache, engine, pages_per_range, text_layer),
+            lambda pdf_path, file_hash, analysis: process_single_pdf(
+                pdf_path, output_folder, client, cache, result_format, file_hash, analysis,
+                pages_per_range=pages_per_range, text_layer=text_layer
+            ),
+            max_operations + max_in_flight,
+            max_in_flight,
+            progress=progress
+        )
+    return "".join(summaries) + (text_layer.summary() if text_layer else "")
 
 
 # -----------------------------------------------------------------------------
@@ -184,10 +283,18 @@ def start_gui() -> None:
     Create and launch the GUI for selecting input/output folders and
     running the PDF processing operation.
     """
-    from typing import Optional
+    # Tkinter is imported lazily so the module also works headless
+    import tkinter as tk
+    from tkinter import filedialog
+    from tkinter import messagebox
+    from tkinter import scrolledtext
+    from tkinter import ttk
+    from gui_runner import BackgroundRun, RunCancelled, progress_text
+    from job_panel import add_job_panel
 
     selected_input_folder: Optional[str] = None
     selected_output_folder: Optional[str] = None
+    run: Optional[BackgroundRun] = None
 
     def select_input_folder() -> None:
         nonlocal selected_input_folder
@@ -217,7 +324,9 @@ def start_gui() -> None:
             selected_output_folder = None
             output_folder_label.config(text="No output folder selected.")
 
+    # The run happens on a worker thread (see gui_runner); the callbacks below run on the Tk thread
     def run_processing() -> None:
+        nonlocal run
         if not selected_input_folder or not selected_output_folder:
             messagebox.showwarning(
                 "Folders missing",
@@ -225,28 +334,53 @@ def start_gui() -> None:
             )
             return
 
+        input_folder, output_folder = selected_input_folder, selected_output_folder
         status_label.config(text="Processing...")
-        progress_bar.start()
-        root_window.update_idletasks()
-
-        result_text = handle_folder_upload(
-            selected_input_folder,
-            selected_output_folder
-        )
-        progress_bar.stop()
-        output_text_box.delete("1.0", tk.END)
-        output_text_box.insert(tk.END, result_text)
-        status_label.config(text="Processing complete.")
-        messagebox.showinfo(
-            "Success",
-            f"Files saved to {selected_output_folder}"
-        )
+        progress_bar.config(value=0, maximum=1)
+        run_button.config(state=tk.DISABLED)
+        cancel_button.config(state=tk.NORMAL)
+        run = BackgroundRun(
+            root_window,
+            lambda progress: handle_folder_upload(input_folder, output_folder, progress=progress),
+            show_progress,
+            lambda result, error: finish_processing(result, error, output_folder)
+        ).start()
+
+    def show_progress(done: int, total: int, elapsed: float) -> None:
+        progress_bar.config(value=done, maximum=max(total, 1))
+        if not run.cancelled:
+            status_label.config(text=f"Processing... {progress_text(done, total, elapsed)}")
+
+    def cancel_processing() -> None:
+        run.cancel()
+        cancel_button.config(state=tk.DISABLED)
+        status_label.config(text="Cancelling... waiting for the files in flight to finish.")
+
+    def finish_processing(result_text: Optional[str], error: Optional[Exception], output_folder: str) -> None:
+        run_button.config(state=tk.NORMAL)
+        cancel_button.config(state=tk.DISABLED)
+        if isinstance(error, RunCancelled):
+            status_label.config(text="Processing cancelled. Files already finished were kept.")
+        elif error is not None:
+            status_label.config(text="Processing failed.")
+            messagebox.showerror("Error", f"{type(error).__name__}: {error}")
+        else:
+            output_text_box.delete("1.0", tk.END)
+            output_text_box.insert(tk.END, result_text)
+            status_label.config(text="Processing complete.")
+            messagebox.showinfo(
+                "Success",
+                f"Files saved to {output_folder}"
+            )
 
     root_window = tk.Tk()
     root_window.title("OCR & Text Filter Tool")
     root_window.geometry("900x700")
     root_window.configure(bg="#f0f0f0")
 
+    if not STOP_WORDS:
+        messagebox.showerror("Error", f"Stop words file not found: {STOP_WORDS_FILE_PATH}")
+
     # Header Frame
     header_frame = tk.Frame(root_window, bg="#4a90e2", height=60)
     header_frame.grid(row=0, column=0, columnspan=2, sticky="ew")
@@ -323,12 +457,43 @@ def start_gui() -> None:
     )
     run_button.grid(row=0, column=2, pady=10)
 
+    cancel_button = tk.Button(
+        button_frame,
+        text="Cancel",
+        command=cancel_processing,
+        font=("Helvetica", 12),
+        bg="#4a90e2",
+        fg="white",
+        padx=10,
+        pady=5,
+        state=tk.DISABLED
+    )
+    cancel_button.grid(row=0, column=3, padx=10, pady=10)
+
+    # Job Queue Panel
+    def selected_folders() -> Optional[Tuple[str, str]]:
+        if selected_input_folder and selected_output_folder:
+            return selected_input_folder, selected_output_folder
+        return None
+
+    def show_job_text(text: str) -> None:
+        output_text_box.delete("1.0", tk.END)
+        output_text_box.insert(tk.END, text)
+
+    job_panel = add_job_panel(
+        main_frame,
+        "ocr",
+        selected_folders,
+        show_text=show_job_text
+    )
+    job_panel.grid(row=2, column=0, pady=5, sticky="ew")
+
     # Output Text Area
     output_text_box = scrolledtext.ScrolledText(
         main_frame,
         wrap=tk.WORD,
         width=100,
-        height=25,
+        height=18,
         font=("Courier", 10)
     )
     output_text_box.grid(row=4, column=0, pady=10)
@@ -345,13 +510,13 @@ def start_gui() -> None:
 
     # Footer with Progress Bar
     footer_frame = tk.Frame(main_frame, bg="#f0f0f0", height=40)
-    footer_frame.grid(row=5, column=0, columnspan=2, pady=10, sticky="ew")
+    footer_frame.grid(row=6, column=0, columnspan=2, pady=10, sticky="ew")
     footer_frame.grid_columnconfigure(0, weight=1)
 
     progress_bar = ttk.Progressbar(
         footer_frame,
         orient="horizontal",
-        mode="indeterminate",
+        mode="determinate",
         length=400
     )
     progress_bar.grid(row=0, column=0, pady=10)
@@ -0,0 +1,180 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+# Cache location and size budget. Entries are keyed by file content, so the same
+# cache can be shared between projects and output folders. Like the scan index and the
+# job queue, it lives next to the code, so the GUI and the CLI use the same cache from any
+# working directory.
+DEFAULT_CACHE_DIR = os.environ.get(
+    "ARCHSCAN_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "ocr_cache")
+)
+DEFAULT_MAX_BYTES = 10 * 1024 ** 3
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(file_path):
+    """
+    Returns the SHA-256 hex digest of a file, read in 1 MiB chunks.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def client_api_version(client):
+    """
+    Best-effort lookup of the API version a Document Intelligence / Form Recognizer client talks to.
+    """
+    config = getattr(client, "_config", None)
+    version = getattr(config, "api_version", None) or getattr(client, "_api_version", None)
+    return str(getattr(version, "value", version) or "unknown")
+
+
+class OcrCache:
+    """
+    Content-addressed on-disk cache of analysis results.
+
+    Each entry is keyed by (SHA-256 of the input file, model_id, API version) and holds
+    the AnalyzeResult dict and, optionally, the searchable PDF. Entries are evicted
+    least-recently-used first once the cache grows past max_bytes.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(cache_dir, "index.sqlite3"), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, size INTEGER NOT NULL, last_used REAL NOT NULL, has_pdf INTEGER NOT NULL,"
+            " pdf_sha256 TEXT)"
+        )
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(entries)")]
+        if "pdf_sha256" not in columns:
+            self._db.execute("ALTER TABLE entries ADD COLUMN pdf_sha256 TEXT")
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+        self._db.commit()
+
+    @staticmethod
+    def make_key(file_hash, model_id, api_version):
+        return hashlib.sha256(f"{file_hash}|{model_id}|{api_version}".encode("utf-8")).hexdigest()
+
+    def _paths(self, key):
+        folder = os.path.join(self.cache_dir, key[:2])
+        return os.path.join(folder, f"{key}.json"), os.path.join(folder, f"{key}.pdf")
+
+    def get(self, file_hash, model_id, api_version):
+        """
+        Returns (result_dict, pdf_path or None) for a cached entry, or None on a miss.
+        """
+        key = self.make_key(file_hash, model_id, api_version)
+        json_path, pdf_path = self._paths(key)
+        with self._lock:
+            row = self._db.execute("SELECT has_pdf FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            try:
+                with open(json_path, "r", encoding="utf-8") as f:
+                    result_dict = json.load(f)
+            except (OSError, ValueError):
+                # Entry files went missing or were damaged; forget the entry
+                self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+            self._db.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+        return result_dict, (pdf_path if row[0] and os.path.exists(pdf_path) else None)
+
+    def pdf_checksum(self, file_hash, model_id, api_version):
+        """
+        Returns the SHA-256 the entry's PDF was stored with, or None if it was not recorded.
+        """
+        key = self.make_key(file_hash, model_id, api_version)
+        with self._lock:
+            row = self._db.execute("SELECT pdf_sha256 FROM entries WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def forget(self, file_hash, model_id, api_version):
+        """
+        Drops an entry, e.g. one whose PDF no longer matches its checksum.
+        """
+        key = self.make_key(file_hash, model_id, api_version)
+        with self._lock:
+            for path in self._paths(key):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._db.commit()
+
+    def put(self, file_hash, model_id, api_version, result_dict, pdf_source_path=None, pdf_sha256=None):
+        """
+        Stores a result dict and, if given, a copy of the searchable PDF at pdf_source_path
+        along with its SHA-256 (pdf_sha256, as computed by pdf_download).
+        """
+        key = self.make_key(file_hash, model_id, api_version)
+        json_path, pdf_path = self._paths(key)
+        os.makedirs(os.path.dirname(json_path), exist_ok=True)
+
+        tmp_path = f"{json_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(result_dict, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, json_path)
+        size = os.path.getsize(json_path)
+
+        has_pdf = pdf_source_path is not None and os.path.exists(pdf_source_path)
+        if has_pdf:
+            # Copied under a temporary name, so an interrupted copy is never served as the entry's PDF
+            tmp_path = f"{pdf_path}.{threading.get_ident()}.tmp"
+            shutil.copyfile(pdf_source_path, tmp_path)
+            os.replace(tmp_path, pdf_path)
+            size += os.path.getsize(pdf_path)
+
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, size, last_used, has_pdf, pdf_sha256) VALUES (?, ?, ?, ?, ?)",
+                (key, size, time.time(), int(has_pdf), pdf_sha256 if has_pdf else None),
+            )
+            self._db.commit()
+            self._evict()
+
+    def total_bytes(self):
+        with self._lock:
+            return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._db.execute("SELECT key, size FROM entries ORDER BY last_used").fetchall():
+            for path in self._paths(key):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+        self._db.commit()
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache():
+    """
+    Returns the process-wide cache, creating it on first use.
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = OcrCache()
+        return _default_cache
@@ -0,0 +1,229 @@
+"""
+The per-file steps of a prebuilt-read run, shared by OCR_main.process_pdf,
+nasa_ocr_read.process_single_pdf and the stages of ocr_pipeline:
+
+    analyze_file   hash, cache lookup, text-layer check per page, then the analysis: page ranges,
+                   an AnalyzePollingEngine future, or one analyze call
+    start_pdf      searchable PDF into the output folder: the cached copy (checked against
+                   its checksum), the file itself, or a download left running
+    cache_result   OCR cache entry for a file the service analyzed
+
+Each step records what it did on the file's OcrFile, which the next one reads.
+submit_uncached is the submitting half of analyze_file for runs that submit every file
+to the polling engine before the workers finish them, and run_submitted runs them so.
+"""
+import os
+import time
+from concurrent.futures import Future
+
+from azure.ai.documentintelligence.models import AnalyzeOutputOption
+
+from concurrent_ocr import DEFAULT_MAX_IN_FLIGHT, map_ahead, run_in_order
+from instrumentation import timed
+from ocr_cache import client_api_version, hash_file
+from page_ranges import analyze_in_ranges, plan_page_ranges
+from pdf_download import ChecksumMismatch, copy_file_atomically, start_pdf_download
+from result_format import result_path
+from scan_index import indexed_hash
+from upload_io import open_upload
+
+MODEL_ID = "prebuilt-read"
+
+
+class OcrFile:
+    """
+    One file's output paths and its state on the way through the steps.
+    """
+
+    def __init__(self, file_path, output_folder_path, result_format):
+        self.file_path = file_path
+        base_path = os.path.join(output_folder_path, os.path.splitext(os.path.basename(file_path))[0])
+        self.pdf_output_file = base_path + ".pdf"
+        self.result_file = result_path(base_path, result_format)
+        self.txt_output_file = base_path + "_filtered.txt"
+        self.file_hash = None
+        self.cached = False
+        self.cached_pdf = None
+        # Read from its own text layer (see text_layer)
+        self.local = False
+        self.result_json = None
+        self.result_id = None
+        self.pdf_checksum = None
+        # The PDF was left as one file per page range, which the cache cannot hold
+        self.pdf_in_parts = False
+
+
+def analyze_file(job, client, cache, api_version=None, analysis=None, engine=None, pages_per_range=None,
+                 text_layer=None):
+    """
+    Fills in job.result_json, from the first of: the OCR cache, the file's text layer (with
+    text_layer, a text_layer.TextLayerReport; a file with text on only some pages has the
+    others analyzed as page ranges), analysis (an AnalyzePollingEngine future already
+    running for the file), page ranges (PDFs longer than pages_per_range, whose searchable PDF
+    is written here), engine, or one analyze call. Returns job.
+    """
+    api_version = api_version or client_api_version(client)
+    if not job.file_hash:
+        # Reused from the scan index while the file is unchanged; hash_file reports an unreadable file
+        job.file_hash = indexed_hash(job.file_path) or hash_file(job.file_path)
+    with timed("cache_lookup", job.file_path):
+        cached = cache.get(job.file_hash, MODEL_ID, api_version)
+    if cached:
+        job.cached = True
+        job.result_json, job.cached_pdf = cached
+        return job
+
+    if analysis is not None:
+        job.result_json, job.result_id = analysis.result()
+        # A finished future without a result id was read from the text layer by submit_uncached
+        job.local = job.result_id is None
+        return job
+    local_results = {}
+    page_ranges = None
+    if text_layer is not None:
+        parts = text_layer.read(job.file_path)
+        if parts and len(parts) == 1:
+            job.result_json = parts[0][2]
+            job.local = True
+            return job
+        if parts:
+            # Only the pages without a text layer go to the service, as ranges between the local ones
+            page_ranges = []
+            for first_page, last_page, result in parts:
+                if result is not None:
+                    local_results[(first_page, last_page)] = result
+                    page_ranges.append((first_page, last_page))
+                else:
+                    step = pages_per_range or last_page - first_page + 1
+                    page_ranges.extend((first, min(first + step - 1, last_page))
+                                       for first in range(first_page, last_page + 1, step))
+
+    if page_ranges is None and pages_per_range:
+        page_ranges = plan_page_ranges(job.file_path, pages_per_range)
+    analyze_started = time.perf_counter()
+    with timed("analyze", job.file_path, os.path.getsize(job.file_path)):
+        if page_ranges:
+            # The range PDFs are downloaded (and joined) as part of the analysis
+            job.result_json, pdf_files = analyze_in_ranges(client, job.file_path, page_ranges, job.pdf_output_file,
+                                                           local_results=local_results)
+            job.pdf_in_parts = pdf_files != [job.pdf_output_file]
+        elif engine is not None:
+            job.result_json, job.result_id = engine.submit(job.file_path).result()
+        else:
+            # Streamed from a memory map a block at a time, so large scans are never read into memory
+            with open_upload(job.file_path) as f:
+                # The document goes positionally: the SDK renamed the argument from analyze_request to body
+                poller = client.begin_analyze_document(
+                    MODEL_ID, f, output=[AnalyzeOutputOption.PDF], content_type="application/octet-stream"
+                )
+                job.result_json = poller.result().as_dict()
+            job.result_id = poller.details["operation_id"]
+    if text_layer is not None:
+        pages_analyzed = len(job.result_json.get("pages", [])) - sum(
+            last_page - first_page + 1 for first_page, last_page in local_results)
+        text_layer.analyzed(pages_analyzed, time.perf_counter() - analyze_started)
+    return job
+
+
+def start_pdf(job, client, cache, api_version=None):
+    """
+    Puts job's searchable PDF into the output folder. Copies are made at once; a download is
+    left running on the shared download pool and its future returned, else None.
+    A cached PDF that fails its checksum raises ChecksumMismatch and drops its cache entry.
+    """
+    if job.cached_pdf:
+        api_version = api_version or client_api_version(client)
+        try:
+            copy_file_atomically(job.cached_pdf, job.pdf_output_file,
+                                 cache.pdf_checksum(job.file_hash, MODEL_ID, api_version))
+        except ChecksumMismatch:
+            # A damaged cached PDF is dropped, so the next run analyzes the file again
+            cache.forget(job.file_hash, MODEL_ID, api_version)
+            raise
+    elif job.local:
+        # The file is its own searchable PDF
+        copy_file_atomically(job.file_path, job.pdf_output_file)
+    elif job.result_id:
+        return start_pdf_download(client, job.result_json["modelId"], job.result_id, job.pdf_output_file,
+                                  job.file_path)
+    return None
+
+
+def cache_result(job, cache, api_version):
+    """
+    Stores the result and searchable PDF of a file the service analyzed in the OCR cache.
+    Call once the PDF is in place (with its checksum in job.pdf_checksum, if downloaded).
+    """
+    # Text-layer results are cheaper to read again than to cache
+    if not job.cached and not job.local and not job.pdf_in_parts:
+        cache.put(job.file_hash, MODEL_ID, api_version, job.result_json, job.pdf_output_file,
+                  pdf_sha256=job.pdf_checksum)
+
+
+def submit_uncached(file_path, client, cache, engine, pages_per_range=None, text_layer=None):
+    """
+    Hashes a PDF and, unless the OCR cache already has it, submits it to the polling engine.
+    Returns (file_hash, analysis future or None) for analyze_file; errors are left for it to report,
+    and so are PDFs long enough to be split by pages_per_range or with only some pages searchable.
+    A PDF read wholly from its text layer gets a finished future of (result, None).
+    """
+    file_hash = indexed_hash(file_path)
+    if file_hash is None:
+        return None, None
+    with timed("cache_lookup", file_path):
+        cached = cache.get(file_hash, MODEL_ID, client_api_version(client))
+    if cached:
+        return file_hash, None
+    parts = text_layer.read(file_path) if text_layer is not None else None
+    if parts and len(parts) == 1:
+        analysis = Future()
+        analysis.set_result((parts[0][2], None))
+        return file_hash, analysis
+    if parts:
+        # Partly searchable: analyze_file sends the pages without text as page ranges
+        return file_hash, None
+    if pages_per_range and plan_page_ranges(file_path, pages_per_range):
+        return file_hash, None
+    analysis = engine.submit(file_path)
+    return file_hash, text_layer.track(analysis) if text_layer is not None else analysis
+
+
+def _analyzed_by_service(analysis):
+    # An engine future that succeeded, rather than one read from the text layer, cancelled or failed
+    return (analysis is not None and analysis.done() and not analysis.cancelled()
+            and analysis.exception() is None and analysis.result()[1] is not None)
+
+
+def run_submitted(engine, file_paths, submit, finish, ahead, max_in_flight=DEFAULT_MAX_IN_FLIGHT, progress=None):
+    """
+    Submits file_paths to the polling engine up to `ahead` files before the workers, with
+    submit(file_path) returning submit_uncached's (file_hash, analysis), and returns
+    finish(file_path, file_hash, analysis) of every file in input order (see concurrent_ocr.run_in_order).
+
+    If the run stops (progress raises, or an error), no further file is submitted, but the analyses
+    already open on the service are paid for: they are waited out and their files finished, which
+    writes and caches them, before the error is raised.
+    """
+    # Submitted files not finished yet, by path
+    open_files = {}
+
+    def submit_file(file_path):
+        open_files[file_path] = submit(file_path)
+        return (file_path, *open_files[file_path])
+
+    def finish_file(item):
+        try:
+            return finish(*item)
+        finally:
+            open_files.pop(item[0], None)
+
+    submitted = map_ahead(submit_file, file_paths, ahead, max_in_flight)
+    try:
+        return run_in_order(finish_file, submitted, max_in_flight, progress=progress)
+    except BaseException:
+        submitted.close()
+        engine.drain()
+        analyzed = [(file_path, *started) for file_path, started in list(open_files.items())
+                    if _analyzed_by_service(started[1])]
+        run_in_order(finish_file, analyzed, max_in_flight)
+        raise
@@ -0,0 +1,220 @@
+"""
+Incremental extraction of pages[].lines[].content from AnalyzeResult JSON files.
+
+An AnalyzeResult also carries words, polygons, spans, paragraphs and styles, and for
+large survey sets the file runs to hundreds of MB. The readers here keep only one
+page's lines (plus one JSON element) in memory at a time, regardless of document size.
+"""
+import json
+
+from result_format import load_result
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+READ_CHUNK_SIZE = 1024 * 1024
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+_NUMBER_CHARS = "0123456789.eE+-"
+
+
+class _JsonStream:
+    """
+    Minimal pull parser over a text stream. Containers on the path to the data we
+    want are walked member by member; everything else is decoded one element at a
+    time with the C decoder (or, for strings, skipped without being built).
+    """
+
+    def __init__(self, handle, chunk_size=READ_CHUNK_SIZE):
+        self.handle = handle
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, at_least=0):
+        if self.eof:
+            return False
+        chunk = self.handle.read(max(self.chunk_size, at_least))
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected '{char}' but found '{found or 'end of file'}'")
+        self.pos += 1
+
+    def read_value(self):
+        """
+        Decodes the next JSON value, reading more input until it is complete.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill(at_least=len(self.buf) - self.pos):
+                    raise
+                continue
+            # A number cut off at the end of the buffer may continue in the next chunk
+            truncated = end == len(self.buf) or self.buf[end] in _NUMBER_CHARS
+            if truncated and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def skip_string(self):
+        self.expect('"')
+        while True:
+            index = self.pos
+            while True:
+                quote = self.buf.find('"', index)
+                if quote < 0:
+                    break
+                backslashes = 0
+                while quote - 1 - backslashes >= self.pos and self.buf[quote - 1 - backslashes] == "\\":
+                    backslashes += 1
+                if backslashes % 2 == 0:
+                    self.pos = quote + 1
+                    return
+                index = quote + 1
+            # Keep a trailing run of backslashes so escapes split across chunks are seen
+            keep = len(self.buf)
+            while keep > self.pos and self.buf[keep - 1] == "\\":
+                keep -= 1
+            self.pos = keep
+            if not self._fill():
+                raise ValueError("Unterminated string")
+
+    def skip_value(self):
+        char = self.peek()
+        if char == '"':
+            self.skip_string()
+        elif char == "[":
+            for _ in self.iter_array():
+                self.skip_element()
+        else:
+            self.read_value()
+
+    def skip_element(self):
+        if self.peek() == '"':
+            self.skip_string()
+        else:
+            self.read_value()
+
+    def iter_array(self):
+        """
+        Walks an array; the caller must consume each element before advancing.
+        """
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield
+            char = self.peek()
+            self.pos += 1
+            if char == "]":
+                return
+            if char != ",":
+                raise ValueError(f"Expected ',' or ']' but found '{char or 'end of file'}'")
+
+    def iter_object(self):
+        """
+        Walks an object yielding its keys; the caller must consume each value.
+        """
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.read_value()
+            self.expect(":")
+            yield key
+            char = self.peek()
+            self.pos += 1
+            if char == "}":
+                return
+            if char != ",":
+                raise ValueError(f"Expected ',' or '}}' but found '{char or 'end of file'}'")
+
+
+def _iter_page_lines_builtin(handle):
+    stream = _JsonStream(handle)
+    for key in stream.iter_object():
+        if key != "pages":
+            stream.skip_value()
+            continue
+        for _ in stream.iter_array():
+            contents = []
+            for page_key in stream.iter_object():
+                if page_key == "lines":
+                    for _ in stream.iter_array():
+                        line = stream.read_value()
+                        contents.append(line.get("content", ""))
+                else:
+                    stream.skip_value()
+            yield contents
+
+
+def _iter_page_lines_ijson(handle):
+    contents = []
+    line_content = ""
+    for prefix, event, value in ijson.parse(handle):
+        if prefix == "pages.item.lines.item.content":
+            line_content = value
+        elif prefix == "pages.item.lines.item":
+            # A line without content counts as "", as in the other readers, so the line counts match
+            if event == "start_map":
+                line_content = ""
+            elif event == "end_map":
+                contents.append(line_content)
+        elif prefix == "pages.item" and event == "end_map":
+            yield contents
+            contents = []
+
+
+def iter_page_lines(json_file_path, use_ijson=None):
+    """
+    Yields, page by page, the list of line contents of an AnalyzeResult JSON file.
+    Uses ijson when it is installed, otherwise the built-in incremental parser.
+    Compact result files (see result_format) are small enough to be decoded whole.
+    """
+    if not json_file_path.lower().endswith(".json"):
+        data = load_result(json_file_path)
+        for page in data.get("pages", []):
+            yield [line.get("content", "") for line in page.get("lines", [])]
+        return
+    if use_ijson is None:
+        use_ijson = ijson is not None
+    if use_ijson:
+        with open(json_file_path, "rb") as handle:
+            yield from _iter_page_lines_ijson(handle)
+    else:
+        with open(json_file_path, "r", encoding="utf-8") as handle:
+            yield from _iter_page_lines_builtin(handle)
+
+
+def iter_line_contents(json_file_path, use_ijson=None):
+    """
+    Yields every pages[].lines[].content of an AnalyzeResult JSON file in order.
+    """
+    for contents in iter_page_lines(json_file_path, use_ijson):
+        yield from contents
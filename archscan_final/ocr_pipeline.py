@@ -0,0 +1,156 @@
+"""
+OCR of a folder as a pipeline of stages (see pipeline), so the network waits of some
+files overlap the encoding and filtering of others:
+
+    analyze    io       hash, cache lookup, text-layer check and the analysis itself
+    download   io       searchable PDF into the output folder (or the cached copy)
+    serialize  process  result file in the chosen format
+    filter     process  _filtered.txt, streamed back from the result file
+    export     writer   OCR cache entry and summary line, one file at a time
+
+The stages run the per-file steps of ocr_file that process_pdf runs, so the outputs are
+the same files process_pdf writes. Only the result dict crosses to the process pool (for
+serialize); filter reads the result file serialize wrote, so the dict is not pickled twice.
+"""
+import os
+
+from concurrent_ocr import DEFAULT_MAX_IN_FLIGHT
+from instrumentation import timed
+from ocr_cache import client_api_version, get_default_cache
+from ocr_file import OcrFile, analyze_file, cache_result, start_pdf
+from ocr_json_stream import iter_line_contents
+from pipeline import IO, PROCESS, WRITER, Pipeline, Stage
+from polling_engine import AnalyzePollingEngine
+from result_format import DEFAULT_RESULT_FORMAT, write_result
+from stop_words import StopWordFilter
+
+STAGES = ("analyze", "download", "serialize", "filter", "export")
+
+# Threads per I/O stage; the process stages default to the CPU count and export always has one
+DEFAULT_DOWNLOAD_WORKERS = 8
+
+# Per-process filter, built once by the pool initializer
+_worker_filter = None
+
+
+def _init_worker(stop_words):
+    global _worker_filter
+    _worker_filter = StopWordFilter(stop_words)
+
+
+def _filter_result_file(result_file, text_file_path):
+    # Runs in a pool process; same lines as process_pdf writes from the result dict
+    with open(text_file_path, "w", encoding="utf-8") as text_file:
+        text_file.writelines(line + "\n" for line in _worker_filter.filter_lines(iter_line_contents(result_file)))
+
+
+def _iter_jobs(pdf_files, output_folder_path, result_format):
+    try:
+        for file_path in pdf_files:
+            yield OcrFile(file_path, output_folder_path, result_format)
+    finally:
+        # Closing the jobs stops the walk behind them too
+        if hasattr(pdf_files, "close"):
+            pdf_files.close()
+
+
+def stage_workers_for(stage_workers=None, max_in_flight=DEFAULT_MAX_IN_FLIGHT, max_operations=None):
+    """
+    Workers per stage: the defaults, overridden by the entries of stage_workers ({"download": 16, ...}).
+    """
+    process_workers = os.cpu_count() or 1
+    workers = {
+        # With the polling engine, each analyze worker only waits on an operation the engine polls
+        "analyze": max_operations or max_in_flight,
+        "download": DEFAULT_DOWNLOAD_WORKERS,
+        "serialize": process_workers,
+        "filter": process_workers,
+        "export": 1,
+    }
+    for name, count in (stage_workers or {}).items():
+        if name not in workers:
+            raise ValueError(f"Unknown stage '{name}', expected one of {', '.join(STAGES)}")
+        workers[name] = count
+    return workers
+
+
+def parse_stage_workers(text):
+    """
+    Parses "analyze=16,download=8" into {"analyze": 16, "download": 8}.
+    """
+    workers = {}
+    for entry in filter(None, (part.strip() for part in text.split(","))):
+        name, _, count = entry.partition("=")
+        if name.strip() not in STAGES or not count.strip().isdigit():
+            raise ValueError(f"Bad stage workers '{entry}', expected NAME=COUNT with NAME one of {', '.join(STAGES)}")
+        workers[name.strip()] = int(count)
+    return workers
+
+
+def run_ocr_pipeline(pdf_files, output_folder_path, client, stop_words, cache=None,
+                     result_format=DEFAULT_RESULT_FORMAT, max_in_flight=DEFAULT_MAX_IN_FLIGHT, stage_workers=None,
+                     queue_size=None, max_operations=None, pages_per_range=None, progress=None, text_layer=None):
+    """
+    OCRs pdf_files (a list or a generator) through the stages and returns one summary line per
+    file, in input order. stage_workers overrides the workers of single stages (see
+    stage_workers_for) and queue_size the bound of every stage's queue. With max_operations
+    set, the analyses are run by an AnalyzePollingEngine; with pages_per_range set, long PDFs
+    are analyzed as concurrent page ranges (see page_ranges). progress is reported as in
+    concurrent_ocr.run_in_order. text_layer is an optional text_layer.TextLayerReport, which
+    reads the PDFs that already carry text in the analyze stage, as process_pdf does.
+    """
+    cache = cache or get_default_cache()
+    api_version = client_api_version(client)
+    workers = stage_workers_for(stage_workers, max_in_flight, max_operations)
+    engine = AnalyzePollingEngine(client, "prebuilt-read", max_operations) if max_operations else None
+
+    def analyze(job):
+        return analyze_file(job, client, cache, api_version, engine=engine, pages_per_range=pages_per_range,
+                            text_layer=text_layer)
+
+    def download(job):
+        pdf_download = start_pdf(job, client, cache, api_version)
+        if pdf_download is not None:
+            _, job.pdf_checksum = pdf_download.result()
+        return job
+
+    def serialize(job, processes):
+        with timed("result_write", job.file_path) as span:
+            span.bytes = processes.submit(write_result, job.result_json, job.result_file, result_format).result()
+        return job
+
+    def filter_text(job, processes):
+        with timed("stop_word_filter", job.file_path):
+            processes.submit(_filter_result_file, job.result_file, job.txt_output_file).result()
+        return job
+
+    def export(job):
+        cache_result(job, cache, api_version)
+        return f"Processed: {job.file_path}\n"
+
+    def failed(job, stage_name, error):
+        error_message = f"Failed to process {job.file_path}: {str(error)}"
+        print(error_message)
+        return error_message + "\n"
+
+    pipeline = Pipeline(
+        [
+            Stage("analyze", analyze, IO, workers["analyze"], queue_size),
+            Stage("download", download, IO, workers["download"], queue_size),
+            Stage("serialize", serialize, PROCESS, workers["serialize"], queue_size),
+            Stage("filter", filter_text, PROCESS, workers["filter"], queue_size),
+            Stage("export", export, WRITER, queue_size=queue_size),
+        ],
+        process_workers=max(workers["serialize"], workers["filter"]),
+        process_initializer=_init_worker,
+        process_initargs=(stop_words,),
+    )
+    if hasattr(pdf_files, "__len__"):
+        jobs = [OcrFile(file_path, output_folder_path, result_format) for file_path in pdf_files]
+    else:
+        jobs = _iter_jobs(pdf_files, output_folder_path, result_format)
+    try:
+        return pipeline.run(jobs, failed, progress)
+    finally:
+        if engine is not None:
+            engine.close()
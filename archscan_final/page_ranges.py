@@ -0,0 +1,236 @@
+"""
+Page-range splitting for very long PDFs.
+
+A 600-page plan set analyzed as one operation is worked through by the service one
+page after another, and that one file becomes the tail of the whole batch. Split mode
+analyzes the set as several page ranges at once and merges the AnalyzeResults back
+into the result a single-shot analysis would have given: pages, lines, words and
+paragraphs in page order, one content string, and every span offset, page number and
+element pointer moved to where it falls in the whole document.
+
+Ranges are cut locally when the optional 'pypdf' package is installed, so each upload
+carries only its own pages, and the searchable PDFs of the ranges are joined back into
+one. Without it, every range uploads the whole file and selects its pages with the
+service's `pages` parameter; the searchable PDF of each range is then kept as its own
+part file (name_pages_0001-0050.pdf), as there is nothing to join them with.
+"""
+import copy
+import mmap
+import os
+import re
+import tempfile
+import unicodedata
+
+from azure.ai.documentintelligence.models import AnalyzeOutputOption
+
+from concurrent_ocr import run_in_order
+from pdf_download import download_result_pdf
+from upload_io import open_upload
+
+try:
+    import pypdf
+except ImportError:
+    pypdf = None
+
+# Pages analyzed per operation in split mode
+DEFAULT_PAGES_PER_RANGE = 50
+
+# Ranges of one file analyzed at once
+DEFAULT_RANGES_IN_FLIGHT = 4
+
+# Without pypdf, pages are counted from the PDF's own page tree: the root /Pages node's
+# /Count, or failing that the /Type /Page objects. Neither is visible in PDFs whose
+# objects are all compressed into object streams; those are analyzed single-shot.
+_PAGE_TREE_COUNT = re.compile(rb"/Type\s*/Pages\b[^>]*?/Count\s+(\d+)|/Count\s+(\d+)[^>]*?/Type\s*/Pages\b")
+_PAGE_OBJECT = re.compile(rb"/Type\s*/Page\b(?!s)")
+
+# Top-level lists that other elements point into with JSON pointers ("/paragraphs/3")
+_POINTER_TARGETS = ("paragraphs", "tables", "figures", "sections", "keyValuePairs", "lists")
+
+
+def count_pdf_pages(file_path):
+    """
+    Returns the number of pages of a PDF, or None if it cannot be told.
+    """
+    if pypdf is not None:
+        try:
+            return len(pypdf.PdfReader(file_path).pages)
+        except Exception:
+            return None
+    try:
+        with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            counts = [int(a or b) for a, b in _PAGE_TREE_COUNT.findall(data)]
+            return max(counts) if counts else (len(_PAGE_OBJECT.findall(data)) or None)
+    except (OSError, ValueError):
+        return None
+
+
+def plan_page_ranges(file_path, pages_per_range=DEFAULT_PAGES_PER_RANGE):
+    """
+    Returns [(first_page, last_page), ...] covering the PDF, or None when it is not worth
+    splitting (no more than pages_per_range pages, or a page count that cannot be read).
+    """
+    page_count = count_pdf_pages(file_path)
+    if not page_count or page_count <= pages_per_range:
+        return None
+    return [(first, min(first + pages_per_range - 1, page_count))
+            for first in range(1, page_count + 1, pages_per_range)]
+
+
+def text_length(text, string_index_type=None):
+    """
+    Length of text in the units the result's offsets count in. textElements (the default)
+    counts user-perceived characters; that is approximated as code points other than
+    combining marks, which covers the accented Latin text drawings carry.
+    """
+    if string_index_type == "utf16CodeUnit":
+        return len(text.encode("utf-16-le")) // 2
+    if string_index_type == "unicodeCodePoint":
+        return len(text)
+    return sum(1 for char in text if not unicodedata.combining(char))
+
+
+def _shift_pointer(pointer, index_shift):
+    parts = pointer.split("/")
+    if len(parts) == 3 and parts[1] in index_shift and parts[2].isdigit():
+        return f"/{parts[1]}/{int(parts[2]) + index_shift[parts[1]]}"
+    return pointer
+
+
+def _shift(node, offset_shift, page_shift, index_shift):
+    if isinstance(node, list):
+        for item in node:
+            _shift(item, offset_shift, page_shift, index_shift)
+        return
+    if not isinstance(node, dict):
+        return
+    for key, value in node.items():
+        if key == "span" and isinstance(value, dict):
+            value["offset"] = value.get("offset", 0) + offset_shift
+        elif key == "spans" and isinstance(value, list):
+            for span in value:
+                span["offset"] = span.get("offset", 0) + offset_shift
+        elif key == "pageNumber" and isinstance(value, int):
+            node[key] = value + page_shift
+        elif key == "elements" and isinstance(value, list):
+            node[key] = [_shift_pointer(pointer, index_shift) for pointer in value]
+        else:
+            _shift(value, offset_shift, page_shift, index_shift)
+
+
+def merge_analyze_results(parts):
+    """
+    Merges the AnalyzeResult dicts of consecutive page ranges, given as [(first_page, result), ...]
+    in page order, into the result of one analysis of the whole document.
+    The parts are not modified.
+    """
+    merged = None
+    for first_page, part in parts:
+        part = copy.deepcopy(part)
+        if merged is None:
+            merged = part
+            merged.setdefault("content", "")
+            continue
+
+        pages = part.get("pages") or []
+        # Locally split ranges number their pages from 1; service-side ranges keep the real numbers
+        page_shift = first_page - pages[0]["pageNumber"] if pages else 0
+        separator = "\n" if merged["content"] and part.get("content") else ""
+        offset_shift = text_length(merged["content"] + separator, merged.get("stringIndexType"))
+        index_shift = {name: len(merged.get(name) or []) for name in _POINTER_TARGETS}
+        _shift({key: value for key, value in part.items() if isinstance(value, list)},
+               offset_shift, page_shift, index_shift)
+
+        merged["content"] += separator + (part.get("content") or "")
+        for key, value in part.items():
+            if isinstance(value, list):
+                merged[key] = (merged.get(key) or []) + value
+    return merged
+
+
+def _write_page_range(file_path, first_page, last_page, output_path):
+    reader = pypdf.PdfReader(file_path)
+    writer = pypdf.PdfWriter()
+    for index in range(first_page - 1, last_page):
+        writer.add_page(reader.pages[index])
+    with open(output_path, "wb") as f:
+        writer.write(f)
+
+
+def join_pdfs(pdf_paths, output_path):
+    """
+    Concatenates the pages of pdf_paths into output_path (needs pypdf).
+    """
+    writer = pypdf.PdfWriter()
+    for pdf_path in pdf_paths:
+        writer.append(pdf_path)
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        writer.write(f)
+    os.replace(tmp_path, output_path)
+
+
+def part_pdf_path(pdf_output_file, first_page, last_page):
+    base, extension = os.path.splitext(pdf_output_file)
+    return f"{base}_pages_{first_page:04d}-{last_page:04d}{extension}"
+
+
+def analyze_in_ranges(client, file_path, ranges, pdf_output_file, model_id="prebuilt-read",
+                      max_in_flight=DEFAULT_RANGES_IN_FLIGHT, local_results=None):
+    """
+    Analyzes the page ranges of one PDF concurrently and returns (merged result dict,
+    searchable PDF paths written). That is [pdf_output_file] when the range PDFs could be
+    joined (pypdf installed), otherwise one part file per range.
+    local_results maps ranges already read (see text_layer) to their result dicts, pages
+    numbered from 1; those are not analyzed, and the file's own pages go into the joined
+    PDF. It needs pypdf.
+    """
+    local_results = local_results or {}
+    if local_results and pypdf is None:
+        raise RuntimeError("Joining local page ranges needs the 'pypdf' package (pip install pypdf)")
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(pdf_output_file))) as work_folder:
+
+        def analyze_range(page_range):
+            first_page, last_page = page_range
+            if page_range in local_results:
+                # Already searchable: its own pages stand in for the service's PDF
+                range_pdf = os.path.join(work_folder, f"searchable_{first_page:04d}.pdf")
+                _write_page_range(file_path, first_page, last_page, range_pdf)
+                return local_results[page_range], range_pdf
+            pages = None
+            upload_path = file_path
+            if pypdf is not None:
+                upload_path = os.path.join(work_folder, f"range_{first_page:04d}.pdf")
+                _write_page_range(file_path, first_page, last_page, upload_path)
+            else:
+                pages = f"{first_page}-{last_page}"
+            with open_upload(upload_path) as f:
+                poller = client.begin_analyze_document(
+                    model_id,
+                    f,
+                    pages=pages,
+                    output=[AnalyzeOutputOption.PDF],
+                    content_type="application/octet-stream",
+                )
+                result = poller.result()
+
+            if pypdf is not None:
+                range_pdf = os.path.join(work_folder, f"searchable_{first_page:04d}.pdf")
+            else:
+                range_pdf = part_pdf_path(pdf_output_file, first_page, last_page)
+            download_result_pdf(client, result.model_id, poller.details["operation_id"], range_pdf)
+            return result.as_dict(), range_pdf
+
+        analyzed = run_in_order(analyze_range, ranges, max_in_flight)
+        merged = merge_analyze_results([(first_page, result) for (first_page, _), (result, _) in zip(ranges, analyzed)])
+        service_results = [result for page_range, (result, _) in zip(ranges, analyzed) if page_range not in local_results]
+        if service_results:
+            # The merged result is the service's, even where a local range came first
+            merged["apiVersion"] = service_results[0].get("apiVersion")
+            merged["modelId"] = service_results[0].get("modelId")
+
+        range_pdfs = [range_pdf for _, range_pdf in analyzed]
+        if pypdf is None:
+            return merged, range_pdfs
+        join_pdfs(range_pdfs, pdf_output_file)
+        return merged, [pdf_output_file]
@@ -0,0 +1,169 @@
+"""
+Writing the searchable PDF of an analysis to the output folder.
+
+get_analyze_result_pdf yields the body in the transport's read blocks (4 KiB unless the
+client says otherwise; the shared clients read 1 MiB, see client_pool). The blocks are
+gathered per WRITE_BATCH_BYTES and written with writev(), at most IOV_MAX blocks per
+call, so the disk sees large sequential writes without the blocks being copied into one
+buffer first. The bytes go
+to a temporary file next to the target, renamed into place once complete: a failed or
+interrupted download never leaves a truncated PDF under the final name. The SHA-256 of
+the PDF is computed on the way; the OCR cache keeps it to check its copy of the PDF
+when it is served again (see copy_file_atomically).
+
+start_pdf_download runs the download on a shared pool, so a worker can write the JSON
+result and filtered text of the same file while its PDF is still arriving.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import timed
+
+# Bytes gathered per write
+WRITE_BATCH_BYTES = 8 * 1024 * 1024
+
+# Buffer used to copy cached PDFs
+COPY_BUFFER_BYTES = 8 * 1024 * 1024
+
+# Downloads running at once on the shared pool
+DOWNLOAD_THREADS = int(os.environ.get("ARCHSCAN_DOWNLOAD_THREADS", "16"))
+
+# Buffers one writev() call accepts; more fail with EINVAL (1024 on Linux and macOS)
+try:
+    IOV_MAX = os.sysconf("SC_IOV_MAX")
+except (AttributeError, ValueError, OSError):
+    IOV_MAX = -1
+if IOV_MAX <= 0:
+    IOV_MAX = 1024
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# mkstemp creates files readable by the owner only; finished files get the usual umask permissions
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+class ChecksumMismatch(ValueError):
+    """
+    Raised when a copied file does not have the SHA-256 it was stored with.
+    """
+
+
+def _write_all(fd, chunks):
+    # writev takes at most IOV_MAX buffers per call and may write less than asked; it is called
+    # again from the first byte not written
+    views = [memoryview(chunk) for chunk in chunks if len(chunk)]
+    first = 0
+    while first < len(views):
+        if hasattr(os, "writev"):
+            written = os.writev(fd, views[first:first + IOV_MAX])
+        else:
+            written = os.write(fd, views[first])
+        while first < len(views) and written >= len(views[first]):
+            written -= len(views[first])
+            first += 1
+        if written:
+            views[first] = views[first][written:]
+
+
+def _atomic_write(output_path, write):
+    # write(fd) fills the temporary file; it is renamed over output_path only if write returns
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(output_path)}.", suffix=".part",
+                                    dir=os.path.dirname(os.path.abspath(output_path)))
+    try:
+        try:
+            result = write(fd)
+        finally:
+            os.close(fd)
+        os.chmod(tmp_path, 0o666 & ~_UMASK)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return result
+
+
+def write_chunks_atomically(chunks, output_path):
+    """
+    Writes an iterable of bytes blocks to output_path through a temporary file.
+    Returns (size, SHA-256 hex digest).
+    """
+    digest = hashlib.sha256()
+
+    def write(fd):
+        size = 0
+        batch, batch_bytes = [], 0
+        for chunk in chunks:
+            if not chunk:
+                continue
+            digest.update(chunk)
+            size += len(chunk)
+            batch.append(chunk)
+            batch_bytes += len(chunk)
+            if batch_bytes >= WRITE_BATCH_BYTES:
+                _write_all(fd, batch)
+                batch, batch_bytes = [], 0
+        if batch:
+            _write_all(fd, batch)
+        return size
+
+    size = _atomic_write(output_path, write)
+    return size, digest.hexdigest()
+
+
+def download_result_pdf(client, model_id, result_id, output_path):
+    """
+    Downloads the searchable PDF of an analysis to output_path. Returns (size, SHA-256 hex digest).
+    """
+    response = client.get_analyze_result_pdf(model_id=model_id, result_id=result_id)
+    return write_chunks_atomically(response, output_path)
+
+
+def _timed_download(client, model_id, result_id, output_path, file_path):
+    with timed("pdf_download", file_path) as span:
+        size, checksum = download_result_pdf(client, model_id, result_id, output_path)
+        span.bytes = size
+    return size, checksum
+
+
+def start_pdf_download(client, model_id, result_id, output_path, file_path=None):
+    """
+    Starts download_result_pdf on the shared download pool and returns its future.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=DOWNLOAD_THREADS, thread_name_prefix="pdf_download")
+    return _pool.submit(_timed_download, client, model_id, result_id, output_path, file_path)
+
+
+def copy_file_atomically(source_path, output_path, expected_sha256=None):
+    """
+    Copies a file through a temporary file and one reused buffer. With expected_sha256 given,
+    the copy is only renamed into place if the bytes read have that digest; otherwise
+    ChecksumMismatch is raised. Returns the SHA-256 hex digest.
+    """
+    digest = hashlib.sha256()
+    buffer = bytearray(COPY_BUFFER_BYTES)
+    view = memoryview(buffer)
+
+    def write(fd):
+        with open(source_path, "rb", buffering=0) as source:
+            while True:
+                count = source.readinto(buffer)
+                if not count:
+                    break
+                digest.update(view[:count])
+                _write_all(fd, [view[:count]])
+        if expected_sha256 and digest.hexdigest() != expected_sha256:
+            raise ChecksumMismatch(f"{source_path} does not match its stored checksum")
+
+    _atomic_write(output_path, write)
+    return digest.hexdigest()
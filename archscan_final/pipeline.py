@@ -0,0 +1,184 @@
+"""
+Staged execution of per-file work, so the stages of different files overlap.
+
+A run is split into Stages, each with its own workers and a bounded queue in front of
+it: while one file uploads, another's PDF downloads and a third's result is encoded.
+Network stages run on threads, CPU stages send their work to one shared process pool
+(so JSON encoding and filtering are not serialized by the GIL behind the network
+threads), and a writer stage runs on a single thread for state that must not be
+written concurrently.
+
+A full queue blocks the stage feeding it, back to the reader of the input items, so a
+slow disk or a throttled service holds the whole pipeline at its pace: the items held
+at once are bounded by the queue sizes and worker counts, never by the input size.
+"""
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+IO = "io"
+PROCESS = "process"
+WRITER = "writer"
+
+# Items allowed to wait in front of a stage, per worker of that stage
+DEFAULT_QUEUE_FACTOR = 2
+
+# Marks the end of a queue's items
+_DONE = object()
+
+
+class Stage:
+    """
+    One step of a Pipeline. func(item) returns the item handed to the next stage; the last
+    stage's return value is the item's result.
+
+    kind is IO (func runs on `workers` threads), PROCESS (func(item, processes) runs on
+    `workers` threads and sends its CPU work to the pipeline's ProcessPoolExecutor, so
+    `workers` bounds that stage's tasks in the pool) or WRITER (one thread). queue_size
+    bounds the items waiting for the stage, DEFAULT_QUEUE_FACTOR per worker by default.
+    """
+
+    def __init__(self, name, func, kind=IO, workers=1, queue_size=None):
+        if kind not in (IO, PROCESS, WRITER):
+            raise ValueError(f"Unknown stage kind '{kind}', expected one of {IO}, {PROCESS}, {WRITER}")
+        self.name = name
+        self.func = func
+        self.kind = kind
+        self.workers = 1 if kind == WRITER else max(1, workers)
+        self.queue_size = queue_size or DEFAULT_QUEUE_FACTOR * self.workers
+
+
+class Pipeline:
+    """
+    Runs items through a list of Stages. The process pool, if any stage needs one, has
+    process_workers processes (the CPU count by default), each set up with
+    process_initializer(*process_initargs).
+    """
+
+    def __init__(self, stages, process_workers=None, process_initializer=None, process_initargs=()):
+        self.stages = list(stages)
+        self.process_workers = process_workers or os.cpu_count() or 1
+        self.process_initializer = process_initializer
+        self.process_initargs = process_initargs
+
+    def run(self, items, on_error, progress=None):
+        """
+        Passes every item through the stages and returns the results in input order.
+
+        items may be a generator; it is read only as fast as the first queue drains. An item
+        whose stage raises skips the remaining stages, and on_error(item, stage name, exception)
+        gives its result. progress(done, total) is called on the calling thread as in
+        concurrent_ocr.run_in_order: once at the start, then as each item leaves the last stage.
+        If progress raises, the items not started yet are dropped, the ones past the first stage
+        are finished, and the exception is raised once they are.
+        """
+        total = len(items) if hasattr(items, "__len__") else None
+        queues = [queue.Queue(stage.queue_size) for stage in self.stages]
+        # The results queue is unbounded: the calling thread must never hold up the last stage
+        queues.append(queue.Queue())
+        stop = threading.Event()
+        fed = [0]
+        feed_error = []
+        remaining = [stage.workers for stage in self.stages]
+        remaining_lock = threading.Lock()
+
+        processes = None
+        if any(stage.kind == PROCESS for stage in self.stages):
+            # Spawned rather than forked: the stage threads are running by the time a worker
+            # starts, and a fork can copy a lock one of them holds
+            processes = ProcessPoolExecutor(
+                max_workers=self.process_workers, mp_context=multiprocessing.get_context("spawn"),
+                initializer=self.process_initializer, initargs=self.process_initargs
+            )
+
+        def end_of(position):
+            # The last worker of a stage to finish tells every worker of the next stage
+            with remaining_lock:
+                remaining[position] -= 1
+                last = not remaining[position]
+            if last:
+                next_workers = self.stages[position + 1].workers if position + 1 < len(self.stages) else 1
+                for _ in range(next_workers):
+                    queues[position + 1].put(_DONE)
+
+        def feed():
+            source = iter(items)
+            try:
+                for item in source:
+                    if stop.is_set():
+                        break
+                    queues[0].put((fed[0], item, None))
+                    fed[0] += 1
+            except Exception as e:
+                feed_error.append(e)
+            finally:
+                # Stops the walk behind a generator that was not used up
+                if hasattr(source, "close"):
+                    source.close()
+                for _ in range(self.stages[0].workers):
+                    queues[0].put(_DONE)
+
+        def work(position, stage):
+            inbox, outbox = queues[position], queues[position + 1]
+            while True:
+                entry = inbox.get()
+                if entry is _DONE:
+                    break
+                index, item, error = entry
+                if position == 0 and stop.is_set():
+                    # Not started yet: a stopped run drops it, like the items never read
+                    continue
+                if error is None:
+                    try:
+                        item = stage.func(item, processes) if stage.kind == PROCESS else stage.func(item)
+                    except Exception as e:
+                        error = (stage.name, e)
+                outbox.put((index, item, error))
+            end_of(position)
+
+        threads = [threading.Thread(target=feed, name="pipeline-feed", daemon=True)]
+        for position, stage in enumerate(self.stages):
+            threads.extend(
+                threading.Thread(target=work, args=(position, stage), name=f"pipeline-{stage.name}-{number}",
+                                 daemon=True)
+                for number in range(stage.workers)
+            )
+
+        results = {}
+        interrupted = None
+        try:
+            for thread in threads:
+                thread.start()
+            if progress is not None:
+                try:
+                    progress(0, total if total is not None else fed[0])
+                except BaseException as e:
+                    stop.set()
+                    interrupted = e
+            while True:
+                entry = queues[-1].get()
+                if entry is _DONE:
+                    break
+                index, item, error = entry
+                results[index] = on_error(item, *error) if error else item
+                if progress is not None and interrupted is None:
+                    try:
+                        progress(len(results), total if total is not None else fed[0])
+                    except BaseException as e:
+                        stop.set()
+                        interrupted = e
+        finally:
+            stop.set()
+            for thread in threads:
+                if thread.ident is not None:
+                    thread.join()
+            if processes is not None:
+                processes.shutdown()
+
+        if interrupted is not None:
+            raise interrupted
+        if feed_error:
+            raise feed_error[0]
+        return [results[index] for index in range(len(results))]
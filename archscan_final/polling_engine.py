@@ -0,0 +1,239 @@
+"""
+Submit-then-poll engine for Document Intelligence analyze operations.
+
+begin_analyze_document(...).result() keeps one thread busy for the whole analysis,
+most of it asleep between polls, so the number of analyses queued on the service is
+capped by the thread count. The engine instead POSTs each file, keeps the
+Operation-Location it gets back, and polls every open operation from one asyncio
+event loop. The HTTP calls themselves are still made with the client's synchronous
+pipeline, on a small pool of threads that is only busy for the length of a request,
+so hundreds of operations can be open at once on a handful of threads.
+"""
+import asyncio
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from azure.core.exceptions import HttpResponseError
+from azure.core.rest import HttpRequest
+
+from instrumentation import timed
+from ocr_cache import client_api_version
+from rate_limiter import ThrottledError, is_retryable, retry_after_seconds
+from upload_io import DEFAULT_LARGE_IN_FLIGHT, LARGE_FILE_BYTES, file_size, open_upload
+
+# Analyze operations allowed to be open on the service at once
+DEFAULT_MAX_OPERATIONS = 200
+
+# Threads making the HTTP calls (uploads, polls); none of them wait out an analysis
+DEFAULT_HTTP_WORKERS = 8
+
+# The first poll waits INITIAL_POLL_INTERVAL seconds; every "still running" answer
+# stretches the wait by POLL_BACKOFF up to MAX_POLL_INTERVAL. A Retry-After header on
+# the poll response is honoured as a lower bound.
+INITIAL_POLL_INTERVAL = 1.0
+MAX_POLL_INTERVAL = 15.0
+POLL_BACKOFF = 1.5
+
+# Attempts for a throttled or transiently failing upload / poll request
+MAX_REQUEST_RETRIES = 6
+
+
+class AnalyzeOperationError(Exception):
+    """
+    Raised when the service reports an analyze operation as failed or canceled.
+    """
+
+
+class AnalyzePollingEngine:
+    """
+    Runs analyze operations for many files from one background event loop.
+
+    submit() returns a concurrent.futures.Future resolving to (result_dict, result_id),
+    where result_dict is the AnalyzeResult in its JSON form (as AnalyzeResult.as_dict()
+    gives it) and result_id is the operation id used by get_analyze_result_pdf.
+    Use as a context manager, or call close() when done.
+    """
+
+    def __init__(self, client, model_id="prebuilt-read", max_operations=DEFAULT_MAX_OPERATIONS,
+                 http_workers=DEFAULT_HTTP_WORKERS, output_pdf=True,
+                 initial_poll_interval=INITIAL_POLL_INTERVAL, max_poll_interval=MAX_POLL_INTERVAL,
+                 large_uploads=DEFAULT_LARGE_IN_FLIGHT, large_file_bytes=LARGE_FILE_BYTES):
+        self.client = client
+        self.model_id = model_id
+        self.max_operations = max(1, max_operations)
+        self.output_pdf = output_pdf
+        self.initial_poll_interval = initial_poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.large_uploads = max(1, min(large_uploads, http_workers - 1))
+        self.large_file_bytes = large_file_bytes
+        self.api_version = client_api_version(client)
+
+        self.open_operations = 0
+        self.peak_open_operations = 0
+        self.poll_count = 0
+
+        self._http = ThreadPoolExecutor(max_workers=max(1, http_workers), thread_name_prefix="analyze-http")
+        self._loop = asyncio.new_event_loop()
+        self._slots = None
+        self._large_slots = None
+        self._draining = False
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run_loop, name="analyze-poller", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._slots = asyncio.Semaphore(self.max_operations)
+        self._large_slots = asyncio.Semaphore(self.large_uploads)
+        self._loop.call_soon(self._ready.set)
+        self._loop.run_forever()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Stops the event loop. Operations still open are abandoned (their futures are cancelled).
+        """
+        if not self._loop.is_running():
+            return
+
+        async def cancel_all():
+            tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        asyncio.run_coroutine_threadsafe(cancel_all(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._http.shutdown(wait=True)
+
+    def drain(self):
+        """
+        Stops starting analyses and waits for the open ones. Files still waiting for an operation
+        slot are cancelled; files already uploaded (so billed) are polled to their results.
+        """
+        if not self._loop.is_running():
+            return
+
+        async def finish_open():
+            self._draining = True
+            tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        asyncio.run_coroutine_threadsafe(finish_open(), self._loop).result()
+
+    def submit(self, file_path):
+        """
+        Queues a file for analysis without blocking. Files beyond max_operations wait
+        (as a few bytes of bookkeeping, not a thread) until an operation finishes.
+        """
+        return asyncio.run_coroutine_threadsafe(self._analyze(file_path), self._loop)
+
+    async def _send(self, request):
+        """
+        Sends a request on the HTTP pool, retrying throttled or transient failures with
+        jittered exponential backoff (or the Retry-After the service asks for).
+        """
+        loop = asyncio.get_running_loop()
+        for attempt in range(MAX_REQUEST_RETRIES + 1):
+            if hasattr(request.content, "seek"):
+                # A streamed upload body is resent from the start
+                request.content.seek(0)
+            try:
+                response = await loop.run_in_executor(self._http, self.client.send_request, request)
+                response.raise_for_status()
+                return response
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                if attempt == MAX_REQUEST_RETRIES:
+                    raise ThrottledError(f"Still throttled after {attempt + 1} attempts: {e}") from e
+                delay = random.uniform(0, min(60.0, 2 ** attempt))
+                retry_after = retry_after_seconds(e)
+                if retry_after is not None:
+                    delay = max(delay, retry_after)
+                await asyncio.sleep(delay)
+
+    async def _analyze(self, file_path):
+        async with self._slots:
+            if self._draining:
+                raise asyncio.CancelledError
+            self.open_operations += 1
+            self.peak_open_operations = max(self.peak_open_operations, self.open_operations)
+            try:
+                with timed("upload", file_path) as span:
+                    operation_location, span.bytes = await self._begin(file_path)
+                # From the accepted upload to the result, polls included
+                with timed("service", file_path):
+                    return await self._poll(operation_location, file_path)
+            finally:
+                self.open_operations -= 1
+
+    async def _begin(self, file_path):
+        # Large uploads take one of the few large_uploads slots, so they cannot hold
+        # every HTTP worker while the small files' uploads and polls wait behind them
+        size = file_size(file_path)
+        if size >= self.large_file_bytes:
+            async with self._large_slots:
+                return await self._upload(file_path), size
+        return await self._upload(file_path), size
+
+    async def _upload(self, file_path):
+        loop = asyncio.get_running_loop()
+        # Streamed from a memory map by the transport; the file is never held in memory whole
+        body = await loop.run_in_executor(self._http, open_upload, file_path)
+        try:
+            params = {"api-version": self.api_version}
+            if self.output_pdf:
+                params["output"] = "pdf"
+            request = HttpRequest(
+                "POST",
+                f"/documentModels/{self.model_id}:analyze",
+                params=params,
+                headers={"Content-Type": "application/octet-stream", "Accept": "application/json"},
+                content=body,
+            )
+            response = await self._send(request)
+        finally:
+            body.close()
+        operation_location = response.headers.get("Operation-Location")
+        if not operation_location:
+            raise HttpResponseError(message="Analyze response has no Operation-Location header", response=response)
+        return operation_location
+
+    async def _poll(self, operation_location, file_path):
+        interval = self.initial_poll_interval
+        while True:
+            await asyncio.sleep(interval)
+            with timed("poll", file_path):
+                response = await self._send(
+                    HttpRequest("GET", operation_location, headers={"Accept": "application/json"})
+                )
+            self.poll_count += 1
+            body = response.json()
+            status = str(body.get("status", "")).lower()
+
+            if status == "succeeded":
+                result_id = operation_location.split("?", 1)[0].rstrip("/").rsplit("/", 1)[-1]
+                return body.get("analyzeResult", {}), result_id
+            if status in ("failed", "canceled"):
+                error = body.get("error") or {}
+                raise AnalyzeOperationError(
+                    f"Analyze operation {status}: {error.get('code', '')} {error.get('message', '')}".rstrip()
+                )
+
+            interval = min(self.max_poll_interval, interval * POLL_BACKOFF)
+            retry_after = response.headers.get("Retry-After")
+            if retry_after:
+                try:
+                    interval = max(interval, float(retry_after))
+                except ValueError:
+                    pass
@@ -0,0 +1,207 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from azure.core.exceptions import HttpResponseError, ServiceRequestError, ServiceResponseError
+
+# Status codes worth retrying: throttling and transient service-side failures
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class ThrottledError(Exception):
+    """
+    Raised when a call was still throttled or failing transiently after every retry.
+    The file itself is fine and should be retried on a later run.
+    """
+
+
+def is_retryable(error):
+    """
+    Returns True for errors caused by throttling or a transient service/network problem.
+    """
+    if isinstance(error, (ServiceRequestError, ServiceResponseError)):
+        return True
+    if isinstance(error, HttpResponseError):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    return False
+
+
+def retry_after_seconds(error):
+    """
+    Reads the Retry-After (or retry-after-ms) header from an Azure error, if any.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    value = headers.get("retry-after-ms") or headers.get("x-ms-retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000.0
+        except ValueError:
+            pass
+
+    value = headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. acquire() blocks until a token is available.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def set_rate(self, rate):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = float(rate)
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                wait = (1.0 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveRateLimiter:
+    """
+    Shared limiter for analyze calls: a token bucket paces request starts and an
+    AIMD window caps how many calls run at once (with call_and_wait, how many
+    operations are in flight until their results are in). Every success grows
+    the window by 1/window (about +1 per full window); a throttle halves both the
+    window and the request rate, at most once per epoch: calls started before the
+    last decrease were sent into the same congestion, so their throttles are
+    counted but do not halve the window again.
+
+    Each attempt made here is itself retried by the client's own retry policy
+    (azure-core retries 429 and 5xx, honouring Retry-After) before the error
+    reaches the limiter, so the two stack: a call makes up to
+    (retry_total + 1) * (max_retries + 1) requests. Clients meant for the limiter
+    should keep retry_total small (see large_format_custom.SDK_RETRY_TOTAL), so
+    the window hears about throttling while it is still going on.
+    """
+
+    def __init__(self, requests_per_second=5.0, max_concurrency=16, min_concurrency=1,
+                 max_retries=6, base_delay=1.0, max_delay=60.0):
+        self.max_rate = float(requests_per_second)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self.bucket = TokenBucket(requests_per_second)
+        self._window = float(max_concurrency)
+        self._active = 0
+        # Bumped by every decrease; each call remembers the epoch it started in
+        self._epoch = 0
+        self._condition = threading.Condition()
+        self.throttle_count = 0
+
+    @property
+    def concurrency_limit(self):
+        return int(self._window)
+
+    def _acquire_slot(self):
+        with self._condition:
+            while self._active >= int(self._window):
+                self._condition.wait()
+            self._active += 1
+            return self._epoch
+
+    def _release_slot(self):
+        with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+    def _on_success(self):
+        with self._condition:
+            self._window = min(float(self.max_concurrency), self._window + 1.0 / self._window)
+            rate = min(self.max_rate, self.bucket.rate * 1.05)
+            self._condition.notify_all()
+        self.bucket.set_rate(rate)
+
+    def _on_throttle(self, epoch):
+        with self._condition:
+            self.throttle_count += 1
+            if epoch != self._epoch:
+                return
+            self._epoch += 1
+            self._window = max(float(self.min_concurrency), self._window / 2.0)
+            rate = max(0.1, self.bucket.rate / 2.0)
+        self.bucket.set_rate(rate)
+
+    def _backoff(self, attempt, error):
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def call(self, func, *args, **kwargs):
+        """
+        Runs func under the limiter, retrying throttled or transient failures with
+        jittered exponential backoff. Raises ThrottledError once retries run out;
+        any other error is raised unchanged.
+        """
+        return self._run(func, args, kwargs, wait=False)
+
+    def call_and_wait(self, func, *args, **kwargs):
+        """
+        Like call, for a func that starts a long-running operation and returns its poller:
+        the slot is held until poller.result() returns, so the window caps the operations
+        in flight and not just their submits. Returns the operation's result. A throttled
+        or transient failure while polling counts as a throttle but raises ThrottledError
+        at once, as retrying would submit (and pay for) the document again.
+        """
+        return self._run(func, args, kwargs, wait=True)
+
+    def _run(self, func, args, kwargs, wait):
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            epoch = self._acquire_slot()
+            operation = None
+            try:
+                operation = func(*args, **kwargs)
+                result = operation.result() if wait else operation
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                self._on_throttle(epoch)
+                if operation is not None:
+                    raise ThrottledError(f"Still throttled while polling: {e}") from e
+                if attempt == self.max_retries:
+                    raise ThrottledError(f"Still throttled after {attempt + 1} attempts: {e}") from e
+                delay = self._backoff(attempt, e)
+            else:
+                self._on_success()
+                return result
+            finally:
+                self._release_slot()
+            time.sleep(delay)
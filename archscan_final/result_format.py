@@ -0,0 +1,180 @@
+"""
+On-disk formats for OCR results.
+
+"json" is the original pretty-printed AnalyzeResult (indent=4). The compact formats
+drop the indentation and pack every polygon into a float32 array, which is where most
+of the bytes of a prebuilt-read result go:
+
+    json.gz      compact JSON, polygons as base64 float32, gzip-compressed (stdlib only)
+    msgpack      MessagePack, polygons as float32 ext type (needs msgpack)
+    msgpack.zst  the msgpack encoding compressed with zstandard (needs msgpack + zstandard)
+
+Polygons read back from a compact file carry float32 precision (about 7 significant
+digits), which is well below the 4 decimals the service reports.
+"""
+import base64
+import gzip
+import json
+import os
+from array import array
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+RESULT_FORMATS = {
+    "json": ".json",
+    "json.gz": ".json.gz",
+    "msgpack": ".msgpack",
+    "msgpack.zst": ".msgpack.zst",
+}
+DEFAULT_RESULT_FORMAT = "json"
+
+_PACKED_KEY = "$f32"
+_MSGPACK_F32_EXT = 1
+
+
+def _pack_floats(values):
+    return array("f", values).tobytes()
+
+
+def _unpack_floats(data):
+    floats = array("f")
+    floats.frombytes(data)
+    return floats.tolist()
+
+
+def _is_polygon(key, value):
+    return key == "polygon" and isinstance(value, list) and value and all(
+        isinstance(v, (int, float)) and not isinstance(v, bool) for v in value
+    )
+
+
+def _pack(node, encode):
+    if isinstance(node, dict):
+        return {
+            key: encode(value) if _is_polygon(key, value) else _pack(value, encode)
+            for key, value in node.items()
+        }
+    if isinstance(node, list):
+        return [_pack(item, encode) for item in node]
+    return node
+
+
+def _unpack_json(node):
+    if isinstance(node, dict):
+        if len(node) == 1 and _PACKED_KEY in node:
+            return _unpack_floats(base64.b64decode(node[_PACKED_KEY]))
+        return {key: _unpack_json(value) for key, value in node.items()}
+    if isinstance(node, list):
+        return [_unpack_json(item) for item in node]
+    return node
+
+
+def _msgpack_default(value):
+    if isinstance(value, array):
+        return msgpack.ExtType(_MSGPACK_F32_EXT, value.tobytes())
+    return str(value)
+
+
+def _msgpack_ext_hook(code, data):
+    if code == _MSGPACK_F32_EXT:
+        return _unpack_floats(data)
+    return msgpack.ExtType(code, data)
+
+
+def _require(module, name, result_format):
+    if module is None:
+        raise RuntimeError(f"The '{result_format}' result format needs the '{name}' package: pip install {name}")
+
+
+def result_path(base_path, result_format=DEFAULT_RESULT_FORMAT):
+    """
+    Returns base_path (without extension) plus the extension for result_format.
+    """
+    if result_format not in RESULT_FORMATS:
+        raise ValueError(f"Unknown result format '{result_format}', expected one of {sorted(RESULT_FORMATS)}")
+    return base_path + RESULT_FORMATS[result_format]
+
+
+def format_of(path):
+    """
+    Works out the result format from a file name, longest extension first.
+    """
+    lower = path.lower()
+    for result_format, extension in sorted(RESULT_FORMATS.items(), key=lambda item: -len(item[1])):
+        if lower.endswith(extension):
+            return result_format
+    raise ValueError(f"Not a recognised result file: {path}")
+
+
+def is_result_file(path):
+    try:
+        format_of(path)
+        return True
+    except ValueError:
+        return False
+
+
+def dumps(result_dict, result_format):
+    """
+    Encodes a result dict into the bytes of result_format.
+    """
+    if result_format == "json":
+        return json.dumps(result_dict, indent=4, ensure_ascii=False, default=str).encode("utf-8")
+    if result_format == "json.gz":
+        packed = _pack(result_dict, lambda v: {_PACKED_KEY: base64.b64encode(_pack_floats(v)).decode("ascii")})
+        text = json.dumps(packed, ensure_ascii=False, separators=(",", ":"), default=str)
+        return gzip.compress(text.encode("utf-8"), compresslevel=6, mtime=0)
+    if result_format in ("msgpack", "msgpack.zst"):
+        _require(msgpack, "msgpack", result_format)
+        data = msgpack.packb(_pack(result_dict, lambda v: array("f", v)), default=_msgpack_default, use_bin_type=True)
+        if result_format == "msgpack.zst":
+            _require(zstandard, "zstandard", result_format)
+            data = zstandard.ZstdCompressor(level=6).compress(data)
+        return data
+    raise ValueError(f"Unknown result format '{result_format}', expected one of {sorted(RESULT_FORMATS)}")
+
+
+def loads(data, result_format):
+    """
+    Decodes bytes written by dumps back into a plain result dict.
+    """
+    if result_format == "json":
+        return json.loads(data)
+    if result_format == "json.gz":
+        return _unpack_json(json.loads(gzip.decompress(data)))
+    if result_format in ("msgpack", "msgpack.zst"):
+        _require(msgpack, "msgpack", result_format)
+        if result_format == "msgpack.zst":
+            _require(zstandard, "zstandard", result_format)
+            data = zstandard.ZstdDecompressor().decompress(data)
+        return msgpack.unpackb(data, ext_hook=_msgpack_ext_hook, raw=False, strict_map_key=False)
+    raise ValueError(f"Unknown result format '{result_format}', expected one of {sorted(RESULT_FORMATS)}")
+
+
+def write_result(result_dict, path, result_format=None):
+    """
+    Writes a result dict to path; the format defaults to the one implied by the extension.
+    """
+    result_format = result_format or format_of(path)
+    data = dumps(result_dict, result_format)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return len(data)
+
+
+def load_result(path):
+    """
+    Reads a result file in any supported format into a plain dict.
+    """
+    with open(path, "rb") as f:
+        return loads(f.read(), format_of(path))
@@ -0,0 +1,218 @@
+import csv
+import os
+import re
+
+from openpyxl import Workbook, load_workbook
+
+# Custom-model fields exported as (column label, field name) pairs
+EXPORT_FIELDS = [
+    ("Title", "Title"),
+    ("Date", "Date"),
+    ("Drawing Number", "Drawing_Number"),
+    ("Originator", "Originator"),
+    ("Discipline", "Discipline"),
+    ("Floor Number", "Floor Number"),
+]
+
+EXPORT_COLUMNS = ["File Name", "Page Number", "Tables"] + [
+    column for label, _ in EXPORT_FIELDS for column in (label, f"{label} Confidence")
+]
+
+# Version 2 stores document_fields once per document (with page_numbers per field);
+# version 1 documents carry a full copy of document_fields on every page
+DOCUMENT_LAYOUT_VERSION = 2
+
+# Rows are pulled from the store and written in batches of this size
+EXPORT_BATCH_SIZE = 10000
+
+# Source name under which an existing workbook's rows are imported into the store (once)
+LEGACY_EXCEL_SOURCE = "excel"
+
+
+# Function to clean text values and replace pilcrow-like symbols
+def clean_text(value):
+    if isinstance(value, str):
+        value = re.sub(r'[\u00b6\u2029\r\n]+', ' ', value)  # Handles ¶, paragraph separators, and newlines
+        return value.strip()
+    return value
+
+
+# Function to read a stored document in either layout as the current one
+def normalize_document(doc):
+    if "document_fields" in doc:
+        return doc
+    pages = doc.get("pages", [])
+    # Old layout: every page held the same copy of all fields, so take the first one.
+    # page_numbers stays empty, which places each field on every page as before.
+    document_fields = {
+        name: dict(field, page_numbers=[])
+        for name, field in (pages[0].get("document_fields", {}) if pages else {}).items()
+    }
+    return dict(
+        doc,
+        layout_version=DOCUMENT_LAYOUT_VERSION,
+        pages=[{key: value for key, value in page.items() if key != "document_fields"} for page in pages],
+        document_fields=document_fields,
+    )
+
+
+# Function to turn one stored document into its spreadsheet rows (one per page).
+# A field appears on the pages its bounding regions point at, or on every page if it has none.
+def document_rows(doc):
+    doc = normalize_document(doc)
+    all_fields = doc["document_fields"]
+    for page in doc["pages"]:
+        page_number = page["page_number"]
+        row = [
+            clean_text(doc["file_name"]),
+            clean_text(str(page_number)),
+            clean_text(page["tables"]) if isinstance(page["tables"], str) else "Tables found",
+        ]
+        for _, field_name in EXPORT_FIELDS:
+            field = all_fields.get(field_name, {})
+            page_numbers = field.get("page_numbers")
+            if page_numbers and page_number not in page_numbers:
+                field = {}
+            row.append(clean_text(field.get("value", "N/A")))
+            row.append(clean_text(str(field.get("confidence", "N/A"))))
+        yield row
+
+
+# Function to stream every stored row, optionally only documents added after a given store id
+def iter_export_rows(store, after_id=0):
+    for row_id, doc in store.iter_rows(after_id=after_id):
+        for row in document_rows(doc):
+            yield row_id, row
+
+
+# Function to stream the rows of a full export: those imported from an earlier spreadsheet
+# (see import_legacy_excel) first, as the old export kept them, then every stored row
+def iter_all_export_rows(store):
+    for row in store.iter_imported_rows():
+        yield 0, row
+    yield from iter_export_rows(store)
+
+
+# Function to carry over, once, the rows of a workbook written before the results store existed.
+# The old export appended to the workbook, so it can hold files the store never saw; their rows are
+# kept (in the workbook's column order mapped onto EXPORT_COLUMNS) and exported ahead of the store's.
+# Rows for files the store holds are left out, as the store exports those itself.
+def import_legacy_excel(store, excel_file_path):
+    if store.has_imported(LEGACY_EXCEL_SOURCE):
+        return 0
+    rows = []
+    if os.path.exists(excel_file_path):
+        workbook = load_workbook(excel_file_path, read_only=True)
+        try:
+            sheet_rows = workbook.active.iter_rows(values_only=True)
+            header = list(next(sheet_rows, None) or [])
+            for values in sheet_rows:
+                cells = dict(zip(header, values))
+                file_name = cells.get("File Name")
+                if file_name is None or store.has_file_name(str(file_name)):
+                    continue
+                rows.append([cells.get(column) for column in EXPORT_COLUMNS])
+        finally:
+            workbook.close()
+    store.import_rows(LEGACY_EXCEL_SOURCE, rows)
+    return len(rows)
+
+
+# Function to write the store to an .xlsx file with a write-only (streaming) workbook
+def export_excel(store, excel_file_path):
+    import_legacy_excel(store, excel_file_path)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(EXPORT_COLUMNS)
+    for _, row in iter_all_export_rows(store):
+        sheet.append(row)
+
+    tmp_path = excel_file_path + ".tmp.xlsx"
+    workbook.save(tmp_path)
+    os.replace(tmp_path, excel_file_path)
+
+
+# Function to read the CSV sidecar: (last exported store id, CSV size in bytes after that export).
+# Markers written before the size was recorded hold only the id.
+def read_csv_marker(marker_path):
+    with open(marker_path, "r") as marker:
+        fields = marker.read().split()
+    last_id = int(fields[0]) if fields else 0
+    size = int(fields[1]) if len(fields) > 1 else None
+    return last_id, size
+
+
+# Function to replace the CSV sidecar atomically, so it always holds one whole id and size
+def write_csv_marker(marker_path, last_id, size):
+    tmp_path = marker_path + ".tmp"
+    with open(tmp_path, "w") as marker:
+        marker.write(f"{last_id} {size}\n")
+        marker.flush()
+        os.fsync(marker.fileno())
+    os.replace(tmp_path, marker_path)
+
+
+# Function to append rows for documents not yet exported to a CSV file.
+# The last exported store id and the CSV's size at that point are kept in a sidecar file next to
+# the CSV, replaced only after the rows are on disk. Rows appended by a run that crashed before
+# replacing it lie past the recorded size; they are cut off and written again, not duplicated.
+def export_csv(store, csv_file_path):
+    marker_path = csv_file_path + ".last_id"
+    last_id = 0
+    if os.path.exists(csv_file_path) and os.path.exists(marker_path):
+        last_id, size = read_csv_marker(marker_path)
+        if size is not None and os.path.getsize(csv_file_path) > size:
+            with open(csv_file_path, "r+b") as f:
+                f.truncate(size)
+    else:
+        with open(csv_file_path, "w", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerow(EXPORT_COLUMNS)
+
+    with open(csv_file_path, "a", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        for row_id, row in iter_export_rows(store, after_id=last_id):
+            writer.writerow(row)
+            last_id = row_id
+        f.flush()
+        os.fsync(f.fileno())
+        size = os.fstat(f.fileno()).st_size
+
+    write_csv_marker(marker_path, last_id, size)
+
+
+# Function to write the store to a Parquet file in row groups (needs pyarrow)
+def export_parquet(store, parquet_file_path):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs the 'pyarrow' package: pip install pyarrow")
+
+    schema = pa.schema([(column, pa.string()) for column in EXPORT_COLUMNS])
+    tmp_path = parquet_file_path + ".tmp"
+    with pq.ParquetWriter(tmp_path, schema) as writer:
+        batch = []
+        for _, row in iter_all_export_rows(store):
+            batch.append([None if value is None else str(value) for value in row])
+            if len(batch) >= EXPORT_BATCH_SIZE:
+                writer.write_table(pa.Table.from_pylist([dict(zip(EXPORT_COLUMNS, r)) for r in batch], schema))
+                batch = []
+        if batch:
+            writer.write_table(pa.Table.from_pylist([dict(zip(EXPORT_COLUMNS, r)) for r in batch], schema))
+    os.replace(tmp_path, parquet_file_path)
+
+
+EXPORTERS = {
+    ".xlsx": export_excel,
+    ".csv": export_csv,
+    ".parquet": export_parquet,
+}
+
+
+# Function to export the store, picking the format from the file extension
+def export_results(store, output_file_path):
+    extension = os.path.splitext(output_file_path)[1].lower()
+    if extension not in EXPORTERS:
+        raise ValueError(f"Unsupported export format '{extension}', expected one of {sorted(EXPORTERS)}")
+    EXPORTERS[extension](store, output_file_path)
+    print(f"Data written to {output_file_path}")
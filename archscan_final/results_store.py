@@ -0,0 +1,231 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from instrumentation import timed
+from result_format import dumps, loads
+
+# Checkpoint commits happen after this many documents or this many seconds
+CHECKPOINT_BATCH_SIZE = 25
+CHECKPOINT_INTERVAL = 10.0
+
+
+class ResultsStore:
+    """
+    Append-only store of per-document analysis results backed by SQLite.
+
+    Adding a batch is a single insert transaction, and looking up whether a file
+    was already processed goes through an index on file name (and content hash),
+    so neither depends on how many documents the project already holds.
+    With compact=True new rows are stored gzip-compressed (result_format "json.gz");
+    rows of either kind are read back transparently.
+    """
+
+    def __init__(self, db_path, compact=False):
+        self.db_path = db_path
+        self.compact = compact
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # Every commit is fsynced, so a committed checkpoint survives a crash or power loss
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "file_name TEXT NOT NULL, "
+            "file_hash TEXT, "
+            "created REAL NOT NULL, "
+            "result TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS documents_file_name ON documents (file_name)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS documents_file_hash ON documents (file_hash)")
+        # Export rows carried over from a spreadsheet written before the store existed, and the
+        # sources already imported, so each is imported once
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS imported_rows ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "row TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS imports (source TEXT PRIMARY KEY, imported REAL NOT NULL)")
+        self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def append(self, results):
+        """
+        Appends a batch of document results in one transaction.
+        """
+        now = time.time()
+        rows = [
+            (doc["file_name"], doc.get("file_hash"), now, self._encode(doc))
+            for doc in results
+        ]
+        if not rows:
+            return
+        with self._lock:
+            with self._db:
+                self._db.executemany(
+                    "INSERT INTO documents (file_name, file_hash, created, result) VALUES (?, ?, ?, ?)", rows
+                )
+
+    def _encode(self, doc):
+        if self.compact:
+            return sqlite3.Binary(dumps(doc, "json.gz"))
+        return json.dumps(doc, ensure_ascii=False, default=str)
+
+    @staticmethod
+    def _decode(payload):
+        if isinstance(payload, bytes):
+            return loads(payload, "json.gz")
+        return json.loads(payload)
+
+    def has_file_name(self, file_name):
+        with self._lock:
+            row = self._db.execute("SELECT 1 FROM documents WHERE file_name = ? LIMIT 1", (file_name,)).fetchone()
+        return row is not None
+
+    def has_unhashed_file_name(self, file_name):
+        """
+        True if a row without a content hash (e.g. imported from a legacy JSON file) has this file name.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT 1 FROM documents WHERE file_name = ? AND file_hash IS NULL LIMIT 1", (file_name,)
+            ).fetchone()
+        return row is not None
+
+    def has_file_hash(self, file_hash):
+        with self._lock:
+            row = self._db.execute("SELECT 1 FROM documents WHERE file_hash = ? LIMIT 1", (file_hash,)).fetchone()
+        return row is not None
+
+    def count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def iter_results(self, batch_size=500):
+        """
+        Yields stored document results in insertion order without loading them all at once.
+        """
+        for _, doc in self.iter_rows(batch_size=batch_size):
+            yield doc
+
+    def iter_rows(self, after_id=0, batch_size=500):
+        """
+        Yields (row id, document result) pairs with ids greater than after_id, in insertion order.
+        """
+        last_id = after_id
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT id, result FROM documents WHERE id > ? ORDER BY id LIMIT ?", (last_id, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            for row_id, result in rows:
+                yield row_id, self._decode(result)
+            last_id = rows[-1][0]
+
+    def import_legacy_json(self, json_file_path):
+        """
+        One-time import of an old document_results.json into an empty store.
+        Returns the number of documents imported.
+        """
+        if not os.path.exists(json_file_path) or self.count():
+            return 0
+        with open(json_file_path, "r") as json_file:
+            existing_data = json.load(json_file)
+        self.append(existing_data)
+        return len(existing_data)
+
+
+    def has_imported(self, source):
+        with self._lock:
+            row = self._db.execute("SELECT 1 FROM imports WHERE source = ?", (source,)).fetchone()
+        return row is not None
+
+    def import_rows(self, source, rows):
+        """
+        Stores export rows (lists of cell values) read from source and marks source as imported,
+        in one transaction.
+        """
+        with self._lock:
+            with self._db:
+                self._db.executemany("INSERT INTO imported_rows (row) VALUES (?)",
+                                     ((json.dumps(row, ensure_ascii=False, default=str),) for row in rows))
+                self._db.execute("INSERT OR REPLACE INTO imports (source, imported) VALUES (?, ?)",
+                                 (source, time.time()))
+
+    def iter_imported_rows(self, batch_size=500):
+        """
+        Yields the imported export rows in the order they were imported.
+        """
+        last_id = 0
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT id, row FROM imported_rows WHERE id > ? ORDER BY id LIMIT ?", (last_id, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            for _, row in rows:
+                yield json.loads(row)
+            last_id = rows[-1][0]
+
+
+class CheckpointWriter:
+    """
+    Buffers results and commits them to a ResultsStore every batch_size documents or
+    every interval seconds, whichever comes first. Use as a context manager so the
+    last partial batch is committed even if the run is interrupted.
+    """
+
+    def __init__(self, store, batch_size=CHECKPOINT_BATCH_SIZE, interval=CHECKPOINT_INTERVAL):
+        self.store = store
+        self.batch_size = batch_size
+        self.interval = interval
+        self.saved = 0
+        self._pending = []
+        self._last_flush = time.monotonic()
+
+    def add(self, doc):
+        self._pending.append(doc)
+        if len(self._pending) >= self.batch_size or time.monotonic() - self._last_flush >= self.interval:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            with timed("checkpoint"):
+                self.store.append(self._pending)
+            self.saved += len(self._pending)
+            self._pending = []
+        self._last_flush = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.flush()
+
+
+def open_results_store(output_folder_path, legacy_json_file_path=None, compact=False):
+    """
+    Opens the results store for an output folder, importing a legacy JSON results file on first use.
+    """
+    store = ResultsStore(os.path.join(output_folder_path, "document_results.sqlite3"), compact)
+    if legacy_json_file_path:
+        store.import_legacy_json(legacy_json_file_path)
+    return store
@@ -0,0 +1,220 @@
+"""
+Persistent index of the scanned input trees, so a rerun over a NAS-mounted archive does
+not list every folder again.
+
+Each folder is kept with its mtime and subfolders, each file with its size, mtime and
+content hash. A folder's mtime changes whenever an entry is added, removed or renamed
+in it, so a rescan stats every folder but lists only those whose mtime moved; the names
+of the others come from the index. Folders are visited by a pool of threads, as each
+stat or listing on a network share is mostly waiting, and the files are yielded as they
+are found, so processing starts long before the walk ends.
+
+Hashes are reused while a file's size and mtime are unchanged; a file rewritten in place
+keeps its name but not its mtime, so it is rehashed when it is next looked up. Folder and
+file mtimes within RACY_SECONDS of the scan are not trusted (a change in the same clock
+tick would not move them), and are checked again on the next scan.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from instrumentation import timed
+from ocr_cache import hash_file
+
+DEFAULT_SCAN_INDEX_PATH = os.environ.get(
+    "ARCHSCAN_SCAN_INDEX", os.path.join(os.path.dirname(os.path.abspath(__file__)), "scan_index.sqlite3")
+)
+
+# Folders stat'ed or listed at once
+DEFAULT_WALK_THREADS = int(os.environ.get("ARCHSCAN_WALK_THREADS", "16"))
+
+# mtimes this close to now may still change within the same clock tick (coarser on SMB and FAT shares)
+RACY_SECONDS = 2.0
+
+# Bounds of the paths below a folder: every "folder/..." sorts between folder + sep and folder + the next character
+_SUBTREE_END = chr(ord(os.sep) + 1)
+
+
+class ScanIndex:
+    """
+    SQLite-backed index of folders and files. Safe to share between threads.
+    """
+
+    def __init__(self, db_path=DEFAULT_SCAN_INDEX_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, mtime_ns INTEGER, subdirs TEXT)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "dir TEXT, name TEXT, size INTEGER, mtime_ns INTEGER, hash TEXT, PRIMARY KEY (dir, name))"
+        )
+        self.conn.commit()
+
+    def visit(self, folder, scan_started):
+        """
+        Returns (file names, subfolder names) of an absolute folder path, both sorted, listing it
+        only if it changed since it was indexed. A folder that cannot be read is dropped from the index.
+        """
+        try:
+            mtime_ns = os.stat(folder).st_mtime_ns
+        except OSError:
+            self._forget(folder)
+            return [], []
+
+        with self._lock:
+            row = self.conn.execute("SELECT mtime_ns, subdirs FROM dirs WHERE path = ?", (folder,)).fetchone()
+            if row and row[0] == mtime_ns:
+                names = [name for (name,) in
+                         self.conn.execute("SELECT name FROM files WHERE dir = ? ORDER BY name", (folder,))]
+                return names, sorted(json.loads(row[1]))
+
+        names, subdirs = [], []
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    try:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                    except OSError:
+                        is_dir = False
+                    (subdirs if is_dir else names).append(entry.name)
+        except OSError:
+            self._forget(folder)
+            return [], []
+        # scandir's order is the file system's; sorted, a listed folder and an indexed one look the same
+        names.sort()
+        subdirs.sort()
+
+        trusted_mtime = mtime_ns if mtime_ns < (scan_started - RACY_SECONDS) * 1e9 else None
+        with self._lock, self.conn:
+            old_subdirs = set(json.loads(row[1])) if row else set()
+            for gone in old_subdirs.difference(subdirs):
+                self._delete_subtree(os.path.join(folder, gone))
+            known = {name for (name,) in self.conn.execute("SELECT name FROM files WHERE dir = ?", (folder,))}
+            self.conn.executemany("DELETE FROM files WHERE dir = ? AND name = ?",
+                                  [(folder, name) for name in known.difference(names)])
+            self.conn.executemany("INSERT INTO files (dir, name) VALUES (?, ?)",
+                                  [(folder, name) for name in set(names).difference(known)])
+            self.conn.execute("INSERT OR REPLACE INTO dirs (path, mtime_ns, subdirs) VALUES (?, ?, ?)",
+                              (folder, trusted_mtime, json.dumps(subdirs)))
+        return names, subdirs
+
+    def _delete_subtree(self, folder):
+        # Called with the lock held, inside a transaction
+        end = folder + _SUBTREE_END
+        self.conn.execute("DELETE FROM dirs WHERE path = ? OR (path > ? AND path < ?)", (folder, folder + os.sep, end))
+        self.conn.execute("DELETE FROM files WHERE dir = ? OR (dir > ? AND dir < ?)", (folder, folder + os.sep, end))
+
+    def _forget(self, folder):
+        with self._lock, self.conn:
+            self._delete_subtree(folder)
+
+    def file_hash(self, file_path):
+        """
+        Returns the content hash of a file, reused from the index while its size and mtime are
+        unchanged, or None if the file cannot be read.
+        """
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        folder, name = os.path.split(os.path.abspath(file_path))
+        with self._lock:
+            row = self.conn.execute("SELECT size, mtime_ns, hash FROM files WHERE dir = ? AND name = ?",
+                                    (folder, name)).fetchone()
+        if row and row[2] and row[:2] == (stat.st_size, stat.st_mtime_ns):
+            return row[2]
+
+        try:
+            with timed("hash", file_path, stat.st_size):
+                digest = hash_file(file_path)
+        except OSError:
+            return None
+        if stat.st_mtime_ns < (time.time() - RACY_SECONDS) * 1e9:
+            with self._lock, self.conn:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO files (dir, name, size, mtime_ns, hash) VALUES (?, ?, ?, ?, ?)",
+                    (folder, name, stat.st_size, stat.st_mtime_ns, digest),
+                )
+        return digest
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+_default_index = None
+_default_index_lock = threading.Lock()
+
+
+def get_default_index():
+    """
+    Returns the process-wide index at DEFAULT_SCAN_INDEX_PATH.
+    """
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            _default_index = ScanIndex()
+        return _default_index
+
+
+def iter_files(root, match=None, index=None, threads=DEFAULT_WALK_THREADS):
+    """
+    Yields the paths of the files below root whose name passes match(name), as the walk finds
+    them. Paths start with root as given, like os.walk's. The order is the same on every run:
+    folder by folder depth first, names sorted, whether a folder was listed or read from the index.
+    """
+    index = index or get_default_index()
+    abs_root = os.path.abspath(root)
+    scan_started = time.time()
+    executor = ThreadPoolExecutor(max_workers=max(1, threads))
+    try:
+        pending = {executor.submit(index.visit, abs_root, scan_started): abs_root}
+        # Folders are visited in whatever order the threads finish them, and held here until
+        # every folder before them in the walk order has been yielded
+        visited = {}
+        walk = [abs_root]
+        while walk:
+            while walk and walk[-1] in visited:
+                folder = walk.pop()
+                names, subdirs = visited.pop(folder)
+                walk.extend(os.path.join(folder, subdir) for subdir in reversed(subdirs))
+                prefix = root if folder == abs_root else os.path.join(root, os.path.relpath(folder, abs_root))
+                for name in names:
+                    if match is None or match(name):
+                        yield os.path.join(prefix, name)
+            if not pending:
+                break
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                folder = pending.pop(future)
+                visited[folder] = future.result()
+                for subdir in visited[folder][1]:
+                    path = os.path.join(folder, subdir)
+                    pending[executor.submit(index.visit, path, scan_started)] = path
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def iter_pdf_files(root, index=None):
+    """
+    Yields the PDF files below root (see iter_files).
+    """
+    return iter_files(root, lambda name: name.lower().endswith(".pdf"), index)
+
+
+def indexed_hash(file_path):
+    """
+    Content hash of a file through the default index (see ScanIndex.file_hash).
+    """
+    return get_default_index().file_hash(file_path)
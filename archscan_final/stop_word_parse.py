@@ -1,7 +1,22 @@
-import tkinter as tk
-from tkinter import filedialog, messagebox, scrolledtext, ttk
 import os
-import json
+import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from concurrent_ocr import map_ahead
+from stop_words import StopWordFilter, read_stop_words
+from ocr_json_stream import iter_line_contents
+from result_format import RESULT_FORMATS, format_of, is_result_file
+from scan_index import iter_files
+
+DEFAULT_STOP_WORDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "text_files", "stop_words.txt")
+
+# Files handed to a worker process per round trip
+WORKER_CHUNK_SIZE = 64
+
+# Chunks submitted per worker process at a time (the one it filters and one queued behind it),
+# so workers never wait for work while the walk is read only as fast as files get filtered
+CHUNKS_AHEAD_PER_WORKER = 2
 
 
 def load_stop_words(file_path):
@@ -12,37 +27,104 @@ def load_stop_words(file_path):
         with open(file_path, 'r', encoding='utf-8') as f:
             return set(line.strip().lower() for line in f)
     except FileNotFoundError:
-        messagebox.showerror("Error", f"Stop words file not found: {file_path}")
+        print(f"Stop words file not found: {file_path}")
         return set()
 
 
+def filter_json_file(json_file_path, stop_words, output_txt_path):
+    """
+    Parses a JSON file, filters out stop words, and writes the cleaned text to a text file.
+    Line contents are streamed page by page. Errors are raised to the caller.
+    """
+    with open(output_txt_path, 'w', encoding='utf-8') as f:
+        StopWordFilter.coerce(stop_words).write_lines(iter_line_contents(json_file_path), f)
+
+
 def filter_text_from_json(json_file_path, stop_words, output_txt_path):
     """
     Parses a JSON file, filters out stop words, and writes the cleaned text to a text file.
     """
     try:
-        # Load JSON file
-        with open(json_file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-
-        filtered_text = []
-
-        # Process each page
-        for page in data.get("pages", []):
-            for line in page.get("lines", []):
-                content = line.get("content", "")
-                words = content.split()
-                filtered_words = [word for word in words if word.lower() not in stop_words]
-                filtered_text.append(" ".join(filtered_words))
-
-        # Write the filtered text to a file
-        with open(output_txt_path, 'w', encoding='utf-8') as f:
-            f.write("\n".join(filtered_text))
+        filter_json_file(json_file_path, stop_words, output_txt_path)
     except Exception as e:
         print(f"Error processing JSON file {json_file_path}: {e}")
 
 
-def process_folder(input_folder, output_folder, stop_words_file):
+def find_json_tasks(input_folder, output_folder):
+    """
+    Yields (input path, output path) for every result file (.json or a compact format) below the input folder,
+    as the scan index walk finds them.
+    """
+    for input_path in iter_files(input_folder, is_result_file):
+        file = os.path.basename(input_path)
+        output_file_name = file[:-len(RESULT_FORMATS[format_of(file)])] + "_filtered.txt"
+        yield input_path, os.path.join(output_folder, output_file_name)
+
+
+# Per-process filter, built once by the pool initializer
+_worker_filter = None
+
+
+def _init_worker(stop_words, normalize_punctuation):
+    global _worker_filter
+    _worker_filter = StopWordFilter(stop_words, normalize_punctuation)
+
+
+def _filter_task(task):
+    input_path, output_path = task
+    try:
+        filter_json_file(input_path, _worker_filter, output_path)
+        return input_path, None
+    except Exception as e:
+        return input_path, str(e)
+
+
+def _filter_chunk(tasks):
+    return [_filter_task(task) for task in tasks]
+
+
+def _chunks(items, size):
+    try:
+        while True:
+            chunk = list(islice(items, size))
+            if not chunk:
+                return
+            yield chunk
+    finally:
+        # Stops the walk when the chunks are not used up
+        items.close()
+
+
+def iter_process_folder(input_folder, output_folder, stop_words_file, workers=None, normalize_punctuation=True):
+    """
+    Filters every JSON file below input_folder across a pool of worker processes.
+    Yields (input path, error message or None) for each file, in walk order, as its chunk
+    finishes. The walk is consumed only CHUNKS_AHEAD_PER_WORKER chunks per worker ahead of
+    the results, so the first status arrives while the rest of the tree is still being
+    listed and memory does not grow with the tree.
+    Raises FileNotFoundError if the stop words file is missing.
+    """
+    stop_words = read_stop_words(stop_words_file)
+    os.makedirs(output_folder, exist_ok=True)
+    tasks = find_json_tasks(input_folder, output_folder)
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1:
+        _init_worker(stop_words, normalize_punctuation)
+        for task in tasks:
+            yield _filter_task(task)
+        return
+
+    executor = ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(stop_words, normalize_punctuation)
+    )
+    # Executor.map would read every task and submit every chunk before yielding the first result
+    for results in map_ahead(_filter_chunk, _chunks(tasks, WORKER_CHUNK_SIZE), CHUNKS_AHEAD_PER_WORKER * workers,
+                             executor=executor):
+        yield from results
+
+
+def process_folder(input_folder, output_folder, stop_words_file, workers=None):
     """
     Processes all JSON files in a folder, filters out stop words, and saves the results.
     """
@@ -50,27 +132,56 @@ def process_folder(input_folder, output_folder, stop_words_file):
     if not stop_words:
         return "No stop words loaded. Operation aborted.\n"
 
-    # Ensure output folder exists
-    os.makedirs(output_folder, exist_ok=True)
-    result_summary = ""
+    result_summary = []
+    for input_path, error in iter_process_folder(input_folder, output_folder, stop_words_file, workers):
+        if error:
+            print(f"Error processing JSON file {input_path}: {error}")
+        result_summary.append(f"Processed: {os.path.basename(input_path)}\n")
 
-    # Process all JSON files in the input folder
-    for root, _, files in os.walk(input_folder):
-        for file in files:
-            if file.lower().endswith(".json"):
-                input_path = os.path.join(root, file)
-                output_file_name = os.path.splitext(file)[0] + "_filtered.txt"
-                output_path = os.path.join(output_folder, output_file_name)
-                filter_text_from_json(input_path, stop_words, output_path)
-                result_summary += f"Processed: {file}\n"
+    return "".join(result_summary)
 
-    return result_summary
+
+def run_headless(argv=None):
+    """
+    Command-line batch mode: streams one status line per file and returns an exit code
+    (0 all files filtered, 1 some files failed, 2 bad arguments or missing stop words).
+    """
+    parser = argparse.ArgumentParser(description="Filter stop words out of OCR JSON files.")
+    parser.add_argument("--input", required=True, help="folder containing OCR JSON files")
+    parser.add_argument("--output", required=True, help="folder for the _filtered.txt files")
+    parser.add_argument("--stop-words", default=DEFAULT_STOP_WORDS_PATH, help="stop words file")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--normalize-punctuation", action=argparse.BooleanOptionalAction, default=True,
+                        help='also drop stop words with attached punctuation, e.g. "the," (default: on)')
+    args = parser.parse_args(argv)
+
+    processed = failed = 0
+    try:
+        for input_path, error in iter_process_folder(
+                args.input, args.output, args.stop_words, args.workers, args.normalize_punctuation
+        ):
+            if error:
+                failed += 1
+                print(f"FAILED\t{input_path}\t{error}", flush=True)
+            else:
+                processed += 1
+                print(f"OK\t{input_path}", flush=True)
+    except FileNotFoundError as e:
+        print(f"Stop words file not found: {e.filename}", file=sys.stderr)
+        return 2
+
+    print(f"Processed {processed} file(s), {failed} failed", file=sys.stderr)
+    return 1 if failed else 0
 
 
 def start_gui():
+    # Imported here so the filtering functions can be used on machines without a display
+    import tkinter as tk
+    from tkinter import filedialog, messagebox, scrolledtext, ttk
+
     selected_input_folder = None
     selected_output_folder = None
-    stop_words_path = "text_files/stop_words.txt"  # Default path to stop words file
+    stop_words_path = DEFAULT_STOP_WORDS_PATH  # Default path to stop words file
 
     def select_input_folder():
         nonlocal selected_input_folder
@@ -167,5 +278,8 @@ def start_gui():
     root.mainloop()
 
 
-# Start the GUI
-start_gui()
\ No newline at end of file
+# Start the GUI, or run headless when folders are given on the command line
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(run_headless())
+    start_gui()
@@ -0,0 +1,103 @@
+import string
+
+# Characters stripped from both ends of a token when punctuation normalization is on (the
+# default), so "the," or "(and" match the stop words "the" and "and"
+PUNCTUATION = string.punctuation + "‘’“”–—…¶"
+
+# The decision table is reset once it holds this many distinct tokens
+MAX_TABLE_SIZE = 1_000_000
+
+
+def read_stop_words(file_path):
+    """
+    Reads one stop word per line. Raises FileNotFoundError if the file is missing.
+    """
+    with open(file_path, "r", encoding="utf-8") as f:
+        return set(line.strip().lower() for line in f)
+
+
+class StopWordFilter:
+    """
+    Removes stop words from OCR line text.
+
+    Every distinct token is lower-cased (and, unless normalize_punctuation is False,
+    stripped of surrounding punctuation) only once; the keep/drop decision is remembered in a token table, so the repeated
+    vocabulary of drawing sets (labels, title blocks, notes) costs one set lookup per token.
+    """
+
+    def __init__(self, stop_words, normalize_punctuation=True):
+        self.stop_words = frozenset(word.lower() for word in stop_words if word)
+        self.normalize_punctuation = normalize_punctuation
+        self._keep = set()
+        self._drop = set()
+
+    @classmethod
+    def from_file(cls, file_path, normalize_punctuation=True):
+        return cls(read_stop_words(file_path), normalize_punctuation)
+
+    @classmethod
+    def coerce(cls, stop_words):
+        """
+        Accepts either a StopWordFilter or a plain collection of stop words.
+        """
+        return stop_words if isinstance(stop_words, cls) else cls(stop_words)
+
+    def __bool__(self):
+        return bool(self.stop_words)
+
+    def _classify(self, token):
+        if len(self._keep) + len(self._drop) > MAX_TABLE_SIZE:
+            self._keep.clear()
+            self._drop.clear()
+        key = token.lower()
+        if self.normalize_punctuation:
+            key = key.strip(PUNCTUATION)
+        if key in self.stop_words:
+            self._drop.add(token)
+            return False
+        self._keep.add(token)
+        return True
+
+    def filter_line(self, content):
+        """
+        Returns the line with stop words removed and whitespace collapsed to single spaces.
+        """
+        keep = self._keep
+        drop = self._drop
+        kept = []
+        for token in content.split():
+            if token in keep:
+                kept.append(token)
+            elif token in drop:
+                continue
+            elif self._classify(token):
+                kept.append(token)
+        return " ".join(kept)
+
+    def filter_lines(self, contents):
+        return [self.filter_line(content) for content in contents]
+
+    def filter_pages(self, pages):
+        """
+        Filters every line of every page of an AnalyzeResult dict, in page order.
+        """
+        filter_line = self.filter_line
+        return [
+            filter_line(line.get("content", ""))
+            for page in pages
+            for line in page.get("lines", [])
+        ]
+
+    def filter_result(self, result_dict):
+        return self.filter_pages(result_dict.get("pages", []))
+
+    def write_lines(self, contents, text_file):
+        """
+        Filters a stream of line contents straight into text_file, newline-separated
+        with no trailing newline, without holding the filtered text in memory.
+        """
+        separator = ""
+        for content in contents:
+            text_file.write(separator)
+            text_file.write(self.filter_line(content))
+            separator = "\n"
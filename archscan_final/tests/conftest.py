@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+
+# The modules of archscan_final are imported flat, as the apps and benchmarks import them
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The scan index and OCR cache default to files next to the code; tests keep theirs out of the tree
+_state_folder = tempfile.mkdtemp(prefix="archscan_tests_")
+os.environ.setdefault("ARCHSCAN_SCAN_INDEX", os.path.join(_state_folder, "scan_index.sqlite3"))
+os.environ.setdefault("ARCHSCAN_CACHE_DIR", os.path.join(_state_folder, "ocr_cache"))
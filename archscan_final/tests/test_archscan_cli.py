@@ -0,0 +1,35 @@
+import pytest
+
+import archscan_cli
+from archscan_cli import EXIT_ERROR, EXIT_OK, EXIT_USAGE, main
+
+
+def test_bad_arguments_are_usage_errors(tmp_path):
+    assert main(["ocr", "--output", str(tmp_path)]) == EXIT_USAGE
+    assert main(["ocr", "--input", str(tmp_path / "missing"), "--output", str(tmp_path)]) == EXIT_USAGE
+    assert main(["ocr", "--input", str(tmp_path), "--output", str(tmp_path),
+                 "--stage-workers", "upload=4"]) == EXIT_USAGE
+    assert main(["filter", "--input", str(tmp_path), "--output", str(tmp_path),
+                 "--stop-words", str(tmp_path / "missing.txt")]) == EXIT_USAGE
+    assert main(["export", "--output", str(tmp_path), "--to", str(tmp_path / "results.txt")]) == EXIT_USAGE
+
+
+@pytest.mark.parametrize("error", [RuntimeError("Run stopped"), ValueError("bad response"),
+                                   FileNotFoundError("gone"), KeyError("unexpected")])
+def test_errors_raised_during_a_run_are_run_failures(tmp_path, monkeypatch, error):
+    def run_ocr(args):
+        raise error
+
+    monkeypatch.setattr(archscan_cli, "run_ocr", run_ocr)
+    assert main(["ocr", "--input", str(tmp_path), "--output", str(tmp_path / "out")]) == EXIT_ERROR
+
+
+def test_filter_run_exits_ok(tmp_path):
+    (tmp_path / "in").mkdir()
+    (tmp_path / "in" / "sheet.json").write_text('{"pages": [{"lines": [{"content": "THE PLAN"}]}]}')
+    stop_words = tmp_path / "stop_words.txt"
+    stop_words.write_text("the\n")
+
+    assert main(["filter", "--input", str(tmp_path / "in"), "--output", str(tmp_path / "out"),
+                 "--stop-words", str(stop_words), "--workers", "1"]) == EXIT_OK
+    assert (tmp_path / "out" / "sheet_filtered.txt").read_text() == "PLAN"
@@ -0,0 +1,39 @@
+import pytest
+from azure.ai.documentintelligence import DocumentIntelligenceClient
+from azure.ai.formrecognizer import DocumentAnalysisClient
+
+import client_pool
+from client_pool import get_shared_client
+
+ENDPOINT = "https://archscan-test.invalid/"
+KEY = "0" * 32
+
+
+@pytest.fixture(autouse=True)
+def fresh_pool():
+    client_pool.close_all()
+    yield
+    client_pool.close_all()
+
+
+def pool_maxsize():
+    return client_pool._sessions[ENDPOINT].get_adapter(ENDPOINT)._pool_maxsize
+
+
+def test_one_client_per_class_endpoint_and_key():
+    client = get_shared_client(DocumentIntelligenceClient, ENDPOINT, KEY)
+    assert get_shared_client(DocumentIntelligenceClient, ENDPOINT, KEY) is client
+    assert get_shared_client(DocumentAnalysisClient, ENDPOINT, KEY) is not client
+    assert len(client_pool._sessions) == 1
+
+
+def test_a_later_caller_asking_for_more_connections_grows_the_shared_pool():
+    get_shared_client(DocumentIntelligenceClient, ENDPOINT, KEY, pool_size=8)
+    assert pool_maxsize() == 8
+
+    get_shared_client(DocumentAnalysisClient, ENDPOINT, KEY, pool_size=32)
+    assert pool_maxsize() == 32
+
+    # Neither a smaller request nor a client already made shrinks it again
+    get_shared_client(DocumentIntelligenceClient, ENDPOINT, KEY, pool_size=4)
+    assert pool_maxsize() == 32
@@ -0,0 +1,90 @@
+import pytest
+
+from job_queue import MAX_ATTEMPTS, PRIORITIES, JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    with JobQueue(str(tmp_path / "jobs.sqlite3")) as queue:
+        yield queue
+
+
+def submit(queue, tmp_path, priority):
+    return queue.submit("ocr", str(tmp_path), str(tmp_path / "out"), priority=PRIORITIES[priority])
+
+
+def running_backfill(queue, tmp_path):
+    submit(queue, tmp_path, "backfill")
+    queue.heartbeat("w1")
+    return queue.claim("w1")
+
+
+def test_urgent_job_waits_for_an_idle_worker_instead_of_preempting(queue, tmp_path):
+    job = running_backfill(queue, tmp_path)
+    queue.heartbeat("w2")
+    submit(queue, tmp_path, "urgent")
+
+    assert queue.should_stop(job) is None
+    assert queue.claim("w2")["priority"] == PRIORITIES["urgent"]
+
+
+def test_urgent_job_preempts_when_every_other_worker_is_busy(queue, tmp_path):
+    job = running_backfill(queue, tmp_path)
+    submit(queue, tmp_path, "normal")
+    queue.heartbeat("w2")
+    queue.claim("w2")
+    submit(queue, tmp_path, "urgent")
+
+    assert queue.should_stop(job) == "preempted"
+
+
+def test_worker_reserved_for_urgent_jobs_does_not_count_for_normal_ones(queue, tmp_path):
+    job = running_backfill(queue, tmp_path)
+    queue.heartbeat("w2", max_priority=PRIORITIES["urgent"])
+    submit(queue, tmp_path, "normal")
+
+    assert queue.should_stop(job) == "preempted"
+
+
+def test_one_idle_worker_covers_one_waiting_job(queue, tmp_path):
+    job = running_backfill(queue, tmp_path)
+    queue.heartbeat("w2")
+    submit(queue, tmp_path, "urgent")
+    submit(queue, tmp_path, "normal")
+
+    assert queue.should_stop(job) == "preempted"
+
+
+def test_stale_worker_is_not_idle(queue, tmp_path):
+    job = running_backfill(queue, tmp_path)
+    queue.heartbeat("w2")
+    submit(queue, tmp_path, "urgent")
+
+    assert queue.should_stop(job, max_age=-1) == "preempted"
+
+
+def test_job_of_a_dead_worker_fails_after_max_attempts(queue, tmp_path):
+    job_id = submit(queue, tmp_path, "normal")
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        queue.heartbeat(f"w{attempt}")
+        assert queue.claim(f"w{attempt}")["id"] == job_id
+        queue.remove_worker(f"w{attempt}")
+        requeued = queue.requeue_stale()
+        assert requeued == (1 if attempt < MAX_ATTEMPTS else 0)
+
+    job = queue.get(job_id)
+    assert job["status"] == "failed"
+    assert f"{MAX_ATTEMPTS} attempts" in job["error"]
+
+
+def test_preempted_runs_do_not_use_up_attempts(queue, tmp_path):
+    job_id = submit(queue, tmp_path, "normal")
+    queue.heartbeat("w1")
+    for _ in range(MAX_ATTEMPTS + 1):
+        queue.claim("w1")
+        queue.finish(job_id, "queued", error="preempted")
+
+    queue.claim("w1")
+    queue.remove_worker("w1")
+    assert queue.requeue_stale() == 1
+    assert queue.get(job_id)["attempts"] == 1
@@ -0,0 +1,21 @@
+import large_format_custom
+from archscan_cli import EXIT_OK, main
+from job_queue import JobQueue
+
+
+def test_shipped_model_ids_file_lists_the_trained_models():
+    model_ids = large_format_custom.load_model_ids()
+    assert model_ids["Georgetown Law"] == "Georgetown_law_09242024"
+    assert model_ids["2024-11-07"] == "Large_Format_2024_11_07"
+    # The built-in models are still there
+    assert set(large_format_custom.MODEL_IDS.items()) <= set(model_ids.items())
+
+
+def test_submitted_job_uses_the_model_id_of_a_listed_label(tmp_path, capsys):
+    queue_path = str(tmp_path / "jobs.sqlite3")
+    assert main(["submit", "extract", "--input", str(tmp_path), "--output", str(tmp_path / "out"),
+                 "--model", "Georgetown Law", "--queue", queue_path]) == EXIT_OK
+
+    job_id = int(capsys.readouterr().out.split()[-1])
+    with JobQueue(queue_path) as queue:
+        assert queue.get(job_id)["model_id"] == "Georgetown_law_09242024"
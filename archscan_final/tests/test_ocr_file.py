@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+import OCR_main
+from benchmarks.fake_client import FakeDocumentIntelligenceClient
+from ocr_cache import OcrCache, client_api_version
+from ocr_file import MODEL_ID
+from scan_index import indexed_hash
+
+
+class StopRun(Exception):
+    pass
+
+
+def test_stopped_run_finishes_the_analyses_it_already_submitted(tmp_path):
+    input_folder, output_folder = tmp_path / "in", tmp_path / "out"
+    input_folder.mkdir()
+    output_folder.mkdir()
+    pdf_paths = []
+    for index in range(20):
+        pdf_path = input_folder / f"sheet_{index:02d}.pdf"
+        pdf_path.write_bytes(f"%PDF-1.7\n% sheet {index}\n".encode())
+        pdf_paths.append(str(pdf_path))
+    client = FakeDocumentIntelligenceClient(analyze_latency=0.2, download_latency=0.01)
+    cache = OcrCache(str(tmp_path / "cache"))
+
+    def progress(done, total):
+        if done:
+            raise StopRun
+
+    with pytest.raises(StopRun):
+        OCR_main.handle_folder_upload(str(input_folder), str(output_folder), max_in_flight=1, client=client,
+                                      cache=cache, max_operations=4, progress=progress)
+
+    # Every upload the service took has its result written and cached; the files behind them were never sent
+    uploads = next(client._ids)
+    written = sorted(name[:-len(".json")] for name in os.listdir(output_folder) if name.endswith(".json"))
+    assert 1 < uploads < len(pdf_paths)
+    assert len(written) == uploads
+    cached = [os.path.basename(path)[:-len(".pdf")] for path in pdf_paths
+              if cache.get(indexed_hash(path), MODEL_ID, client_api_version(client))]
+    assert cached == written
@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+from ocr_json_stream import iter_line_contents, iter_page_lines
+from stop_words import StopWordFilter
+
+RESULT = {
+    "apiVersion": "2024-11-30",
+    "content": "ignored",
+    "pages": [
+        {
+            "pageNumber": 1,
+            "words": [{"content": "SHEET", "polygon": [0.1, 0.2, 1e-3, 2.5]}],
+            "lines": [
+                {"content": "SHEET A-101", "polygon": [1, 2, 3, 4]},
+                {"polygon": [5, 6, 7, 8]},
+                {"content": 'NOTE: "TYP." \\ SEE DÉTAIL 3/A-501', "spans": [{"offset": 12, "length": 30}]},
+            ],
+        },
+        {"pageNumber": 2, "lines": []},
+        {"pageNumber": 3, "lines": [{"spans": []}, {"content": "FLOOR PLAN"}]},
+    ],
+    "paragraphs": [{"content": "not a line"}],
+}
+
+
+@pytest.fixture
+def result_path(tmp_path):
+    path = tmp_path / "result.json"
+    path.write_text(json.dumps(RESULT, indent=2), encoding="utf-8")
+    return str(path)
+
+
+def test_builtin_reader_matches_the_loaded_result(result_path):
+    expected = [[line.get("content", "") for line in page["lines"]] for page in RESULT["pages"]]
+    assert list(iter_page_lines(result_path, use_ijson=False)) == expected
+
+
+def test_both_backends_read_the_same_lines(result_path):
+    pytest.importorskip("ijson")
+    builtin = list(iter_page_lines(result_path, use_ijson=False))
+    assert list(iter_page_lines(result_path, use_ijson=True)) == builtin
+
+
+def test_streamed_lines_filter_like_the_whole_result(result_path):
+    stop_filter = StopWordFilter({"see"})
+    expected = stop_filter.filter_result(RESULT)
+    for use_ijson in (False, True):
+        if use_ijson:
+            pytest.importorskip("ijson")
+        assert [stop_filter.filter_line(line) for line in iter_line_contents(result_path, use_ijson)] == expected
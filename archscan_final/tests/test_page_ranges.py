@@ -0,0 +1,99 @@
+import copy
+
+import pytest
+
+import page_ranges
+from page_ranges import merge_analyze_results, plan_page_ranges, text_length
+
+
+def make_part(page_numbers, content, paragraph_count=1):
+    """
+    A page-range result whose lines, words and paragraphs point into its own content.
+    """
+    pages = []
+    offset = 0
+    for page_number in page_numbers:
+        line = f"SHEET {page_number}"
+        pages.append({
+            "pageNumber": page_number,
+            "spans": [{"offset": offset, "length": len(line)}],
+            "lines": [{"content": line, "spans": [{"offset": offset, "length": len(line)}]}],
+            "words": [{"content": "SHEET", "span": {"offset": offset, "length": 5}}],
+        })
+        offset += len(line) + 1
+    paragraphs = [{"content": content, "spans": [{"offset": 0, "length": len(content)}],
+                   "boundingRegions": [{"pageNumber": page_numbers[0], "polygon": [0, 0, 1, 1]}]}
+                  for _ in range(paragraph_count)]
+    sections = [{"spans": [{"offset": 0, "length": len(content)}],
+                 "elements": [f"/paragraphs/{index}" for index in range(paragraph_count)]}]
+    return {"apiVersion": "2024-11-30", "content": content, "pages": pages, "paragraphs": paragraphs,
+            "sections": sections}
+
+
+def test_merge_moves_spans_pages_and_pointers_of_later_ranges():
+    first = make_part([1, 2], "SHEET 1\nSHEET 2", paragraph_count=2)
+    # Cut locally, so the second range numbers its pages from 1
+    second = make_part([1, 2], "SHEET 1\nSHEET 2")
+    parts = [(1, first), (3, second)]
+    before = copy.deepcopy(parts)
+
+    merged = merge_analyze_results(parts)
+
+    assert parts == before
+    assert merged["content"] == "SHEET 1\nSHEET 2\nSHEET 1\nSHEET 2"
+    assert [page["pageNumber"] for page in merged["pages"]] == [1, 2, 3, 4]
+    shift = len("SHEET 1\nSHEET 2\n")
+    assert [page["spans"][0]["offset"] for page in merged["pages"]] == [0, 8, shift, shift + 8]
+    assert merged["pages"][3]["words"][0]["span"]["offset"] == shift + 8
+    assert merged["paragraphs"][2]["spans"][0]["offset"] == shift
+    assert merged["paragraphs"][2]["boundingRegions"][0]["pageNumber"] == 3
+    assert merged["sections"][1]["elements"] == ["/paragraphs/2"]
+    assert merged["sections"][0]["elements"] == ["/paragraphs/0", "/paragraphs/1"]
+
+
+def test_merge_keeps_page_numbers_of_service_side_ranges():
+    merged = merge_analyze_results([(1, make_part([1, 2], "SHEET 1\nSHEET 2")),
+                                    (3, make_part([3, 4], "SHEET 3\nSHEET 4"))])
+    assert [page["pageNumber"] for page in merged["pages"]] == [1, 2, 3, 4]
+
+
+def test_merged_offsets_count_in_the_result_string_index_type():
+    first = {"content": "\U0001d538 PLAN", "stringIndexType": "utf16CodeUnit", "pages": [{"pageNumber": 1}]}
+    second = {"content": "LEVEL 2", "pages": [{"pageNumber": 2, "spans": [{"offset": 0, "length": 7}]}]}
+    merged = merge_analyze_results([(1, first), (2, second)])
+    # The astral letter is two UTF-16 code units
+    assert merged["pages"][1]["spans"][0]["offset"] == len("xx PLAN\n")
+
+
+def test_text_length_units():
+    decomposed = "DE\u0301TAIL"
+    # textElements counts a letter and its combining mark as one character
+    assert text_length(decomposed) == 6
+    assert text_length(decomposed, "unicodeCodePoint") == 7
+    assert text_length("\U0001d538", "utf16CodeUnit") == 2
+
+
+def write_page_tree_pdf(path, page_count):
+    kids = " ".join(f"{3 + index} 0 R" for index in range(page_count))
+    objects = [b"1 0 obj << /Type /Catalog /Pages 2 0 R >> endobj",
+               f"2 0 obj << /Type /Pages /Kids [{kids}] /Count {page_count} >> endobj".encode()]
+    objects += [f"{3 + index} 0 obj << /Type /Page /Parent 2 0 R >> endobj".encode() for index in range(page_count)]
+    path.write_bytes(b"%PDF-1.7\n" + b"\n".join(objects) + b"\n%%EOF\n")
+
+
+@pytest.fixture
+def without_pypdf(monkeypatch):
+    monkeypatch.setattr(page_ranges, "pypdf", None)
+
+
+def test_plan_covers_every_page_in_ranges(tmp_path, without_pypdf):
+    pdf_path = tmp_path / "plans.pdf"
+    write_page_tree_pdf(pdf_path, 120)
+    assert plan_page_ranges(str(pdf_path), 50) == [(1, 50), (51, 100), (101, 120)]
+    assert plan_page_ranges(str(pdf_path), 120) is None
+
+
+def test_pdf_without_a_readable_page_count_is_not_split(tmp_path, without_pypdf):
+    pdf_path = tmp_path / "opaque.pdf"
+    pdf_path.write_bytes(b"%PDF-1.7\n% object streams only\n%%EOF\n")
+    assert plan_page_ranges(str(pdf_path), 1) is None
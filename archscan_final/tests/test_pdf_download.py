@@ -0,0 +1,36 @@
+import hashlib
+
+from pdf_download import IOV_MAX, copy_file_atomically, write_chunks_atomically
+
+
+def test_many_small_chunks_are_written_whole(tmp_path):
+    # More 4 KiB blocks per batch than one writev() accepts, as azure-core's default stream yields them
+    chunks = [bytes([index % 251]) * 4096 for index in range(3 * IOV_MAX)]
+    output_path = tmp_path / "result.pdf"
+
+    size, checksum = write_chunks_atomically(iter(chunks), str(output_path))
+
+    data = b"".join(chunks)
+    assert size == len(data)
+    assert checksum == hashlib.sha256(data).hexdigest()
+    assert output_path.read_bytes() == data
+    assert [path.name for path in tmp_path.iterdir()] == ["result.pdf"]
+
+
+def test_empty_and_odd_sized_chunks(tmp_path):
+    chunks = [b"", b"%PDF-1.7\n", b"", b"x" * 12345, b"y"]
+    output_path = tmp_path / "result.pdf"
+
+    write_chunks_atomically(chunks, str(output_path))
+
+    assert output_path.read_bytes() == b"".join(chunks)
+
+
+def test_copy_keeps_the_bytes_and_returns_their_checksum(tmp_path):
+    source_path = tmp_path / "source.pdf"
+    source_path.write_bytes(b"%PDF-1.7\n" + b"z" * 100000)
+
+    checksum = copy_file_atomically(str(source_path), str(tmp_path / "copy.pdf"))
+
+    assert (tmp_path / "copy.pdf").read_bytes() == source_path.read_bytes()
+    assert checksum == hashlib.sha256(source_path.read_bytes()).hexdigest()
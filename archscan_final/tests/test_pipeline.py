@@ -0,0 +1,93 @@
+import threading
+import time
+
+import pytest
+
+from pipeline import IO, WRITER, Pipeline, Stage
+
+
+class StopRun(Exception):
+    pass
+
+
+def test_results_keep_input_order_and_failed_items_skip_later_stages():
+    seen_by_last = []
+
+    def parse(item):
+        if item == 3:
+            raise ValueError("bad item")
+        # Later items overtake earlier ones
+        time.sleep(0.01 * (item % 3))
+        return item * 10
+
+    pipeline = Pipeline([Stage("parse", parse, IO, workers=4),
+                         Stage("write", lambda item: seen_by_last.append(item) or item + 1, WRITER)])
+    results = pipeline.run(iter(range(8)), lambda item, stage, error: f"{item} failed in {stage}: {error}")
+
+    assert results == [1, 11, 21, "3 failed in parse: bad item", 41, 51, 61, 71]
+    assert sorted(seen_by_last) == [0, 10, 20, 40, 50, 60, 70]
+
+
+def test_input_is_read_only_as_fast_as_the_queues_drain():
+    read = []
+    release = threading.Event()
+
+    def items():
+        for index in range(1000):
+            read.append(index)
+            yield index
+
+    def slow(item):
+        release.wait()
+        return item
+
+    pipeline = Pipeline([Stage("slow", slow, IO, workers=2, queue_size=3)])
+    runner = threading.Thread(target=pipeline.run, args=(items(), None))
+    runner.start()
+    time.sleep(0.2)
+    # Two items being worked on, three queued, and the one the feeder waits to put
+    assert len(read) <= 6
+    release.set()
+    runner.join()
+    assert len(read) == 1000
+
+
+def test_stopped_run_drops_unstarted_items_and_finishes_started_ones():
+    started, finished = [], []
+    lock = threading.Lock()
+    read = []
+
+    def items():
+        for index in range(200):
+            read.append(index)
+            yield index
+
+    def analyze(item):
+        with lock:
+            started.append(item)
+        time.sleep(0.01)
+        return item
+
+    def download(item):
+        time.sleep(0.02)
+        with lock:
+            finished.append(item)
+        return item
+
+    def progress(done, total):
+        if done:
+            raise StopRun
+
+    pipeline = Pipeline([Stage("analyze", analyze, IO, workers=2, queue_size=2),
+                         Stage("download", download, IO, workers=1, queue_size=4)])
+    with pytest.raises(StopRun):
+        pipeline.run(items(), None, progress)
+
+    assert len(read) < 200
+    assert sorted(finished) == sorted(started)
+    assert len(started) < len(read)
+
+
+def test_unknown_stage_kind_is_rejected():
+    with pytest.raises(ValueError):
+        Stage("upload", lambda item: item, kind="gpu")
@@ -0,0 +1,154 @@
+import pytest
+from azure.core.exceptions import HttpResponseError
+
+import rate_limiter
+from rate_limiter import AdaptiveRateLimiter, ThrottledError, TokenBucket, retry_after_seconds
+
+
+class FakeClock:
+    """
+    Stands in for the time module: sleep() advances monotonic() instead of waiting.
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.reason = "Too Many Requests"
+
+    def text(self):
+        return ""
+
+
+def throttled(headers=None):
+    return HttpResponseError(message="throttled", response=FakeResponse(429, headers))
+
+
+class FakePoller:
+    def __init__(self, result=None, error=None, on_result=None):
+        self._result = result
+        self._error = error
+        self._on_result = on_result
+
+    def result(self):
+        if self._on_result is not None:
+            self._on_result()
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter, "time", clock)
+    return clock
+
+
+def test_token_bucket_paces_starts_at_its_rate(clock):
+    bucket = TokenBucket(rate=2, capacity=2)
+    for _ in range(6):
+        bucket.acquire()
+    # Two tokens were there at the start; the other four take half a second each
+    assert clock.now - 1000.0 == pytest.approx(2.0)
+
+
+def test_throttles_of_one_epoch_halve_the_window_once(clock):
+    limiter = AdaptiveRateLimiter(requests_per_second=10, max_concurrency=16)
+    epochs = [limiter._acquire_slot() for _ in range(8)]
+    for epoch in epochs:
+        limiter._on_throttle(epoch)
+        limiter._release_slot()
+    assert limiter.concurrency_limit == 8
+    assert limiter.throttle_count == 8
+    assert limiter.bucket.rate == pytest.approx(5.0)
+
+    # A call started after the decrease belongs to the next epoch and may halve it again
+    limiter._on_throttle(limiter._acquire_slot())
+    limiter._release_slot()
+    assert limiter.concurrency_limit == 4
+
+
+def test_retry_after_is_waited_before_the_retry(clock):
+    limiter = AdaptiveRateLimiter(requests_per_second=100, base_delay=1.0)
+    attempts = []
+
+    def submit():
+        attempts.append(clock.now)
+        if len(attempts) == 1:
+            raise throttled({"Retry-After": "7"})
+        return "submitted"
+
+    assert limiter.call(submit) == "submitted"
+    assert len(attempts) == 2
+    assert attempts[1] - attempts[0] >= 7.0
+
+
+def test_retry_after_headers():
+    assert retry_after_seconds(throttled({"retry-after-ms": "1500"})) == 1.5
+    assert retry_after_seconds(throttled({"Retry-After": "3"})) == 3.0
+    assert retry_after_seconds(throttled()) is None
+
+
+def test_gives_up_with_throttled_error_after_max_retries(clock):
+    limiter = AdaptiveRateLimiter(requests_per_second=100, max_retries=2)
+    calls = []
+
+    def submit():
+        calls.append(1)
+        raise throttled()
+
+    with pytest.raises(ThrottledError):
+        limiter.call(submit)
+    assert len(calls) == 3
+
+
+def test_other_errors_are_raised_unchanged(clock):
+    limiter = AdaptiveRateLimiter(requests_per_second=100)
+
+    def submit():
+        raise ValueError("corrupt file")
+
+    with pytest.raises(ValueError):
+        limiter.call(submit)
+    assert limiter.throttle_count == 0
+
+
+def test_call_and_wait_holds_the_slot_until_the_result(clock):
+    limiter = AdaptiveRateLimiter(requests_per_second=100, max_concurrency=4)
+    active_while_polling = []
+    poller = FakePoller(result="analysis", on_result=lambda: active_while_polling.append(limiter._active))
+
+    assert limiter.call_and_wait(lambda: poller) == "analysis"
+    assert active_while_polling == [1]
+    assert limiter._active == 0
+
+
+def test_throttled_poll_is_not_submitted_again(clock):
+    limiter = AdaptiveRateLimiter(requests_per_second=100, max_concurrency=4)
+    submits = []
+
+    def submit():
+        submits.append(1)
+        return FakePoller(error=throttled())
+
+    with pytest.raises(ThrottledError):
+        limiter.call_and_wait(submit)
+    assert len(submits) == 1
+    assert limiter.concurrency_limit == 2
+    assert limiter._active == 0
@@ -0,0 +1,97 @@
+import csv
+
+import pytest
+from openpyxl import Workbook, load_workbook
+
+import results_export
+from results_export import EXPORT_COLUMNS, export_csv, export_excel
+from results_store import ResultsStore
+
+
+def make_document(file_name, title="FLOOR PLAN"):
+    return {
+        "file_name": file_name,
+        "file_hash": f"hash-{file_name}",
+        "layout_version": 2,
+        "pages": [{"page_number": 1, "tables": "No tables found on this page."}],
+        "document_fields": {"Title": {"value": title, "confidence": 0.9, "page_numbers": [1]}},
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    with ResultsStore(str(tmp_path / "document_results.sqlite3")) as store:
+        yield store
+
+
+def csv_file_names(csv_path):
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        return [row[0] for row in csv.reader(f)][1:]
+
+
+def sheet_rows(excel_path):
+    workbook = load_workbook(excel_path, read_only=True)
+    try:
+        return [list(row) for row in workbook.active.iter_rows(values_only=True)]
+    finally:
+        workbook.close()
+
+
+def test_csv_export_appends_only_new_documents(store, tmp_path):
+    csv_path = str(tmp_path / "results.csv")
+    store.append([make_document("a.pdf")])
+    export_csv(store, csv_path)
+    store.append([make_document("b.pdf")])
+    export_csv(store, csv_path)
+
+    assert csv_file_names(csv_path) == ["a.pdf", "b.pdf"]
+
+
+def test_csv_rows_of_a_run_that_crashed_before_its_marker_are_not_repeated(store, tmp_path, monkeypatch):
+    csv_path = str(tmp_path / "results.csv")
+    store.append([make_document("a.pdf")])
+    export_csv(store, csv_path)
+    store.append([make_document("b.pdf")])
+
+    def crash(*args):
+        raise KeyboardInterrupt
+
+    # The rows of b.pdf reach the disk, the marker does not
+    with monkeypatch.context() as patch:
+        patch.setattr(results_export, "write_csv_marker", crash)
+        with pytest.raises(KeyboardInterrupt):
+            export_csv(store, csv_path)
+    assert csv_file_names(csv_path) == ["a.pdf", "b.pdf"]
+
+    export_csv(store, csv_path)
+    assert csv_file_names(csv_path) == ["a.pdf", "b.pdf"]
+
+
+def test_csv_marker_without_a_size_is_still_read(store, tmp_path):
+    csv_path = str(tmp_path / "results.csv")
+    store.append([make_document("a.pdf")])
+    export_csv(store, csv_path)
+    with open(csv_path + ".last_id", "w") as marker:
+        marker.write("1")
+    store.append([make_document("b.pdf")])
+    export_csv(store, csv_path)
+
+    assert csv_file_names(csv_path) == ["a.pdf", "b.pdf"]
+
+
+def test_rows_only_an_existing_workbook_held_are_kept_once(store, tmp_path):
+    excel_path = str(tmp_path / "document_analysis_results.xlsx")
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(EXPORT_COLUMNS)
+    sheet.append(["old.pdf", "1", "No tables found on this page.", "OLD TITLE", "0.8"])
+    sheet.append(["stored.pdf", "1", "No tables found on this page.", "STALE TITLE", "0.5"])
+    workbook.save(excel_path)
+    store.append([make_document("stored.pdf", title="NEW TITLE")])
+
+    export_excel(store, excel_path)
+    export_excel(store, excel_path)
+
+    rows = sheet_rows(excel_path)
+    assert rows[0] == EXPORT_COLUMNS
+    assert [(row[0], row[3]) for row in rows[1:]] == [("old.pdf", "OLD TITLE"), ("stored.pdf", "NEW TITLE")]
@@ -0,0 +1,106 @@
+import json
+
+import pytest
+
+import results_store
+from results_store import CheckpointWriter, ResultsStore, open_results_store
+
+
+def make_document(file_name, file_hash=None):
+    return {"file_name": file_name, "file_hash": file_hash, "pages": [{"page_number": 1, "tables": "None"}]}
+
+
+@pytest.fixture(params=[False, True], ids=["json", "compact"])
+def store(tmp_path, request):
+    with ResultsStore(str(tmp_path / "document_results.sqlite3"), compact=request.param) as store:
+        yield store
+
+
+def test_appended_documents_read_back_in_order(store):
+    store.append([make_document("a.pdf", "hash-a"), make_document("b.pdf", "hash-b")])
+    store.append([])
+    store.append([make_document("c.pdf", "hash-c")])
+
+    assert store.count() == 3
+    assert [doc["file_name"] for doc in store.iter_results(batch_size=2)] == ["a.pdf", "b.pdf", "c.pdf"]
+    assert next(store.iter_results()) == make_document("a.pdf", "hash-a")
+
+
+def test_iter_rows_resumes_after_a_row_id(store):
+    store.append([make_document(f"{index}.pdf") for index in range(5)])
+    row_ids = [row_id for row_id, _ in store.iter_rows()]
+
+    assert [doc["file_name"] for _, doc in store.iter_rows(after_id=row_ids[2], batch_size=1)] == ["3.pdf", "4.pdf"]
+
+
+def test_lookups_by_name_and_hash(store):
+    store.append([make_document("hashed.pdf", "hash-1"), make_document("legacy.pdf")])
+
+    assert store.has_file_hash("hash-1")
+    assert not store.has_file_hash("hash-2")
+    assert store.has_file_name("hashed.pdf")
+    assert store.has_unhashed_file_name("legacy.pdf")
+    assert not store.has_unhashed_file_name("hashed.pdf")
+
+
+def test_legacy_json_is_imported_once_into_an_empty_store(tmp_path):
+    legacy_path = tmp_path / "document_results.json"
+    legacy_path.write_text(json.dumps([make_document("old_1.pdf"), make_document("old_2.pdf")]))
+
+    with open_results_store(str(tmp_path / "out"), str(legacy_path)) as store:
+        assert store.count() == 2
+        assert store.has_unhashed_file_name("old_1.pdf")
+    with open_results_store(str(tmp_path / "out"), str(legacy_path)) as store:
+        assert store.count() == 2
+        assert store.import_legacy_json(str(tmp_path / "missing.json")) == 0
+
+
+def test_results_survive_reopening(tmp_path):
+    db_path = str(tmp_path / "document_results.sqlite3")
+    with ResultsStore(db_path, compact=True) as store:
+        store.append([make_document("a.pdf", "hash-a")])
+    # Rows written compact are read back by a store that writes plain JSON
+    with ResultsStore(db_path) as store:
+        store.append([make_document("b.pdf", "hash-b")])
+        assert [doc["file_name"] for doc in store.iter_results()] == ["a.pdf", "b.pdf"]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+
+def test_checkpoints_commit_every_batch_size_documents(store):
+    with CheckpointWriter(store, batch_size=3, interval=3600) as writer:
+        for index in range(7):
+            writer.add(make_document(f"{index}.pdf"))
+            assert store.count() == (index + 1) // 3 * 3
+    assert store.count() == 7
+    assert writer.saved == 7
+
+
+def test_checkpoint_commits_a_partial_batch_after_the_interval(store, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(results_store, "time", clock)
+    writer = CheckpointWriter(store, batch_size=100, interval=10.0)
+
+    writer.add(make_document("a.pdf"))
+    assert store.count() == 0
+    clock.now += 10.0
+    writer.add(make_document("b.pdf"))
+    assert store.count() == 2
+
+
+def test_interrupted_run_keeps_its_last_partial_batch(store):
+    with pytest.raises(KeyboardInterrupt):
+        with CheckpointWriter(store, batch_size=100, interval=3600) as writer:
+            writer.add(make_document("a.pdf"))
+            writer.add(make_document("b.pdf"))
+            raise KeyboardInterrupt
+    assert [doc["file_name"] for doc in store.iter_results()] == ["a.pdf", "b.pdf"]
@@ -0,0 +1,121 @@
+import os
+import shutil
+import time
+
+import pytest
+
+import scan_index
+from scan_index import ScanIndex, iter_files, iter_pdf_files
+
+# Old enough that the index trusts the mtimes
+PAST = time.time() - 3600
+
+
+def age(path, seconds_ago=0):
+    os.utime(path, ns=(int((PAST - seconds_ago) * 1e9),) * 2)
+
+
+def make_tree(root):
+    for relative in ("box_2/b.pdf", "box_1/a2.pdf", "box_1/a1.pdf", "box_1/inner/c.PDF", "box_1/notes.txt", "top.pdf"):
+        path = root / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"%PDF-1.7 " + relative.encode())
+        age(path)
+    for folder in (root / "box_1" / "inner", root / "box_1", root / "box_2", root):
+        age(folder)
+
+
+@pytest.fixture
+def index(tmp_path):
+    with ScanIndex(str(tmp_path / "scan_index.sqlite3")) as index:
+        yield index
+
+
+@pytest.fixture
+def listed(monkeypatch):
+    """
+    The folders os.scandir lists during the test.
+    """
+    folders = []
+    scandir = os.scandir
+
+    def counting_scandir(path):
+        folders.append(os.path.basename(path))
+        return scandir(path)
+
+    monkeypatch.setattr(scan_index.os, "scandir", counting_scandir)
+    return folders
+
+
+def relative_paths(root, paths):
+    return [os.path.relpath(path, root) for path in paths]
+
+
+def test_walk_order_is_depth_first_with_sorted_names(tmp_path, index):
+    root = tmp_path / "scans"
+    make_tree(root)
+    expected = ["top.pdf", os.path.join("box_1", "a1.pdf"), os.path.join("box_1", "a2.pdf"),
+                os.path.join("box_1", "inner", "c.PDF"), os.path.join("box_2", "b.pdf")]
+
+    assert relative_paths(root, iter_pdf_files(str(root), index)) == expected
+    # The same order when every folder comes from the index
+    assert relative_paths(root, iter_pdf_files(str(root), index)) == expected
+
+
+def test_rescan_lists_only_folders_that_changed(tmp_path, index, listed):
+    root = tmp_path / "scans"
+    make_tree(root)
+    list(iter_files(str(root), index=index))
+    assert sorted(listed) == ["box_1", "box_2", "inner", "scans"]
+
+    listed.clear()
+    assert len(list(iter_files(str(root), index=index))) == 6
+    assert listed == []
+
+    (root / "box_2" / "new.pdf").write_bytes(b"%PDF-1.7 new")
+    age(root / "box_2", seconds_ago=-60)
+    listed.clear()
+    names = [os.path.basename(path) for path in iter_pdf_files(str(root), index)]
+    assert listed == ["box_2"]
+    assert names[-2:] == ["b.pdf", "new.pdf"]
+
+
+def test_removed_folders_leave_the_index(tmp_path, index):
+    root = tmp_path / "scans"
+    make_tree(root)
+    list(iter_files(str(root), index=index))
+
+    shutil.rmtree(root / "box_1")
+    age(root, seconds_ago=-60)
+
+    assert relative_paths(root, iter_pdf_files(str(root), index)) == ["top.pdf", os.path.join("box_2", "b.pdf")]
+    stored = {folder for (folder,) in index.conn.execute("SELECT DISTINCT dir FROM files")}
+    assert not any("box_1" in folder for folder in stored)
+
+
+def test_recently_changed_folder_is_listed_again(tmp_path, index, listed):
+    root = tmp_path / "scans"
+    make_tree(root)
+    # Written within RACY_SECONDS of the scan: another change in the same tick would not move the mtime
+    os.utime(root / "box_2")
+    list(iter_files(str(root), index=index))
+    listed.clear()
+
+    list(iter_files(str(root), index=index))
+    assert listed == ["box_2"]
+
+
+def test_hashes_are_reused_until_the_file_changes(tmp_path, index, monkeypatch):
+    path = tmp_path / "sheet.pdf"
+    path.write_bytes(b"%PDF-1.7 first")
+    age(path)
+    hashed = []
+    monkeypatch.setattr(scan_index, "hash_file", lambda file_path: hashed.append(file_path) or f"hash-{len(hashed)}")
+
+    assert index.file_hash(str(path)) == "hash-1"
+    assert index.file_hash(str(path)) == "hash-1"
+    path.write_bytes(b"%PDF-1.7 second")
+    age(path, seconds_ago=-60)
+    assert index.file_hash(str(path)) == "hash-2"
+    assert len(hashed) == 2
+    assert index.file_hash(str(tmp_path / "missing.pdf")) is None
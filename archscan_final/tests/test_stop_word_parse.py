@@ -0,0 +1,55 @@
+import json
+import os
+
+import stop_word_parse
+from stop_word_parse import CHUNKS_AHEAD_PER_WORKER, WORKER_CHUNK_SIZE, iter_process_folder
+
+
+def write_result(path, lines):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"pages": [{"lines": [{"content": line} for line in lines]}]}, f)
+
+
+def test_workers_filter_a_tree_and_report_each_file(tmp_path):
+    input_folder = tmp_path / "results"
+    output_folder = tmp_path / "filtered"
+    stop_words_file = tmp_path / "stop_words.txt"
+    stop_words_file.write_text("the\nof\n", encoding="utf-8")
+    expected = {}
+    for index in range(150):
+        path = str(input_folder / f"set_{index % 3}" / f"sheet_{index:03d}.json")
+        write_result(path, [f"THE PLAN OF LEVEL {index}", "the of"])
+        expected[path] = f"PLAN LEVEL {index}\n"
+    broken_path = str(input_folder / "set_0" / "broken.json")
+    with open(broken_path, "w", encoding="utf-8") as f:
+        f.write("{not json")
+
+    statuses = list(iter_process_folder(str(input_folder), str(output_folder), str(stop_words_file), workers=2))
+
+    assert sorted(path for path, _ in statuses) == sorted(list(expected) + [broken_path])
+    errors = {path: error for path, error in statuses if error}
+    assert list(errors) == [broken_path]
+    for path, text in expected.items():
+        output_path = output_folder / (os.path.basename(path)[:-len(".json")] + "_filtered.txt")
+        assert output_path.read_text(encoding="utf-8") == text
+
+
+def test_walk_is_read_only_a_few_chunks_ahead_of_the_results(tmp_path, monkeypatch):
+    taken = []
+
+    def find_json_tasks(input_folder, output_folder):
+        for index in range(10000):
+            taken.append(index)
+            yield str(tmp_path / f"missing_{index}.json"), str(tmp_path / f"missing_{index}_filtered.txt")
+
+    monkeypatch.setattr(stop_word_parse, "find_json_tasks", find_json_tasks)
+    stop_words_file = tmp_path / "stop_words.txt"
+    stop_words_file.write_text("the\n", encoding="utf-8")
+
+    statuses = iter_process_folder(str(tmp_path), str(tmp_path / "filtered"), str(stop_words_file), workers=2)
+    path, error = next(statuses)
+    statuses.close()
+
+    assert path.endswith("missing_0.json") and error
+    assert len(taken) <= (CHUNKS_AHEAD_PER_WORKER * 2 + 1) * WORKER_CHUNK_SIZE
@@ -0,0 +1,19 @@
+import OCR_main
+import nasa_ocr_read
+from stop_words import StopWordFilter
+
+
+def test_punctuated_stop_words_are_dropped():
+    stop_filter = StopWordFilter({"the", "and"})
+    assert stop_filter.filter_line("SEE the, DETAIL (and NOTES") == "SEE DETAIL NOTES"
+
+
+def test_punctuation_is_kept_when_normalization_is_off():
+    stop_filter = StopWordFilter({"the"}, normalize_punctuation=False)
+    assert stop_filter.filter_line("the, the DETAIL") == "the, DETAIL"
+
+
+def test_ocr_entry_points_drop_punctuated_stop_words():
+    result = {"pages": [{"lines": [{"content": "SEE THE, DETAIL"}]}]}
+    for stop_filter in (OCR_main.STOP_WORD_FILTER, nasa_ocr_read.STOP_WORD_FILTER):
+        assert stop_filter.filter_result(result) == ["SEE DETAIL"]
@@ -0,0 +1,84 @@
+import pytest
+
+import text_layer
+from benchmarks.bench_text_layer import make_pdf
+from page_ranges import merge_analyze_results
+from text_layer import TextLayerReport, is_usable_text, text_layer_parts, text_layer_result
+
+SHEET = "A-101 FIRST FLOOR PLAN\nSCALE 1/8\" = 1'-0\"\nDRAWN BY J.K."
+
+
+def page(text):
+    return text, 36.0, 24.0
+
+
+def test_usable_text_needs_enough_readable_characters():
+    assert is_usable_text(SHEET)
+    assert not is_usable_text("A-101")
+    assert not is_usable_text("\ufffd" * 30 + "A-101")
+    assert is_usable_text("A-101", min_chars=5)
+
+
+def test_pages_split_into_runs_with_and_without_text():
+    parts = text_layer_parts([page(SHEET), page(SHEET), page(""), page("  \n "), page(SHEET)])
+
+    assert [(first, last, result is not None) for first, last, result in parts] == [
+        (1, 2, True), (3, 4, False), (5, 5, True)]
+    # Each local run numbers its pages from 1, as a locally cut page range does
+    assert [p["pageNumber"] for p in parts[0][2]["pages"]] == [1, 2]
+    assert [p["pageNumber"] for p in parts[2][2]["pages"]] == [1]
+
+
+def test_local_result_spans_point_into_its_content():
+    result = text_layer_result([page(SHEET), page("  SECOND   SHEET  ")])
+    content = result["content"]
+
+    lines = [line for p in result["pages"] for line in p["lines"]]
+    assert [line["content"] for line in lines] == SHEET.splitlines() + ["SECOND   SHEET"]
+    for element in lines + [word for p in result["pages"] for word in p["words"]]:
+        span = element["spans"][0] if "spans" in element else element["span"]
+        assert content[span["offset"]:span["offset"] + span["length"]] == element["content"]
+    second_page = result["pages"][1]["spans"][0]
+    assert content[second_page["offset"]:second_page["offset"] + second_page["length"]] == "SECOND   SHEET"
+
+
+def test_local_and_analyzed_runs_merge_in_page_order():
+    parts = text_layer_parts([page(SHEET), page(""), page(SHEET)])
+    analyzed = {"content": "SERVICE SHEET", "pages": [{"pageNumber": 1, "lines": [
+        {"content": "SERVICE SHEET", "spans": [{"offset": 0, "length": 13}]}]}]}
+
+    merged = merge_analyze_results([(first, result or analyzed) for first, _, result in parts])
+
+    assert [p["pageNumber"] for p in merged["pages"]] == [1, 2, 3]
+    assert [p["lines"][0]["content"] for p in merged["pages"]] == ["A-101 FIRST FLOOR PLAN", "SERVICE SHEET",
+                                                                 "A-101 FIRST FLOOR PLAN"]
+    span = merged["pages"][1]["lines"][0]["spans"][0]
+    assert merged["content"][span["offset"]:span["offset"] + span["length"]] == "SERVICE SHEET"
+
+
+def test_report_tallies_each_file_once(monkeypatch):
+    monkeypatch.setattr(text_layer, "pypdf", object())
+    page_texts = {"digital.pdf": [page(SHEET)] * 3, "mixed.pdf": [page(SHEET), page("")],
+                  "scan.pdf": [page("")] * 2}
+    monkeypatch.setattr(text_layer, "read_page_texts", page_texts.get)
+    report = TextLayerReport(price_per_1000_pages=1000)
+
+    assert len(report.read("digital.pdf")) == 1
+    assert len(report.read("mixed.pdf")) == 2
+    assert report.read("scan.pdf") is None
+    report.read("digital.pdf")
+
+    assert (report.files_checked, report.files_local, report.files_partly_local, report.pages_local) == (3, 1, 1, 4)
+    assert report.summary().startswith("Text layer: 1 of 3 files read locally, 1 in part (4 pages), saving about $4.00")
+
+
+def test_pdf_text_layer_is_read_per_page(tmp_path):
+    pytest.importorskip("pypdf")
+    pdf_path = str(tmp_path / "mixed.pdf")
+    make_pdf(pdf_path, 4, {1, 2, 4})
+
+    parts = TextLayerReport().read(pdf_path)
+
+    assert [(first, last, result is not None) for first, last, result in parts] == [
+        (1, 2, True), (3, 3, False), (4, 4, True)]
+    assert parts[0][2]["pages"][0]["width"] == pytest.approx(36.0)
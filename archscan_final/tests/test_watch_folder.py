@@ -0,0 +1,133 @@
+import os
+import threading
+import time
+
+import pytest
+
+import watch_folder
+from watch_folder import WATCH_STATE_FILE, WatchState, _handle_ready, _settled
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(watch_folder, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def state(tmp_path):
+    with WatchState(str(tmp_path / WATCH_STATE_FILE)) as state:
+        yield state
+
+
+def test_file_is_taken_once_it_stops_changing_for_the_settle_time(tmp_path, clock):
+    scan = tmp_path / "scan.pdf"
+    scan.write_bytes(b"%PDF-1.7 first pass")
+    pending = {str(scan): (None, None, clock.now)}
+
+    assert _settled(pending, settle=2) == []
+    clock.now += 1.5
+    # Still being written: the settle time starts over
+    scan.write_bytes(b"%PDF-1.7 first pass, second pass")
+    assert _settled(pending, settle=2) == []
+    clock.now += 1.5
+    assert _settled(pending, settle=2) == []
+    clock.now += 0.5
+
+    stat = os.stat(scan)
+    assert _settled(pending, settle=2) == [(str(scan), stat.st_size, stat.st_mtime_ns)]
+    assert pending == {}
+
+
+def test_empty_and_vanished_files_are_not_taken(tmp_path, clock):
+    empty = tmp_path / "empty.pdf"
+    empty.write_bytes(b"")
+    pending = {str(empty): (None, None, clock.now), str(tmp_path / "gone.pdf"): (None, None, clock.now)}
+
+    for _ in range(3):
+        clock.now += 10
+        assert _settled(pending, settle=2) == []
+    assert list(pending) == [str(empty)]
+
+
+def ready_entry(path):
+    stat = os.stat(path)
+    return str(path), stat.st_size, stat.st_mtime_ns
+
+
+def test_duplicates_and_handled_files_are_skipped(tmp_path, state):
+    first, copy, other = tmp_path / "a.pdf", tmp_path / "a_copy.pdf", tmp_path / "b.pdf"
+    first.write_bytes(b"%PDF-1.7 sheet A")
+    copy.write_bytes(b"%PDF-1.7 sheet A")
+    other.write_bytes(b"%PDF-1.7 sheet B")
+    batches = []
+
+    def handle(files):
+        batches.append([path for path, _ in files])
+        return set()
+
+    _handle_ready(state, [ready_entry(first), ready_entry(copy)], handle)
+    # a.pdf again unchanged, and b.pdf's content arriving under a second name later
+    later_copy = tmp_path / "b_rescan.pdf"
+    later_copy.write_bytes(b"%PDF-1.7 sheet B")
+    _handle_ready(state, [ready_entry(first), ready_entry(other)], handle)
+    _handle_ready(state, [ready_entry(later_copy)], handle)
+
+    assert batches == [[str(first)], [str(other)]]
+    assert state.done_path_for(watch_folder.hash_file(str(copy))) == str(first)
+
+
+def test_failed_files_are_taken_again(tmp_path, state):
+    scan = tmp_path / "a.pdf"
+    scan.write_bytes(b"%PDF-1.7 sheet A")
+    batches = []
+
+    def handle(files):
+        batches.append([path for path, _ in files])
+        return {str(scan)} if len(batches) == 1 else set()
+
+    _handle_ready(state, [ready_entry(scan)], handle)
+    _handle_ready(state, [ready_entry(scan)], handle)
+    _handle_ready(state, [ready_entry(scan)], handle)
+
+    assert batches == [[str(scan)], [str(scan)]]
+
+
+def test_polling_watcher_feeds_new_and_existing_scans(tmp_path):
+    input_folder, output_folder = tmp_path / "scans", tmp_path / "out"
+    (input_folder / "box_1").mkdir(parents=True)
+    output_folder.mkdir()
+    (input_folder / "box_1" / "existing.pdf").write_bytes(b"%PDF-1.7 existing")
+    (input_folder / "box_1" / "notes.txt").write_text("not a scan")
+    handled = []
+    stop = threading.Event()
+
+    def handle(files):
+        handled.extend(os.path.basename(path) for path, _ in files)
+        return set()
+
+    thread = threading.Thread(target=watch_folder.watch_folder, args=(str(input_folder), str(output_folder), handle),
+                              kwargs={"settle": 0.1, "poll": True, "poll_interval": 0.1, "stop": stop})
+    thread.start()
+    try:
+        (input_folder / "box_1" / "arrived.pdf").write_bytes(b"%PDF-1.7 arrived")
+        deadline = time.monotonic() + 10
+        while len(handled) < 2 and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        stop.set()
+        thread.join()
+
+    assert sorted(handled) == ["arrived.pdf", "existing.pdf"]
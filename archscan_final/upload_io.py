@@ -0,0 +1,112 @@
+"""
+Memory-bounded upload bodies for large-format scans.
+
+E-size drawings are 200-500 MB. Reading one into a bytes object per thread costs that
+much RSS per upload; open_upload() instead hands the HTTP transport a file-like object
+it reads a block at a time, so an upload holds a few KiB of the file in Python memory
+whatever its size. Files are memory-mapped where the platform allows: blocks are copied
+straight out of the page cache without a read() system call each, and the mapping's
+pages are shared and reclaimable rather than charged to the process heap.
+"""
+import io
+import mmap
+import os
+
+# Files at or above this size go through the large-file lane of the schedulers
+LARGE_FILE_BYTES = int(os.environ.get("ARCHSCAN_LARGE_FILE_MB", "100")) * 1024 * 1024
+
+# Uploads of large files allowed at once; they share the uplink with everything else
+DEFAULT_LARGE_IN_FLIGHT = 2
+
+# Mapped pages already sent are dropped from the process every RELEASE_WINDOW bytes.
+# They stay in the page cache, so a retry that seeks back just faults them in again.
+RELEASE_WINDOW = 8 * 1024 * 1024
+
+
+class MappedUpload(io.RawIOBase):
+    """
+    Read-only, seekable file-like view of a memory-mapped file.
+
+    len() gives the file size, so the transport sends a Content-Length instead of
+    chunked transfer encoding, and seek(0) lets the SDK retry policy resend the body.
+    """
+
+    def __init__(self, file_path):
+        self.name = file_path
+        self._file = open(file_path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except BaseException:
+            self._file.close()
+            raise
+        self._released = 0
+        self._can_release = hasattr(self._map, "madvise") and hasattr(mmap, "MADV_DONTNEED")
+        if hasattr(self._map, "madvise"):
+            self._map.madvise(mmap.MADV_SEQUENTIAL)
+
+    def __len__(self):
+        return len(self._map)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def read(self, size=-1):
+        data = self._map.read(None if size is None or size < 0 else size)
+        self._release_sent()
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def _release_sent(self):
+        # Touched pages of a mapping count towards RSS until unmapped or released
+        position = self._map.tell()
+        if not self._can_release or position - self._released < RELEASE_WINDOW:
+            return
+        end = position - position % mmap.PAGESIZE
+        self._map.madvise(mmap.MADV_DONTNEED, self._released, end - self._released)
+        self._released = end
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self._map.seek(offset, whence)
+        self._released = min(self._released, self._map.tell() - self._map.tell() % mmap.PAGESIZE)
+        return self._map.tell()
+
+    def tell(self):
+        return self._map.tell()
+
+    def close(self):
+        if not self.closed:
+            self._map.close()
+            self._file.close()
+        super().close()
+
+
+def open_upload(file_path):
+    """
+    Opens file_path as an upload body: memory-mapped where possible, a plain binary
+    file otherwise (empty files, which cannot be mapped, or file systems without mmap).
+    """
+    try:
+        return MappedUpload(file_path)
+    except (ValueError, OSError):
+        return open(file_path, "rb")
+
+
+def file_size(file_path):
+    """
+    Size of file_path in bytes, 0 if it cannot be read (the failure is reported when it is processed).
+    """
+    try:
+        return os.path.getsize(file_path)
+    except OSError:
+        return 0
+
+
+def is_large_file(file_path, large_file_bytes=None):
+    return file_size(file_path) >= (large_file_bytes or LARGE_FILE_BYTES)
@@ -0,0 +1,342 @@
+"""
+Watch-folder ingestion: PDFs dropped into a scanner folder are analyzed as they arrive.
+
+On Linux the folder tree is watched with inotify (through ctypes, no extra package), so
+a new scan is seen the moment it is written and the tree is walked only once, at start.
+Elsewhere, on network shares whose writes inotify does not see, or with --poll, the tree
+is rescanned every poll interval instead, through the scan index, which lists only the
+folders whose mtime moved.
+
+A file is taken once its size and modification time have stopped changing for the
+settle time, so a scan still being written (or copied in several passes) is not picked
+up half done. It is then hashed and checked against the watch state kept in the output
+folder (watch_state.sqlite3): content already processed under any name is skipped as a
+duplicate, and files already handled in an earlier session are not taken again. New
+files go to the OCR or extraction pipeline in batches.
+"""
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import sqlite3
+import struct
+import threading
+import time
+
+from concurrent_ocr import DEFAULT_MAX_IN_FLIGHT, find_pdf_files, run_in_order
+from ocr_cache import hash_file
+
+# Seconds a file's size and mtime must stay the same before it is taken
+DEFAULT_SETTLE_SECONDS = float(os.environ.get("ARCHSCAN_WATCH_SETTLE", "2"))
+
+# Seconds between rescans of the polling watcher
+DEFAULT_POLL_INTERVAL = 5.0
+
+WATCH_STATE_FILE = "watch_state.sqlite3"
+
+# inotify event flags (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+# struct inotify_event: int wd; uint32_t mask, cookie, len; char name[len]
+_EVENT = struct.Struct("iIII")
+_READ_SIZE = 256 * 1024
+
+
+def _load_libc():
+    libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    if not hasattr(libc, "inotify_init1"):
+        raise OSError(errno.ENOSYS, "inotify is not available")
+    return libc
+
+
+class InotifyWatcher:
+    """
+    Watches every folder below root with inotify; new subfolders are added as they appear.
+    """
+
+    def __init__(self, root):
+        self.libc = _load_libc()
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        self.folders = {}
+        self.initial_files = self._add_tree(root)
+
+    def _add_tree(self, folder):
+        # Files already in a folder when its watch is added would never raise an event, so they are returned
+        found = []
+        for dirpath, _, filenames in os.walk(folder):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dirpath), WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                # ENOSPC means fs.inotify.max_user_watches is used up
+                raise OSError(error, f"Cannot watch {dirpath}: {os.strerror(error)}")
+            self.folders[wd] = dirpath
+            found.extend(os.path.join(dirpath, filename) for filename in filenames)
+        return found
+
+    def changes(self, timeout):
+        """
+        Waits up to timeout seconds and returns (paths written or moved in, whether events were lost).
+        """
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return [], False
+        try:
+            data = os.read(self.fd, _READ_SIZE)
+        except BlockingIOError:
+            return [], False
+
+        changed = []
+        overflow = False
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, name_length = _EVENT.unpack_from(data, offset)
+            name = data[offset + _EVENT.size:offset + _EVENT.size + name_length].rstrip(b"\0")
+            offset += _EVENT.size + name_length
+            if mask & IN_Q_OVERFLOW:
+                overflow = True
+                continue
+            if mask & IN_IGNORED:
+                self.folders.pop(wd, None)
+                continue
+            folder = self.folders.get(wd)
+            if folder is None or not name:
+                continue
+            path = os.path.join(folder, os.fsdecode(name))
+            if not mask & IN_ISDIR:
+                changed.append(path)
+            elif mask & (IN_CREATE | IN_MOVED_TO):
+                try:
+                    changed.extend(self._add_tree(path))
+                except FileNotFoundError:
+                    pass
+        return changed, overflow
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """
+    Rescans root every interval seconds and reports the files that appeared. Files still being
+    written are followed by the settle check, so only new names need to be found here; a file
+    replaced under a name already seen is not picked up again (inotify does see that).
+    """
+
+    def __init__(self, root, interval=DEFAULT_POLL_INTERVAL):
+        self.root = root
+        self.interval = interval
+        self.snapshot = set(find_pdf_files(root))
+        self.initial_files = list(self.snapshot)
+        self.next_scan = time.monotonic() + interval
+
+    def changes(self, timeout):
+        wait = self.next_scan - time.monotonic()
+        if wait > 0:
+            time.sleep(min(timeout, wait))
+            if time.monotonic() < self.next_scan:
+                return [], False
+        snapshot = set(find_pdf_files(self.root))
+        changed = list(snapshot - self.snapshot)
+        self.snapshot = snapshot
+        self.next_scan = time.monotonic() + self.interval
+        return changed, False
+
+    def close(self):
+        pass
+
+
+def open_watcher(root, poll=False, poll_interval=DEFAULT_POLL_INTERVAL):
+    """
+    Returns an InotifyWatcher, or a PollingWatcher with poll set or where inotify is not available.
+    """
+    if not poll:
+        try:
+            return InotifyWatcher(root)
+        except OSError as e:
+            print(f"inotify unavailable ({e}); polling every {poll_interval:g}s instead")
+    return PollingWatcher(root, poll_interval)
+
+
+class WatchState:
+    """
+    Files the watcher has handled (path, size, mtime, content hash and outcome), kept in SQLite.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, hash TEXT, status TEXT, handled REAL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS files_hash ON files (hash)")
+        self.conn.commit()
+
+    def is_handled(self, path, size, mtime_ns):
+        row = self.conn.execute(
+            "SELECT size, mtime_ns FROM files WHERE path = ? AND status != 'failed'", (path,)
+        ).fetchone()
+        return row == (size, mtime_ns)
+
+    def done_path_for(self, file_hash):
+        """
+        Returns a path whose content had this hash and was processed, or None.
+        """
+        row = self.conn.execute(
+            "SELECT path FROM files WHERE hash = ? AND status = 'done' LIMIT 1", (file_hash,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def record(self, path, size, mtime_ns, file_hash, status):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO files (path, size, mtime_ns, hash, status, handled) VALUES (?, ?, ?, ?, ?, ?)",
+            (path, size, mtime_ns, file_hash, status, time.time()),
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def ocr_batch_handler(output_folder, max_in_flight=DEFAULT_MAX_IN_FLIGHT, cache=None, result_format=None,
+                      pages_per_range=None):
+    """
+    Returns handle(files) that OCRs [(path, hash), ...] as OCR_main does and returns the paths that failed.
+    """
+    import OCR_main
+
+    client = OCR_main.get_client()
+    result_format = result_format or OCR_main.DEFAULT_RESULT_FORMAT
+
+    def handle(files):
+        summaries = run_in_order(
+            lambda item: OCR_main.process_pdf(item[0], output_folder, client, cache, result_format, item[1],
+                                              pages_per_range=pages_per_range),
+            files, max_in_flight
+        )
+        print("".join(summaries), end="", flush=True)
+        return {path for (path, _), summary in zip(files, summaries) if summary.startswith("Failed")}
+
+    return handle
+
+
+def extract_batch_handler(output_folder, model_id, limiter=None, export_file_name=None):
+    """
+    Returns handle(files) that adds the custom-model results of [(path, hash), ...] to the
+    output folder's results store, refreshes the export, and returns the paths that failed.
+    """
+    import large_format_custom
+    from results_store import open_results_store
+
+    client = large_format_custom.get_client()
+    excel_file_path = os.path.join(output_folder, export_file_name or "document_analysis_results.xlsx")
+
+    def handle(files):
+        with open_results_store(output_folder, os.path.join(output_folder, "document_results.json")) as store:
+            saved, unsupported, throttled = large_format_custom.process_files(
+                client, model_id, [path for path, _ in files], store,
+                os.path.join(output_folder, "unsupported_files.txt"),
+                os.path.join(output_folder, "throttled_files.txt"), limiter
+            )
+            large_format_custom.json_to_excel(store, excel_file_path)
+        print(f"{saved} result(s) added to {store.db_path}", flush=True)
+        return set(unsupported) | set(throttled)
+
+    return handle
+
+
+def watch_folder(input_folder, output_folder, handle, settle=DEFAULT_SETTLE_SECONDS, poll=False,
+                 poll_interval=DEFAULT_POLL_INTERVAL, stop=None):
+    """
+    Feeds the PDFs arriving below input_folder to handle([(path, hash), ...]) until stop is set
+    (a threading.Event) or the process is interrupted. Files already there at start are taken too,
+    unless an earlier session handled them unchanged. handle returns the paths that failed
+    (or were throttled); those are taken again when they change or the watcher restarts.
+    """
+    stop = stop or threading.Event()
+    watcher = open_watcher(input_folder, poll, poll_interval)
+    # path -> (size, mtime_ns, when it was last seen changing)
+    pending = {}
+
+    def note(paths):
+        now = time.monotonic()
+        for path in paths:
+            if path.lower().endswith(".pdf"):
+                pending[path] = (None, None, now)
+
+    with WatchState(os.path.join(output_folder, WATCH_STATE_FILE)) as state:
+        note(watcher.initial_files)
+        print(f"Watching {input_folder} ({type(watcher).__name__}); {len(pending)} file(s) to check", flush=True)
+        try:
+            while not stop.is_set():
+                changed, overflow = watcher.changes(settle / 2 if pending else 1.0)
+                if overflow:
+                    # The kernel queue overflowed and events were lost: one full walk catches up
+                    changed = find_pdf_files(input_folder)
+                note(changed)
+                ready = _settled(pending, settle)
+                if ready:
+                    _handle_ready(state, ready, handle)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watcher.close()
+
+
+def _settled(pending, settle):
+    ready = []
+    now = time.monotonic()
+    for path, (size, mtime_ns, since) in list(pending.items()):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            del pending[path]
+            continue
+        if (stat.st_size, stat.st_mtime_ns) != (size, mtime_ns) or not stat.st_size:
+            pending[path] = (stat.st_size, stat.st_mtime_ns, now)
+        elif now - since >= settle:
+            ready.append((path, size, mtime_ns))
+            del pending[path]
+    return ready
+
+
+def _handle_ready(state, ready, handle):
+    files = []
+    for path, size, mtime_ns in ready:
+        if state.is_handled(path, size, mtime_ns):
+            continue
+        try:
+            file_hash = hash_file(path)
+        except OSError as e:
+            print(f"Cannot read {path}: {e}", flush=True)
+            continue
+        done_path = state.done_path_for(file_hash)
+        if done_path or file_hash in {batch_hash for _, batch_hash in files}:
+            print(f"Skipped {path}: same content as {done_path or 'a file in this batch'}", flush=True)
+            state.record(path, size, mtime_ns, file_hash, "duplicate")
+            continue
+        files.append((path, file_hash))
+    if not files:
+        return
+
+    failed = handle(files)
+    sizes = {path: (size, mtime_ns) for path, size, mtime_ns in ready}
+    for path, file_hash in files:
+        state.record(path, *sizes[path], file_hash, "failed" if path in failed else "done")
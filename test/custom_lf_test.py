@@ -32,7 +32,7 @@ client = DocumentAnalysisClient(endpoint=endpoint, credential=AzureKeyCredential
 
 
 # Function to read model IDs from a text file
-def get_model_ids_from_file(file_path="C:/Users/liams/ArchScan_Capture_Project/archscan_ai/test/model_ids.txt"):
+def get_model_ids_from_file(file_path="C:/Users/liams/ArchScan_Capture_Project/archscan_ai/archscan_final/text_files/model_ids.txt"):
     model_ids = []
     if not os.path.exists(file_path):
         print(f"Error: The file {file_path} does not exist.")
@@ -231,7 +231,7 @@ def start_gui(handle_folder_upload):
     selected_model_id = None
 
     # Populate model dropdown on GUI initialization
-    model_ids = get_model_ids_from_file("C:/Users/liams/ArchScan_Capture_Project/archscan_ai/test/model_ids.txt")
+    model_ids = get_model_ids_from_file("C:/Users/liams/ArchScan_Capture_Project/archscan_ai/archscan_final/text_files/model_ids.txt")
 
     # Show an alert if no models are retrieved
     if not model_ids:
@@ -1,4 +1,5 @@
 import os
+import shutil
 from azure.ai.formrecognizer import DocumentAnalysisClient
 from azure.core.credentials import AzureKeyCredential
 from azure.ai.documentintelligence import AnalyzeDocumentLROPoller
@@ -22,7 +23,8 @@ def process_folder(client, model_id, input_folder, json_output_path, unsupported
                 if file_name.endswith('.pdf'):
                     ocr_pdf_path = os.path.join(json_output_path.replace(".json", ""), file_name)
                     with open(ocr_pdf_path, 'wb') as pdf_file:
-                        pdf_file.write(f.read())  # Saving the processed PDF
+                        f.seek(0)
+                        shutil.copyfileobj(f, pdf_file, 1024 * 1024)  # Saving the processed PDF in 1 MiB chunks
 
         else:
             unsupported_files.append(file_name)
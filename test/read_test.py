@@ -1,10 +1,21 @@
 import json
-from azure.core.credentials import AzureKeyCredential
+import os
+import sys
 from azure.ai.formrecognizer import DocumentAnalysisClient
 
+# client_pool lives in archscan_final, next to this folder
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "archscan_final"))
+from client_pool import get_shared_client
+
 endpoint = "https://as-lf-ai-01.cognitiveservices.azure.com/"
 api_key = "18ce006f0ac44579a36bfaf01653254c"
 
+
+def get_document_analysis_client():
+    # The shared pooled client, so every file analyzed reuses the same HTTPS connections
+    return get_shared_client(DocumentAnalysisClient, endpoint, api_key)
+
+
 def format_bounding_box(bounding_box):
     if not bounding_box:
         return "N/A"
@@ -14,9 +25,7 @@ def format_bounding_box(bounding_box):
 def analyze_read_local_file(file_path, output_json_path):
     # Open the local file as a binary stream
     with open(file_path, "rb") as file:
-        document_analysis_client = DocumentAnalysisClient(
-            endpoint=endpoint, credential=AzureKeyCredential(api_key)
-        )
+        document_analysis_client = get_document_analysis_client()
 
         poller = document_analysis_client.begin_analyze_document(
             "prebuilt-read", document=file